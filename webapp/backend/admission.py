@@ -0,0 +1,191 @@
+import bisect
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Contrôle d'admission : au-delà d'une file d'attente maximale, ou sans assez
+# d'espace disque, les nouveaux travaux sont refusés (429 + Retry-After) plutôt
+# que de ralentir tous ceux déjà acceptés.
+
+# Travaux admis qui n'ont pas encore commencé, dans l'ordre d'admission
+class WaitingLine:
+    def __init__(self):
+        self._counter = itertools.count()
+        self._tickets = []  # numéros triés
+        self._by_id = {}  # travail -> numéro
+        self._lock = threading.Lock()
+
+    def join(self, job_id: str):
+        with self._lock:
+            if job_id not in self._by_id:
+                ticket = next(self._counter)
+                self._by_id[job_id] = ticket
+                self._tickets.append(ticket)  # numéros croissants : la liste reste triée
+
+    def leave(self, job_id: str):
+        with self._lock:
+            ticket = self._by_id.pop(job_id, None)
+            if ticket is not None:
+                del self._tickets[bisect.bisect_left(self._tickets, ticket)]
+
+    def position(self, job_id: str) -> Optional[int]:
+        # Nombre de travaux admis avant celui-ci et toujours en attente
+        with self._lock:
+            ticket = self._by_id.get(job_id)
+            return None if ticket is None else bisect.bisect_left(self._tickets, ticket)
+
+    def __len__(self):
+        return len(self._tickets)
+
+# Débit observé : travaux terminés par seconde sur une fenêtre glissante.
+# Partagé (shared=True), il compte les travaux terminés par tous les processus
+# qui partagent le stockage des travaux (workers compris) : chacun y publie ses
+# fins de travaux et relit celles des autres à chaque sync()
+class ThroughputMeter:
+    def __init__(self, window: float = 600, shared: bool = False):
+        self.window = window
+        self.shared = shared
+        self._completions = deque()
+        self._unpublished = []  # fins pas encore publiées (heure réelle)
+        self._lock = threading.Lock()
+
+    def record(self):
+        with self._lock:
+            self._completions.append(time.monotonic())
+            if self.shared:
+                self._unpublished.append(time.time())
+
+    def sync(self, store):
+        # Appelé périodiquement hors de la boucle d'événements (thread d'écriture
+        # des états) ; les fins non publiées sont gardées si l'écriture échoue
+        with self._lock:
+            unpublished, self._unpublished = self._unpublished, []
+        try:
+            store.record_completions(unpublished)
+            completions = store.load_completions(time.time() - self.window)
+        except Exception:
+            with self._lock:
+                self._unpublished[:0] = unpublished
+            raise
+        offset = time.monotonic() - time.time()
+        with self._lock:
+            # Fins enregistrées ici pendant la lecture : publiées au prochain passage
+            recent = [at + offset for at in self._unpublished]
+            self._completions = deque(sorted([at + offset for at in completions] + recent))
+
+    def rate(self) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            while self._completions and self._completions[0] < now - self.window:
+                self._completions.popleft()
+            if len(self._completions) < 2:
+                return None
+            span = now - self._completions[0]
+            return len(self._completions) / span if span > 0 else None
+
+    def eta(self, jobs_ahead: int) -> Optional[float]:
+        # Temps estimé avant que jobs_ahead travaux de plus soient terminés
+        rate = self.rate()
+        return jobs_ahead / rate if rate else None
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Vidéos des lots pas encore démarrées, comptées dans la file. Mises à jour
+# par la boucle d'événements, lues depuis les threads (admission, métriques) :
+# le total est tenu à part plutôt que recalculé en parcourant les lots
+class PendingItems:
+    def __init__(self):
+        self._counts = {}  # lot -> vidéos pas encore démarrées
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, key: str, count: int):
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + count
+            self.total += count
+
+    def take(self, key: str):
+        with self._lock:
+            if self._counts.get(key):
+                self._counts[key] -= 1
+                self.total -= 1
+
+    def drop(self, key: str):
+        with self._lock:
+            self.total -= self._counts.pop(key, 0)
+
+    def __len__(self):
+        return self.total
+
+# Places réservées par une demande admise, comptées dans la file jusqu'à ce que
+# ses travaux y soient entrés (ou que leur mise en file ait échoué)
+class Reservation:
+    def __init__(self, controller: "AdmissionController", cost: int):
+        self.controller = controller
+        self.cost = cost
+
+    def release(self):
+        with self.controller._lock:
+            self.controller.reserved -= self.cost
+            self.cost = 0
+
+class AdmissionController:
+    def __init__(self, max_queue_depth: int, min_free_disk: int, queue_depth: Callable[[], int],
+                 ensure_space: Callable[[int], bool], meter: ThroughputMeter,
+                 default_retry: int = 30, max_retry: int = 600):
+        self.max_queue_depth = max_queue_depth
+        self.min_free_disk = min_free_disk
+        self.queue_depth = queue_depth
+        self.ensure_space = ensure_space
+        self.meter = meter
+        self.default_retry = default_retry
+        self.max_retry = max_retry
+        self.admitted = 0
+        self.rejected = 0
+        self.reserved = 0  # places des demandes admises pas encore en file
+        self._lock = threading.Lock()
+
+    def admit(self, cost: int) -> Reservation:
+        # Lève AdmissionRejected si la file est pleine ; sinon les places libres
+        # sont réservées jusqu'à Reservation.release(). Une demande plus grande
+        # que la place restante (playlist, lot) est admise : ses travaux au-delà
+        # comptent ensuite dans la file, et les demandes suivantes attendent
+        # qu'elle se vide. Vérification et réservation sont faites d'un bloc :
+        # deux demandes simultanées ne peuvent pas toutes deux prendre la dernière place
+        with self._lock:
+            depth = self.queue_depth() + self.reserved
+            if self.max_queue_depth > 0 and depth >= self.max_queue_depth:
+                self.rejected += 1
+                excess = depth + 1 - self.max_queue_depth
+                raise AdmissionRejected(
+                    "Trop de téléchargements en attente, réessayez plus tard",
+                    self._retry_after(self.meter.eta(excess))
+                )
+            if self.min_free_disk > 0 and not self.ensure_space(self.min_free_disk):
+                self.rejected += 1
+                raise AdmissionRejected("Espace disque insuffisant, réessayez plus tard", self.default_retry)
+            reserved = min(cost, self.max_queue_depth - depth) if self.max_queue_depth > 0 else cost
+            self.admitted += cost
+            self.reserved += reserved
+            return Reservation(self, reserved)
+
+    def _retry_after(self, eta: Optional[float]) -> int:
+        if eta is None:
+            return self.default_retry
+        return max(1, min(self.max_retry, math.ceil(eta)))
+
+    def stats(self) -> dict:
+        return {
+            "max_queue_depth": self.max_queue_depth,
+            "queue_depth": self.queue_depth(),
+            "reserved": self.reserved,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "throughput": self.meter.rate(),
+        }
@@ -0,0 +1,190 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Budget de débit partagé par les téléchargements en cours : chaque travail
+# reçoit une limite (params['ratelimit'] de son YoutubeDL, relue par yt-dlp à
+# chaque bloc), recalculée quand un travail commence ou se termine et à
+# intervalle régulier d'après les débits observés.
+#   - les petits travaux (audio, fichiers courts) ont une part minimale réservée ;
+#   - le reste est partagé à parts égales par travail, dans la limite du
+#     plafond de chaque session ;
+#   - la part qu'un travail n'utilise pas (site lent) est redistribuée aux autres.
+# Sans budget (0), seuls les plafonds de session s'appliquent : les travaux hors
+# session ne sont pas limités.
+
+# Limite jamais descendue en dessous (octets/s) : un travail ne s'arrête pas
+MIN_RATE = 16 * 1024
+# Part maximale du budget réservée aux petits travaux
+MAX_RESERVED_FRACTION = 0.5
+# Un travail qui n'atteint pas cette part de sa limite est limité par ailleurs :
+# sa demande est estimée d'après son débit, avec une marge pour remonter
+UNDERUSE_RATIO = 0.9
+DEMAND_HEADROOM = 1.25
+
+def water_fill(budget: float, items: dict) -> dict:
+    # Partage max-min pondéré : clé -> (poids, plafond) ; aucun élément ne reçoit
+    # plus que son plafond, et ce qu'il laisse est partagé entre les autres
+    if math.isinf(budget):
+        return {key: cap for key, (_, cap) in items.items()}
+    allocation = {}
+    pending = dict(items)
+    remaining = budget
+    while pending:
+        unit = remaining / sum(weight for weight, _ in pending.values())
+        capped = {key: cap for key, (weight, cap) in pending.items() if cap <= unit * weight}
+        if not capped:
+            for key, (weight, _) in pending.items():
+                allocation[key] = unit * weight
+            break
+        for key, cap in capped.items():
+            allocation[key] = cap
+            remaining -= cap
+            del pending[key]
+    return allocation
+
+class BandwidthJob:
+    def __init__(self, params: dict, session_id: Optional[str], small: bool):
+        self.params = params
+        self.session_id = session_id
+        self.small = small
+        self.limit = 0.0
+        self.speed: Optional[float] = None  # débit sur le dernier intervalle
+        self.received = 0  # octets reçus, tous fichiers du travail confondus
+        self._file_bytes = 0
+        self._sample = (time.monotonic(), 0)
+
+    def progress(self, downloaded: int):
+        # downloaded repart de zéro à chaque fichier (vidéo puis audio)
+        self.received += downloaded - self._file_bytes if downloaded >= self._file_bytes else downloaded
+        self._file_bytes = downloaded
+
+    def measure(self, now: float, min_window: float):
+        # Débit instantané plutôt que la moyenne de yt-dlp depuis le début du
+        # fichier, qui tarde à suivre un changement de limite
+        started, received = self._sample
+        if now - started >= min_window:
+            self.speed = (self.received - received) / (now - started)
+            self._sample = (now, self.received)
+
+    def demand(self) -> float:
+        if self.speed is not None and self.limit and not math.isinf(self.limit) and self.speed < self.limit * UNDERUSE_RATIO:
+            return self.speed * DEMAND_HEADROOM
+        return math.inf
+
+class BandwidthGovernor:
+    def __init__(self, budget: int, session_cap: int = 0, min_share: int = 0, small_job_size: int = 0,
+                 interval: float = 2.0):
+        self.budget = budget  # octets/s, 0 : sans limite
+        self.session_cap = session_cap  # octets/s par session, 0 : sans plafond
+        self.min_share = min_share
+        self.small_job_size = small_job_size
+        self.interval = interval
+        self._jobs = {}
+        self._last_rebalance = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0 or self.session_cap > 0
+
+    def is_small(self, audio: bool, size: int) -> bool:
+        return audio or (0 < size <= self.small_job_size)
+
+    @contextmanager
+    def job(self, job_id: str, params: dict, session_id: Optional[str] = None, small: bool = False):
+        # Travail limité le temps du bloc ; les autres récupèrent sa part ensuite
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            self._jobs[job_id] = BandwidthJob(params, session_id, small)
+            self._rebalance()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._rebalance()
+
+    def report(self, job_id: str, downloaded: int):
+        # Avancement d'un travail (hooks de progression) ; la répartition est
+        # revue au plus une fois par intervalle
+        if not self.enabled:
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.progress(downloaded)
+            if time.monotonic() - self._last_rebalance >= self.interval:
+                self._rebalance()
+
+    def _rebalance(self):
+        now = time.monotonic()
+        self._last_rebalance = now
+        if not self._jobs:
+            return
+        for job in self._jobs.values():
+            job.measure(now, self.interval / 2)
+        demands = {job_id: job.demand() for job_id, job in self._jobs.items()}
+
+        # Parts minimales des petits travaux, réduites si elles dépassent la part maximale
+        floors = {job_id: min(self.min_share, demands[job_id]) for job_id, job in self._jobs.items() if job.small}
+        reserved = sum(floors.values())
+        if self.budget and reserved > self.budget * MAX_RESERVED_FRACTION:
+            scale = self.budget * MAX_RESERVED_FRACTION / reserved
+            floors = {job_id: floor * scale for job_id, floor in floors.items()}
+
+        # Partage équitable ; un petit travail dont la part est sous son minimum
+        # reçoit ce minimum, pris sur la part des autres
+        fixed = {}
+        while True:
+            limits = self._fair_shares(demands, fixed)
+            below = {job_id: floor for job_id, floor in floors.items() if job_id not in fixed and limits[job_id] < floor}
+            if not below:
+                break
+            fixed.update(below)
+
+        for job_id, job in self._jobs.items():
+            job.limit = max(MIN_RATE, limits[job_id])
+            job.params['ratelimit'] = None if math.isinf(job.limit) else int(job.limit)
+
+    def _fair_shares(self, demands: dict, fixed: dict) -> dict:
+        # Groupes : une session (plafonnée) ou un travail isolé, pesant autant que
+        # ses travaux pour que le partage reste égal par travail
+        groups = {}
+        for job_id, job in self._jobs.items():
+            if job_id not in fixed:
+                key = f"session:{job.session_id}" if job.session_id and self.session_cap else f"job:{job_id}"
+                groups.setdefault(key, []).append(job_id)
+        items = {}
+        for key, job_ids in groups.items():
+            # Sans budget, un travail hors session n'a rien à partager : pas de limite
+            cap = sum(demands[job_id] for job_id in job_ids) if self.budget else math.inf
+            if key.startswith("session:"):
+                session_fixed = sum(limit for job_id, limit in fixed.items() if self._jobs[job_id].session_id == key[8:])
+                cap = min(sum(demands[job_id] for job_id in job_ids), max(0.0, self.session_cap - session_fixed))
+            items[key] = (len(job_ids), cap)
+
+        limits = dict(fixed)
+        remaining = max(0.0, self.budget - sum(fixed.values())) if self.budget else math.inf
+        for key, share in water_fill(remaining, items).items():
+            if math.isinf(share):
+                limits.update({job_id: math.inf for job_id in groups[key]})
+            else:
+                limits.update(water_fill(share, {job_id: (1, demands[job_id]) for job_id in groups[key]}))
+        return limits
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "session_cap": self.session_cap,
+                "min_share": self.min_share,
+                "jobs": len(self._jobs),
+                "allocated": int(sum(job.limit for job in self._jobs.values() if not math.isinf(job.limit))),
+                "observed": int(sum(job.speed or 0 for job in self._jobs.values())),
+            }
@@ -0,0 +1,99 @@
+import http.server
+import os
+import re
+import threading
+import time
+from xml.sax.saxutils import escape
+
+# Serveur HTTP local qui tient lieu de site vidéo : fichiers médias synthétiques
+# et playlist RSS, lus par l'extracteur générique de yt-dlp. Aucun accès réseau.
+
+CHUNK_SIZE = 64 * 1024
+
+def create_media(directory: str, count: int, size: int) -> list:
+    # Fichiers distincts : l'extracteur générique identifie une vidéo par son
+    # nom de fichier, deux URL du même fichier partageraient le magasin
+    names = []
+    for index in range(count):
+        name = f"video_{index}.mp4"
+        path = os.path.join(directory, name)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, 'wb') as f:
+                remaining = size
+                while remaining > 0:
+                    block = os.urandom(min(CHUNK_SIZE, remaining))
+                    f.write(block)
+                    remaining -= len(block)
+        names.append(name)
+    return names
+
+def write_playlist(directory: str, base_url: str, names: list, filename: str = "playlist.xml") -> str:
+    items = "".join(
+        f"<item><title>{escape(name)}</title><link>{escape(base_url + name)}</link>"
+        f"<enclosure url='{escape(base_url + name)}' type='video/mp4' length='{os.path.getsize(os.path.join(directory, name))}'/></item>"
+        for name in names
+    )
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+        f.write(f"<?xml version='1.0'?><rss version='2.0'><channel><title>Playlist de test</title>"
+                f"<link>{escape(base_url)}</link>{items}</channel></rss>")
+    return base_url + filename
+
+class MediaHandler(http.server.SimpleHTTPRequestHandler):
+    bandwidth = 0  # octets par seconde et par connexion, 0 : sans limite
+    range_length = None  # octets de la plage demandée, None : fichier entier
+
+    extensions_map = {**http.server.SimpleHTTPRequestHandler.extensions_map, '.mp4': 'video/mp4', '.xml': 'application/rss+xml'}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        # Une plage "bytes=début-[fin]", comme les sites vidéo
+        path = self.translate_path(self.path)
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', '').strip())
+        if not match or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        if start > end:
+            self.send_error(416)
+            return None
+        f = open(path, 'rb')
+        f.seek(start)
+        self.range_length = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self.range_length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = self.range_length
+        try:
+            # Débit éventuellement limité : simule un site distant
+            started = time.perf_counter()
+            sent = 0
+            while remaining is None or remaining > 0:
+                chunk = source.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                outputfile.write(chunk)
+                sent += len(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+                delay = sent / self.bandwidth - (time.perf_counter() - started) if self.bandwidth else 0
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+def serve(directory: str, bandwidth: int = 0) -> tuple:
+    # Renvoie le serveur et son adresse de base (port choisi par le système)
+    handler = type("Handler", (MediaHandler,), {"bandwidth": bandwidth})
+    http.server.ThreadingHTTPServer.daemon_threads = True
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), lambda *args: handler(*args, directory=directory))
+    threading.Thread(target=server.serve_forever, name="media-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
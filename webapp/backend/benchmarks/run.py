@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from media_server import create_media, serve, write_playlist
+
+# Suite de mesures de bout en bout du backend, sans accès réseau : l'application
+# FastAPI télécharge, par l'extracteur générique de yt-dlp, des fichiers
+# synthétiques servis par un serveur HTTP local. Chaque scénario s'exécute dans
+# un processus neuf ; les résultats sont écrits en JSON pour être comparés
+# d'un commit à l'autre (--compare).
+#   python benchmarks/run.py --output resultats.json
+#   python benchmarks/run.py --quick --compare reference.json
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+MB = 1024 * 1024
+
+PROFILES = {
+    "full": {"media_size": 4 * MB, "single": 10, "videos": 16, "concurrency": [1, 2, 4, 8], "connections": [1, 8], "jobs": 5000, "requests": 500, "zip_files": 16, "zip_file_size": 16 * MB},
+    "quick": {"media_size": 4 * MB, "single": 3, "videos": 4, "concurrency": [1, 4], "connections": [1, 8], "jobs": 1000, "requests": 100, "zip_files": 4, "zip_file_size": 1 * MB},
+}
+
+# Configuration commune : pas de journal des chronologies ni de refus
+# d'admission, qui fausseraient les mesures
+BASE_ENV = {
+    "FIREDOWN_TRACE_LOG": "off",
+    "FIREDOWN_MAX_QUEUE_DEPTH": "0",
+    "FIREDOWN_MIN_FREE_DISK": "0",
+}
+
+def plan(profile: dict) -> list:
+    # (scénario, paramètres, variables d'environnement)
+    # Téléchargement seul sur une connexion, puis segmenté (requêtes Range parallèles)
+    runs = [
+        ("single_download", {"count": profile["single"], "connections": connections}, {"FIREDOWN_SEGMENT_CONNECTIONS": str(connections)})
+        for connections in profile["connections"]
+    ]
+    for concurrency in profile["concurrency"]:
+        env = {
+            "FIREDOWN_MAX_CONCURRENT_DOWNLOADS": str(concurrency),
+            "FIREDOWN_BATCH_CONCURRENCY": str(concurrency),
+            "FIREDOWN_PER_HOST_CONCURRENCY": str(concurrency),
+        }
+        runs.append(("batch", {"count": profile["videos"], "concurrency": concurrency}, env))
+        runs.append(("session", {"count": profile["videos"], "concurrency": concurrency}, env))
+    runs.append(("status_polling", {"jobs": profile["jobs"], "requests": profile["requests"]}, {}))
+    runs.append(("zip_build", {"files": profile["zip_files"], "file_size": profile["zip_file_size"]}, {}))
+    return runs
+
+def run_scenario(name: str, params: dict, env: dict, verbose: bool) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+        result_path = result_file.name
+    try:
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, os.path.join(BENCH_DIR, "scenarios.py"), name, json.dumps(params), result_path],
+            env={**os.environ, **BASE_ENV, **env},
+            stdout=None if verbose else subprocess.DEVNULL,
+            stderr=None if verbose else subprocess.PIPE,
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.decode('utf-8', 'replace').strip().splitlines() if completed.stderr else []
+            return {"error": error[-1] if error else f"code de sortie {completed.returncode}"}
+        with open(result_path, encoding='utf-8') as f:
+            metrics = json.load(f)
+        metrics["wall_seconds"] = time.perf_counter() - started
+        return metrics
+    finally:
+        os.remove(result_path)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment() -> dict:
+    try:
+        import yt_dlp
+        yt_dlp_version = yt_dlp.version.__version__
+    except ImportError:
+        yt_dlp_version = None
+    return {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "yt_dlp": yt_dlp_version,
+    }
+
+def result_key(result: dict) -> str:
+    params = result["params"]
+    suffix = "".join(f"[{short}={params[key]}]" for key, short in (("concurrency", "c"), ("connections", "n")) if key in params)
+    return result["scenario"] + suffix
+
+def flatten(metrics: dict, prefix: str = "") -> dict:
+    values = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + name] = value
+    return values
+
+def compare(baseline: dict, current: dict):
+    # Écart relatif de chaque mesure commune aux deux fichiers
+    previous = {result_key(result): flatten(result["metrics"]) for result in baseline["results"]}
+    print(f"{'mesure':<60} {'référence':>14} {'actuel':>14} {'écart':>9}")
+    for result in current["results"]:
+        key = result_key(result)
+        old_values = previous.get(key, {})
+        for name, value in flatten(result["metrics"]).items():
+            if name not in old_values:
+                continue
+            old = old_values[name]
+            change = f"{(value - old) / old * 100:+.1f}%" if old else "-"
+            print(f"{key + ' ' + name:<60} {old:>14.6g} {value:>14.6g} {change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesures de bout en bout du backend FireDown, sans accès réseau")
+    parser.add_argument("--quick", action="store_true", help="volumes réduits, pour une vérification rapide")
+    parser.add_argument("--only", action="append", help="scénario à exécuter (répétable)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="débit du serveur local en octets/s par connexion (0 : sans limite)")
+    parser.add_argument("--output", help="fichier JSON des résultats (par défaut : sortie standard)")
+    parser.add_argument("--compare", help="fichier JSON de référence à comparer aux résultats")
+    parser.add_argument("--verbose", action="store_true", help="affiche la sortie des scénarios")
+    args = parser.parse_args()
+
+    profile = PROFILES["quick" if args.quick else "full"]
+    media_dir = tempfile.mkdtemp(prefix="firedown-media-")
+    try:
+        count = max(profile["single"], profile["videos"])
+        names = create_media(media_dir, count, profile["media_size"])
+        server, base_url = serve(media_dir, args.bandwidth)
+        playlist_url = write_playlist(media_dir, base_url, names[:profile["videos"]])
+        shared = {"base_url": base_url, "playlist_url": playlist_url, "media": names, "media_size": profile["media_size"]}
+
+        results = []
+        for name, params, env in plan(profile):
+            if args.only and name not in args.only:
+                continue
+            print(f"{name} {params}", file=sys.stderr)
+            metrics = run_scenario(name, {**shared, **params}, env, args.verbose)
+            results.append({"scenario": name, "params": params, "metrics": metrics})
+        server.shutdown()
+    finally:
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+    report = {"environment": environment(), "profile": "quick" if args.quick else "full", "bandwidth": args.bandwidth, "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
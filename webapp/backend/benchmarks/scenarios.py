@@ -0,0 +1,197 @@
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Un scénario de mesure, exécuté dans son propre processus par run.py : la
+# configuration FIREDOWN_* est lue à l'import de main, et le pic de mémoire
+# (RSS) relevé à la fin ne concerne que ce scénario.
+#   python scenarios.py <scénario> '<paramètres JSON>' <fichier de résultat>
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.005
+
+def load_app(workdir: str):
+    # Dossier de téléchargements neuf : ni magasin ni cache d'une mesure précédente
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+    return main
+
+def poll(client, path: str, finished, timeout: float = 600) -> dict:
+    # Interroge path jusqu'à ce que finished(état) soit vrai, renvoie cet état
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        state = client.get(path).json()
+        if finished(state):
+            return state
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"Délai dépassé pendant la mesure ({path})")
+
+def distribution(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+
+def download_request(url: str) -> dict:
+    return {"url": url, "format": "video", "quality": "highest", "fileFormat": "mp4"}
+
+def single_download(client, main, params: dict) -> dict:
+    # Latence d'un téléchargement seul, de la demande à l'état "completed"
+    latencies = []
+    for name in params["media"][:params["count"]]:
+        started = time.perf_counter()
+        response = client.post("/start-download", json=download_request(params["base_url"] + name))
+        download_id = response.json()["download_id"]
+        status = poll(client, f"/check-status/{download_id}", lambda state: state["state"] in ("completed", "error"))
+        if status["state"] != "completed":
+            raise RuntimeError(f"Téléchargement en échec : {name}")
+        latencies.append(time.perf_counter() - started)
+    return {"downloads": len(latencies), "latency_seconds": distribution(latencies)}
+
+def batch(client, main, params: dict) -> dict:
+    videos = [download_request(params["base_url"] + name) for name in params["media"][:params["count"]]]
+    started = time.perf_counter()
+    batch_id = client.post("/start-batch-download", json={"videos": videos}).json()["batch_id"]
+    status = poll(client, f"/check-batch-status/{batch_id}", lambda state: state.get("is_ready") or state.get("error"))
+    elapsed = time.perf_counter() - started
+    if not status.get("is_ready"):
+        raise RuntimeError(f"Lot en échec : {status.get('error')}")
+    size = len(videos) * params["media_size"]
+    return {"videos": len(videos), "seconds": elapsed, "videos_per_second": len(videos) / elapsed, "bytes_per_second": size / elapsed}
+
+def session(client, main, params: dict) -> dict:
+    # Création (extraction de la playlist) puis téléchargement de toute la session
+    started = time.perf_counter()
+    response = client.post("/create-session", params={"url": params["playlist_url"], "format": "video", "quality": "highest", "fileFormat": "mp4"})
+    session_id = response.json()["session_id"]
+    created = time.perf_counter()
+    client.post(f"/start-session/{session_id}")
+    status = poll(client, f"/session-status/{session_id}", lambda state: state["status"] == "completed")
+    elapsed = time.perf_counter() - created
+    size = status["completed"] * params["media_size"]
+    return {
+        "videos": status["total"],
+        "failed": status["failed"],
+        "create_seconds": created - started,
+        "download_seconds": elapsed,
+        "videos_per_second": status["completed"] / elapsed,
+        "bytes_per_second": size / elapsed,
+    }
+
+def status_polling(client, main, params: dict) -> dict:
+    # Coût d'une lecture d'état avec des milliers de travaux en cours
+    session_id = "bench-session"
+    main.download_sessions[session_id] = main.DownloadSession(session_id=session_id, created_at=time.time(), videos=[], status="downloading")
+    started = time.perf_counter()
+    ids = []
+    for index in range(params["jobs"]):
+        download_id = str(uuid.uuid4())
+        status = main.register_download(download_id, session_id)
+        status.state = "downloading"
+        status.progress = index % 100
+        ids.append(download_id)
+    register_seconds = time.perf_counter() - started
+
+    results = {"jobs": len(ids), "register_seconds": register_seconds}
+    targets = {
+        "check_status": lambda: f"/check-status/{random.choice(ids)}",
+        "session_status": lambda: f"/session-status/{session_id}",
+    }
+    for name, target in targets.items():
+        timings = []
+        for _ in range(params["requests"]):
+            path = target()
+            begin = time.perf_counter()
+            client.get(path).raise_for_status()
+            timings.append(time.perf_counter() - begin)
+        results[f"{name}_seconds"] = distribution(timings)
+    return results
+
+def zip_build(client, main, params: dict) -> dict:
+    # Préparation (CRC, plan) et envoi d'une archive, directement et par /download-batch
+    from zipstream import ArchiveManifest, ZipStream
+    folder = os.path.join(main.DOWNLOAD_DIR, "batch_bench")
+    os.makedirs(folder, exist_ok=True)
+    block = os.urandom(1024 * 1024)
+    for index in range(params["files"]):
+        with open(os.path.join(folder, f"file_{index}.bin"), 'wb') as f:
+            for _ in range(params["file_size"] // len(block)):
+                f.write(block)
+
+    begin = time.perf_counter()
+    manifest = ArchiveManifest()
+    entries = [manifest.add(os.path.join(folder, f"file_{index}.bin")) for index in range(params["files"])]
+    for entry in entries:
+        entry.compute_crc()
+    crc_seconds = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    archive = ZipStream(entries)
+    layout_seconds = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    streamed = sum(len(chunk) for chunk in archive)
+    stream_seconds = time.perf_counter() - begin
+
+    status = main.BatchStatus("bench")
+    main.batch_statuses["bench"] = status
+    status.archive = manifest
+    status.filename = "bench.zip"
+    status.is_ready = True
+    begin = time.perf_counter()
+    received = 0
+    with client.stream("GET", "/download-batch/bench") as response:
+        for chunk in response.iter_bytes():
+            received += len(chunk)
+    http_seconds = time.perf_counter() - begin
+    if received != archive.size or streamed != archive.size:
+        raise RuntimeError("Taille d'archive inattendue")
+    return {
+        "files": len(entries),
+        "archive_bytes": archive.size,
+        "crc_seconds": crc_seconds,
+        "layout_seconds": layout_seconds,
+        "stream_seconds": stream_seconds,
+        "stream_bytes_per_second": archive.size / stream_seconds,
+        "http_seconds": http_seconds,
+        "http_bytes_per_second": archive.size / http_seconds,
+    }
+
+SCENARIOS = {
+    "single_download": single_download,
+    "batch": batch,
+    "session": session,
+    "status_polling": status_polling,
+    "zip_build": zip_build,
+}
+
+def run(name: str, params: dict) -> dict:
+    workdir = tempfile.mkdtemp(prefix="firedown-bench-")
+    try:
+        main = load_app(workdir)
+        from fastapi.testclient import TestClient
+        with TestClient(main.app) as client:
+            metrics = SCENARIOS[name](client, main, params)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # ru_maxrss est en kio sous Linux
+    metrics["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return metrics
+
+if __name__ == "__main__":
+    scenario, raw_params, result_path = sys.argv[1:4]
+    result = run(scenario, json.loads(raw_params))
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
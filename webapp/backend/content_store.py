@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import uuid
+import time
+from typing import Optional
+
+# Entrée du magasin : un fichier final, partagé par tous les travaux qui le référencent
+class StoreEntry:
+    def __init__(self, key: str, path: str):
+        self.key = key
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.owners = set()
+
+# Un téléchargement identique est en cours : l'appelant qui ne veut pas bloquer
+# son thread (et son emplacement) attend sa fin avec ContentStore.add_waiter
+class ContentPending(Exception):
+    def __init__(self, key: str):
+        super().__init__(f"Téléchargement identique en cours ({key})")
+        self.key = key
+
+class InFlight:
+    def __init__(self, remote: bool = False):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.remote = remote  # téléchargé par un autre processus, suivi par sa réservation
+
+# Réservation d'un contenu entre processus (workers uvicorn, firedown-worker) :
+# un fichier créé en exclusivité (O_EXCL) dans le dossier des réservations, qui
+# désigne le processus qui le télécharge. Elle est supprimée à la fin du
+# téléchargement, et ignorée si ce processus a disparu ou après claim_ttl
+CLAIM_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Magasin adressé par le contenu demandé (extracteur, identifiant, sélection de
+# formats, format de sortie, post-traitements). Une requête identique est servie
+# directement depuis le magasin, et les requêtes simultanées attendent le premier
+# téléchargement au lieu de le refaire. Les entrées sont comptées par référence ;
+# leur suppression est décidée par le gestionnaire d'espace disque (janitor.py).
+# Avec un dossier de réservations (claims), l'attente vaut aussi entre processus.
+class ContentStore:
+    def __init__(self, root: str, claims: Optional[str] = None, claim_ttl: float = 3 * 3600, poll_interval: float = 0.5):
+        self.root = root
+        self.claims = claims
+        self.claim_ttl = claim_ttl
+        self.poll_interval = poll_interval
+        os.makedirs(root, exist_ok=True)
+        if claims is not None:
+            os.makedirs(claims, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}  # clé -> StoreEntry
+        self._owners = {}  # propriétaire -> clés référencées
+        self._inflight = {}  # clé -> InFlight du téléchargement en cours
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    @staticmethod
+    def make_key(extractor: str, video_id: str, format_selection: str, file_format: str, postprocessors) -> str:
+        payload = json.dumps([extractor, video_id, format_selection, file_format, postprocessors], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def acquire(self, key: str, owner: str, wait: bool = True) -> Optional[str]:
+        # Renvoie le chemin si l'entrée existe. Sinon l'appelant devient responsable
+        # du téléchargement et doit appeler ingest() ou abandon(). Si un autre
+        # travail télécharge déjà ce contenu : attente de sa fin, ou ContentPending
+        # avec wait=False
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None and key not in self._inflight:
+                    # Entrée éventuellement produite par un autre processus (workers)
+                    entry = self._load_entry(key)
+                if entry is not None:
+                    if os.path.exists(entry.path):
+                        self._add_owner(entry, owner)
+                        entry.last_access = time.time()
+                        self.hits += 1
+                        return entry.path
+                    self._drop(entry)
+                pending = self._inflight.get(key)
+                if pending is None:
+                    if self._claim(key):
+                        self._inflight[key] = InFlight()
+                        self.misses += 1
+                        return None
+                    # Téléchargé par un autre processus : attendu comme un
+                    # téléchargement local, jusqu'à la fin de sa réservation
+                    pending = self._inflight[key] = InFlight(remote=True)
+                    threading.Thread(target=self._watch, args=(key,), name="firedown-store-claim", daemon=True).start()
+                if not wait:
+                    raise ContentPending(key)
+            # Un autre travail télécharge déjà ce contenu : on attend son résultat
+            pending.event.wait()
+
+    def add_waiter(self, key: str, callback) -> bool:
+        # callback() sera appelé, depuis le thread qui termine le téléchargement
+        # en cours, à sa fin ; False s'il est déjà terminé (rien n'est enregistré)
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                return False
+            pending.callbacks.append(callback)
+            return True
+
+    def ingest(self, key: str, path: str, owner: str) -> str:
+        entry_dir = os.path.join(self.root, key)
+        os.makedirs(entry_dir, exist_ok=True)
+        store_path = os.path.join(entry_dir, os.path.basename(path))
+        try:
+            os.replace(path, store_path)
+            # Le fichier reste visible à son emplacement d'origine, sans copie
+            link_into(store_path, os.path.dirname(path))
+            with self._lock:
+                entry = StoreEntry(key, store_path)
+                self._entries[key] = entry
+                self._add_owner(entry, owner)
+        finally:
+            self._finish(key)
+        return store_path
+
+    def abandon(self, key: str):
+        self._finish(key)
+
+    def release(self, owner: str):
+        with self._lock:
+            for key in self._owners.pop(owner, ()):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.owners.discard(owner)
+
+    def owners(self, key: str) -> set:
+        with self._lock:
+            entry = self._entries.get(key)
+            return set(entry.owners) if entry is not None else set()
+
+    def discard(self, key: str):
+        # Entrée supprimée du disque (éviction) : les requêtes suivantes la refont
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._drop(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.size for e in self._entries.values()),
+                "referenced": sum(1 for e in self._entries.values() if e.owners),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0,
+            }
+
+    def _add_owner(self, entry: StoreEntry, owner: str):
+        entry.owners.add(owner)
+        self._owners.setdefault(owner, set()).add(entry.key)
+
+    def _drop(self, entry: StoreEntry):
+        self._entries.pop(entry.key, None)
+        for owner in entry.owners:
+            self._owners.get(owner, set()).discard(entry.key)
+        self.evictions += 1
+
+    def _finish(self, key: str):
+        with self._lock:
+            pending = self._inflight.pop(key, None)
+            if pending is not None and not pending.remote and self.claims is not None:
+                # Entrée déjà en place (ingest) : les autres processus la trouvent
+                _remove(self._claim_path(key))
+        if pending is not None:
+            pending.event.set()
+            for callback in pending.callbacks:
+                callback()
+
+    def _claim_path(self, key: str) -> str:
+        return os.path.join(self.claims, key)
+
+    def _claim(self, key: str) -> bool:
+        if self.claims is None:
+            return True
+        path = self._claim_path(key)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._claim_stale(path):
+                    return False
+                _remove(path)  # processus disparu : la réservation est reprise
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(CLAIM_OWNER)
+            return True
+        return False
+
+    def _claim_stale(self, path: str) -> bool:
+        try:
+            with open(path) as f:
+                owner = f.read()
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            return True
+        host, _, rest = owner.partition(":")
+        pid, _, token = rest.partition(":")
+        if host == socket.gethostname() and pid.isdigit():
+            if int(pid) == os.getpid():
+                return owner != CLAIM_OWNER  # ce processus avant un redémarrage
+            if not _process_alive(int(pid)):
+                return True
+        return age > self.claim_ttl
+
+    def _watch(self, key: str):
+        # Fin du téléchargement d'un autre processus : sa réservation disparaît
+        path = self._claim_path(key)
+        while os.path.exists(path) and not self._claim_stale(path):
+            time.sleep(self.poll_interval)
+        self._finish(key)
+
+    def _load(self):
+        # Reprendre les entrées présentes sur disque après un redémarrage
+        for key in os.listdir(self.root):
+            if os.path.isdir(os.path.join(self.root, key)):
+                self._load_entry(key)
+
+    def _load_entry(self, key: str) -> Optional[StoreEntry]:
+        entry_dir = os.path.join(self.root, key)
+        if not os.path.isdir(entry_dir):
+            return None
+        files = [f for f in os.listdir(entry_dir) if os.path.isfile(os.path.join(entry_dir, f))]
+        if not files:
+            return None
+        entry = StoreEntry(key, os.path.join(entry_dir, files[0]))
+        entry.created_at = entry.last_access = os.path.getmtime(entry.path)
+        self._entries[key] = entry
+        return entry
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def link_into(path: str, folder: str) -> str:
+    # Lien physique vers un fichier du magasin (copie si le système de fichiers l'interdit)
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        if os.path.samefile(path, target):
+            return target
+        os.remove(target)
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copy2(path, target)
+    return target
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+from typing import Callable, Optional
+
+# Abonnement d'un client à un ensemble de sujets ("download:<id>", "batch:<id>",
+# "session:<id>"). Les changements sont seulement signalés : le client relit
+# l'état courant au moment de l'envoi, ce qui fusionne les mises à jour
+# intermédiaires.
+class Subscription:
+    def __init__(self, topics: set, loop: asyncio.AbstractEventLoop):
+        self.topics = topics
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.changed = set()
+        self._scheduled = False
+
+    def _notify(self, topic: str):
+        # Appelé sous le verrou du broker, éventuellement depuis un thread de téléchargement
+        self.changed.add(topic)
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    def take_changes(self, lock: threading.Lock) -> set:
+        with lock:
+            changed, self.changed = self.changed, set()
+            self._scheduled = False
+            self.event.clear()
+        return changed
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # sujet -> abonnements
+
+    def publish(self, topic: str):
+        # Chemin chaud (progress_hook) : simple recherche quand personne n'écoute
+        if topic not in self._subscribers:
+            return
+        with self._lock:
+            for subscription in self._subscribers.get(topic, ()):
+                subscription._notify(topic)
+
+    def subscribe(self, topics: set) -> Subscription:
+        subscription = Subscription(set(topics), asyncio.get_running_loop())
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    async def stream(self, topics: set, snapshot: Callable[[str], Optional[dict]], min_interval: float, keepalive: float = 15, poll_interval: Optional[float] = None):
+        # Flux Server-Sent Events : état initial de chaque sujet, puis au plus un
+        # envoi par intervalle contenant les sujets modifiés entre-temps.
+        # poll_interval : relecture périodique de tous les sujets, pour les travaux
+        # suivis par un autre processus dont ce broker ne reçoit pas les changements
+        subscription = self.subscribe(topics)
+        sent = {}
+
+        def render(topic: str) -> Optional[str]:
+            # Un état identique au dernier envoyé n'est pas renvoyé
+            event = format_event(topic, snapshot(topic))
+            if sent.get(topic) == event:
+                return None
+            sent[topic] = event
+            return event
+
+        timeout = keepalive if poll_interval is None else min(poll_interval, keepalive)
+        try:
+            for topic in sorted(topics):
+                yield render(topic)
+            idle = 0
+            while True:
+                try:
+                    await asyncio.wait_for(subscription.event.wait(), timeout=timeout)
+                    changed = subscription.take_changes(self._lock)
+                except asyncio.TimeoutError:
+                    changed = topics if poll_interval is not None else set()
+                events = [event for event in map(render, sorted(changed)) if event]
+                if events:
+                    idle = 0
+                    for event in events:
+                        yield event
+                    await asyncio.sleep(min_interval)
+                    continue
+                idle += timeout
+                if idle >= keepalive:
+                    idle = 0
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+def format_event(topic: str, payload: Optional[dict]) -> str:
+    kind, _, item_id = topic.partition(':')
+    data = dict(payload) if payload is not None else {"status": "not_found"}
+    data["id"] = item_id
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,85 @@
+import asyncio
+import os
+from typing import Callable, Optional
+
+# Conversions ffmpeg exécutées comme sous-processus asynchrones, hors des
+# emplacements de téléchargement : les téléchargements réseau continuent
+# pendant que les conversions occupent les cœurs.
+
+class FFmpegError(Exception):
+    pass
+
+def parse_progress_time(key: str, value: str) -> Optional[float]:
+    # Position atteinte dans la sortie, en secondes (lignes "clé=valeur" de -progress)
+    if key in ("out_time_us", "out_time_ms"):  # out_time_ms est aussi en microsecondes
+        try:
+            return int(value) / 1_000_000
+        except ValueError:
+            return None
+    return None
+
+class FFmpegPool:
+    def __init__(self, size: int, threads_per_job: int):
+        self.size = max(1, size)
+        self.threads_per_job = max(1, threads_per_job)  # budget de threads de chaque conversion
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.waiting = 0
+
+    async def run(self, ffmpeg: str, inputs: list, output_args: list, output: str,
+                  duration: Optional[float] = None, on_progress: Optional[Callable[[float], None]] = None):
+        # on_progress reçoit la fraction convertie (0 à 1), si la durée est connue
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            await self._convert(ffmpeg, inputs, output_args, output, duration, on_progress)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def _convert(self, ffmpeg: str, inputs: list, output_args: list, output: str,
+                       duration: Optional[float], on_progress: Optional[Callable[[float], None]]):
+        cmd = [ffmpeg, '-hide_banner', '-nostdin', '-nostats', '-loglevel', 'error', '-y', '-progress', 'pipe:1']
+        for path in inputs:
+            cmd += ['-i', path]
+        cmd += [*output_args, '-threads', str(self.threads_per_job), output]
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr = asyncio.ensure_future(process.stderr.read())
+        try:
+            async for line in process.stdout:
+                key, _, value = line.decode('utf-8', 'replace').strip().partition('=')
+                position = parse_progress_time(key, value)
+                if position is not None and duration and on_progress:
+                    on_progress(min(1.0, max(0.0, position / duration)))
+            returncode = await process.wait()
+        except BaseException:
+            # Conversion annulée : le processus et la sortie partielle disparaissent
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            stderr.cancel()
+            if os.path.exists(output):
+                os.remove(output)
+            raise
+        message = (await stderr).decode('utf-8', 'replace').strip()
+        if returncode != 0:
+            if os.path.exists(output):
+                os.remove(output)
+            raise FFmpegError(f"ffmpeg a échoué ({returncode}) : {message.splitlines()[-1] if message else ''}")
+        if on_progress:
+            on_progress(1.0)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "threads_per_job": self.threads_per_job, "running": self.running, "waiting": self.waiting}
@@ -0,0 +1,226 @@
+import hashlib
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Iterator, Optional
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Requêtes partielles (Range, If-Range) et conditionnelles (If-None-Match,
+# If-Modified-Since) pour les fichiers et les archives produites à la volée.
+# Une seule plage est servie par réponse ; une demande de plusieurs plages
+# reçoit le contenu complet, ce que la RFC 9110 autorise.
+
+CHUNK_SIZE = 1024 * 1024
+
+class Validators:
+    def __init__(self, etag: str, mtime: float):
+        self.etag = etag  # validateur fort, entre guillemets
+        self.mtime = int(mtime)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+
+def file_validators(stat: os.stat_result) -> Validators:
+    # Les fichiers produits ne sont jamais réécrits sur place : taille, date
+    # (ns) et inode suffisent à identifier leur contenu
+    tag = f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    return Validators(f'"{tag}"', stat.st_mtime)
+
+def archive_validators(entries: list) -> Validators:
+    # L'archive ne dépend que des noms, tailles et dates de ses fichiers
+    digest = hashlib.sha1()
+    for entry in entries:
+        digest.update(f"{entry.arcname}\0{entry.size}\0{entry.mtime}\n".encode('utf-8'))
+    mtime = max((entry.mtime for entry in entries), default=0)
+    return Validators(f'"{digest.hexdigest()}"', mtime)
+
+def _parse_date(value: str) -> Optional[int]:
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Comparaison faible, comme l'exige If-None-Match
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+def parse_range(header: str, size: int):
+    # Renvoie (début, fin) inclus, None si l'en-tête est ignoré, ou
+    # "unsatisfiable" si la plage est hors du contenu
+    unit, _, ranges = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if not first:
+            # Suffixe : les N derniers octets
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    return start, size - 1 if end is None else min(end, size - 1)
+
+def evaluate(headers, validators: Validators, size: int):
+    # Ordre d'évaluation de la RFC 9110 (section 13.2.2) pour GET et HEAD :
+    # renvoie ("not_modified"|"unsatisfiable"|"partial"|"full", plage)
+    if_none_match = headers.get('if-none-match')
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, validators.etag):
+            return "not_modified", None
+    else:
+        since = headers.get('if-modified-since')
+        since = _parse_date(since) if since else None
+        if since is not None and validators.mtime <= since:
+            return "not_modified", None
+
+    range_header = headers.get('range')
+    if not range_header:
+        return "full", None
+    if_range = headers.get('if-range')
+    if if_range is not None:
+        if if_range.startswith(('"', 'W/')):
+            # If-Range exige une comparaison forte
+            if if_range != validators.etag:
+                return "full", None
+        elif _parse_date(if_range) != validators.mtime:
+            return "full", None
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        return "full", None
+    if byte_range == "unsatisfiable":
+        return "unsatisfiable", None
+    return "partial", byte_range
+
+def _base_headers(validators: Validators, extra: Optional[dict]) -> dict:
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': validators.etag,
+        'Last-Modified': validators.last_modified,
+    }
+    headers.update(extra or {})
+    return headers
+
+def _special_response(outcome: str, headers: dict, size: int) -> Optional[Response]:
+    if outcome == "not_modified":
+        headers.pop('Content-Disposition', None)
+        return Response(status_code=304, headers=headers)
+    if outcome == "unsatisfiable":
+        headers['Content-Range'] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+    return None
+
+def _selected_range(outcome: str, byte_range: Optional[tuple], size: int, headers: dict) -> tuple:
+    if outcome == "partial":
+        start, end = byte_range
+        headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        status_code = 206
+    else:
+        start, end = 0, size - 1
+        status_code = 200
+    headers['Content-Length'] = str(end - start + 1)
+    return status_code, start, end
+
+# Fichier servi en entier ou par plage. Les octets sont confiés au serveur
+# ASGI sans copie (extensions zerocopysend et pathsend) lorsqu'il le permet,
+# sinon lus par blocs hors de la boucle d'événements.
+# on_close est appelé une fois l'envoi terminé ou interrompu.
+class RangeFileResponse(Response):
+    def __init__(self, path: str, stat: os.stat_result, status_code: int, byte_range: tuple, headers: dict, media_type: str,
+                 on_close: Optional[Callable[[], None]] = None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.stat = stat
+        self.start, self.end = byte_range
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self._send(scope, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+    async def _send(self, scope: Scope, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            with open(self.path, 'rb') as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+        elif "http.response.pathsend" in extensions and count == self.stat.st_size:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+        else:
+            fd = await anyio.to_thread.run_sync(os.open, self.path, os.O_RDONLY)
+            try:
+                position = self.start
+                remaining = count
+                while remaining > 0:
+                    chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, remaining), position)
+                    if not chunk:
+                        raise IOError(f"Fichier tronqué pendant l'envoi : {self.path}")
+                    position += len(chunk)
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            finally:
+                os.close(fd)
+
+class RangeStreamingResponse(StreamingResponse):
+    def __init__(self, content, status_code: int, headers: dict, media_type: str,
+                 on_close: Optional[Callable[[], None]] = None):
+        super().__init__(content, status_code=status_code, headers=headers, media_type=media_type)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+def file_response(request: Request, path: str, headers: Optional[dict] = None, media_type: str = 'application/octet-stream',
+                  on_close: Optional[Callable[[], None]] = None) -> Response:
+    stat = os.stat(path)
+    size = stat.st_size
+    validators = file_validators(stat)
+    response_headers = _base_headers(validators, headers)
+    outcome, byte_range = evaluate(request.headers, validators, size)
+    special = _special_response(outcome, response_headers, size)
+    if special is not None:
+        if on_close is not None:
+            on_close()
+        return special
+    status_code, start, end = _selected_range(outcome, byte_range, size, response_headers)
+    return RangeFileResponse(path, stat, status_code, (start, end), response_headers, media_type, on_close)
+
+def stream_response(request: Request, size: int, validators: Validators, iter_range: Callable[[int, int], Iterator[bytes]],
+                    headers: Optional[dict] = None, media_type: str = 'application/octet-stream',
+                    on_close: Optional[Callable[[], None]] = None) -> Response:
+    # Contenu produit à la volée (archive ZIP) dont la taille est connue d'avance
+    response_headers = _base_headers(validators, headers)
+    outcome, byte_range = evaluate(request.headers, validators, size)
+    special = _special_response(outcome, response_headers, size)
+    if special is not None:
+        if on_close is not None:
+            on_close()
+        return special
+    status_code, start, end = _selected_range(outcome, byte_range, size, response_headers)
+    body = iter(()) if request.method == "HEAD" else iter_range(start, end)
+    return RangeStreamingResponse(body, status_code, response_headers, media_type, on_close)
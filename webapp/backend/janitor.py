@@ -0,0 +1,281 @@
+import os
+import shutil
+import stat as stat_module
+import threading
+import time
+from typing import Callable, Optional
+
+# Occupation du volume des téléchargements, tenue à jour élément par élément
+# (dossier d'un travail, d'un lot, entrée du magasin) : aucun parcours complet
+# du volume après l'inventaire de démarrage. Au-delà du seuil haut, les éléments
+# les moins récemment utilisés sont supprimés jusqu'au seuil bas, sauf ceux
+# qu'un travail en cours utilise encore ou dont un fichier est en cours d'envoi.
+# Les éléments qui partagent un fichier (liens physiques entre une entrée du
+# magasin et les dossiers des travaux) sont supprimés ensemble : supprimer l'un
+# d'eux seulement ne libérerait rien.
+
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+def parse_size(value: str) -> int:
+    # "500M", "20G", ou un nombre d'octets
+    value = value.strip().upper().removesuffix('B')
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+class DiskItem:
+    def __init__(self, path: str):
+        self.path = path
+        self.inodes = {}  # (périphérique, inode) -> taille
+        self.last_access = 0.0
+
+class DiskJanitor:
+    def __init__(self, root: str, containers: list, prefixes: tuple, quota: int,
+                 high_watermark: float, low_watermark: float,
+                 is_active: Callable[[str], bool], on_evict: Callable[[str], None]):
+        # containers : dossiers dont chaque enfant est un élément (jobs, store) ;
+        # prefixes : préfixes des éléments placés directement dans root (batch_...)
+        self.root = os.path.abspath(root)
+        self.containers = [os.path.abspath(container) for container in containers]
+        self.prefixes = tuple(prefixes)
+        self.quota = quota
+        self.high = int(quota * high_watermark)
+        self.low = int(quota * low_watermark)
+        self.is_active = is_active
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._items = {}  # chemin -> DiskItem
+        self._inodes = {}  # (périphérique, inode) -> [taille, chemins des éléments]
+        self._pins = {}  # chemin d'un élément -> envois en cours
+        self.used = 0  # octets, chaque inode compté une fois (liens physiques)
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def item_path(self, path: str) -> Optional[str]:
+        path = os.path.abspath(path)
+        for container in self.containers:
+            if path.startswith(container + os.sep):
+                return os.path.join(container, path[len(container) + 1:].split(os.sep, 1)[0])
+        if path.startswith(self.root + os.sep):
+            child = path[len(self.root) + 1:].split(os.sep, 1)[0]
+            if child.startswith(self.prefixes):
+                return os.path.join(self.root, child)
+        return None
+
+    def scan(self):
+        # Inventaire initial ; les éléments sont ensuite suivis un par un
+        paths = []
+        for container in self.containers:
+            if os.path.isdir(container):
+                paths += [os.path.join(container, name) for name in os.listdir(container)]
+        if os.path.isdir(self.root):
+            paths += [os.path.join(self.root, name) for name in os.listdir(self.root) if name.startswith(self.prefixes)]
+        for path in paths:
+            self._track(path, None)
+        self.ensure_space(0)
+
+    def track(self, path: str):
+        # Élément créé ou modifié (fin d'un travail) : sa taille est recalculée
+        if self._track(path, time.time()):
+            self.ensure_space(0)
+
+    def _track(self, path: str, access: Optional[float]) -> bool:
+        item_path = self.item_path(path)
+        if item_path is None:
+            return False
+        inodes, mtime = _measure(item_path)
+        with self._lock:
+            item = self._items.pop(item_path, None)
+            if item is not None:
+                self._release_inodes(item)
+            if not inodes and not os.path.exists(item_path):
+                return False
+            item = item or DiskItem(item_path)
+            item.inodes = inodes
+            item.last_access = access if access is not None else mtime
+            for key, size in inodes.items():
+                ref = self._inodes.setdefault(key, [size, set()])
+                if not ref[1]:
+                    self.used += size
+                ref[1].add(item_path)
+            self._items[item_path] = item
+        return True
+
+    def untrack(self, path: str):
+        # Élément supprimé par ailleurs (ou tout un dossier de conteneurs)
+        path = os.path.abspath(path)
+        with self._lock:
+            for item_path in [p for p in self._items if p == path or p.startswith(path + os.sep)]:
+                self._release_inodes(self._items.pop(item_path))
+
+    def touch(self, path: str):
+        item_path = self.item_path(path)
+        with self._lock:
+            item = self._items.get(item_path)
+            if item is not None:
+                item.last_access = time.time()
+
+    def pin(self, path: str):
+        # Fichier en cours d'envoi : son élément n'est pas supprimé avant unpin()
+        item_path = self.item_path(path)
+        if item_path is not None:
+            with self._lock:
+                self._pins[item_path] = self._pins.get(item_path, 0) + 1
+
+    def unpin(self, path: str):
+        item_path = self.item_path(path)
+        with self._lock:
+            count = self._pins.get(item_path, 0) - 1
+            if count > 0:
+                self._pins[item_path] = count
+            else:
+                self._pins.pop(item_path, None)
+
+    def ensure_space(self, needed: int) -> bool:
+        # Libère de la place pour needed octets : évictions LRU jusqu'au seuil bas
+        # si le quota ou l'espace libre du volume ne suffisent plus. is_active est
+        # appelé hors du verrou : il peut lire le stockage partagé des travaux
+        free = shutil.disk_usage(self.root).free
+        with self._lock:
+            if self.used + needed <= self.high and needed <= free:
+                return True
+            groups = self._groups()
+        victims = []
+        for _, paths in groups:
+            with self._lock:
+                if self.used + needed <= self.low and needed <= free:
+                    break
+            if self._protected(paths):
+                continue
+            with self._lock:
+                evicted = self._evict(paths)
+            free += sum(freed for _, freed in evicted)
+            victims += evicted
+        with self._lock:
+            enough = self.used + needed <= self.quota and needed <= free
+        self._remove(victims)
+        return enough
+
+    def expire(self, max_age: float) -> int:
+        # Éléments inutilisés depuis max_age secondes, quelle que soit l'occupation
+        limit = time.time() - max_age
+        with self._lock:
+            groups = [paths for last_access, paths in self._groups() if last_access < limit]
+        victims = []
+        for paths in groups:
+            if not self._protected(paths):
+                with self._lock:
+                    victims += self._evict(paths)
+        self._remove(victims)
+        return len(victims)
+
+    def remove(self, path: str) -> bool:
+        # Suppression demandée par un client, de cet élément seul (les autres
+        # liens vers ses fichiers restent) ; refusée s'il est encore utilisé
+        item_path = self.item_path(path)
+        if item_path is None or self._protected([item_path]):
+            return False
+        with self._lock:
+            item = self._items.pop(item_path, None)
+            if item is not None:
+                self._release_inodes(item)
+        _delete(item_path)
+        self.on_evict(item_path)
+        return True
+
+    def _groups(self) -> list:
+        # Éléments reliés par leurs fichiers partagés, du groupe le moins
+        # récemment utilisé au plus récent : (dernier accès, chemins)
+        groups = []
+        seen = set()
+        for path in self._items:
+            if path in seen:
+                continue
+            seen.add(path)
+            members = []
+            pending = [path]
+            while pending:
+                member = pending.pop()
+                members.append(member)
+                for key in self._items[member].inodes:
+                    for other in self._inodes[key][1]:
+                        if other not in seen:
+                            seen.add(other)
+                            pending.append(other)
+            groups.append((max(self._items[member].last_access for member in members), members))
+        groups.sort(key=lambda group: group[0])
+        return groups
+
+    def _protected(self, paths: list) -> bool:
+        with self._lock:
+            if any(path in self._pins for path in paths):
+                return True
+        return any(self.is_active(path) for path in paths)
+
+    def _evict(self, paths: list) -> list:
+        # Éléments encore suivis du groupe, retirés de l'inventaire : (chemin, octets libérés)
+        evicted = []
+        for path in paths:
+            item = self._items.pop(path, None)
+            if item is not None:
+                evicted.append((path, self._release_inodes(item)))
+        return evicted
+
+    def _release_inodes(self, item: DiskItem) -> int:
+        freed = 0
+        for key in item.inodes:
+            ref = self._inodes.get(key)
+            if ref is None:
+                continue
+            ref[1].discard(item.path)
+            if not ref[1]:
+                del self._inodes[key]
+                self.used -= ref[0]
+                freed += ref[0]
+        return freed
+
+    def _remove(self, victims: list):
+        for path, freed in victims:
+            _delete(path)
+            self.on_evict(path)
+            with self._lock:
+                self.evictions += 1
+                self.evicted_bytes += freed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "quota": self.quota,
+                "high_watermark": self.high,
+                "low_watermark": self.low,
+                "used": self.used,
+                "items": len(self._items),
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "pinned": len(self._pins),
+            }
+
+def _delete(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _measure(path: str) -> tuple:
+    # Inodes (taille) d'un élément et date de sa dernière modification
+    inodes = {}
+    mtime = 0.0
+    if os.path.isfile(path):
+        files = [path]
+    else:
+        files = [os.path.join(folder, name) for folder, _, names in os.walk(path) for name in names]
+    for file_path in files:
+        try:
+            stat = os.lstat(file_path)
+        except OSError:
+            continue  # supprimé entre-temps
+        if not stat_module.S_ISREG(stat.st_mode):
+            continue
+        inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+        mtime = max(mtime, stat.st_mtime)
+    return inodes, mtime
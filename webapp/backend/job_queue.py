@@ -0,0 +1,123 @@
+import json
+import time
+from typing import Optional
+
+from job_store import SQLiteConnections, connect_redis
+
+# File des téléchargements confiés aux processus firedown-worker.
+# get() renvoie (jeton, travail) ; done(jeton) retire le travail une fois traité.
+
+# File SQLite, pour des workers sur la même machine que l'API (volume partagé local)
+class SQLiteJobQueue:
+    def __init__(self, path: str, poll_interval: float = 0.5):
+        self.db = SQLiteConnections(path)
+        self.poll_interval = poll_interval
+        with self.db.get() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " claimed_by TEXT,"
+                " claimed_at REAL)"
+            )
+
+    def put(self, job: dict):
+        with self.db.get() as conn:
+            conn.execute("INSERT INTO queue (payload) VALUES (?)", (json.dumps(job),))
+
+    def get(self, worker: str, timeout: float) -> Optional[tuple]:
+        deadline = time.monotonic() + timeout
+        while True:
+            conn = self.db.get()
+            row = conn.execute(
+                "SELECT seq, payload FROM queue WHERE claimed_by IS NULL ORDER BY seq LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                with conn:
+                    claimed = conn.execute(
+                        "UPDATE queue SET claimed_by = ?, claimed_at = ? WHERE seq = ? AND claimed_by IS NULL",
+                        (worker, time.time(), row[0])
+                    ).rowcount
+                if claimed:
+                    return row[0], json.loads(row[1])
+                continue  # pris par un autre worker entre-temps
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def done(self, token):
+        with self.db.get() as conn:
+            conn.execute("DELETE FROM queue WHERE seq = ?", (token,))
+
+    def release_claims(self, worker: str):
+        # Travaux pris par ce worker avant son arrêt : remis dans la file
+        with self.db.get() as conn:
+            conn.execute("UPDATE queue SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?", (worker,))
+
+    def depth(self) -> int:
+        return self.db.get().execute("SELECT COUNT(*) FROM queue WHERE claimed_by IS NULL").fetchone()[0]
+
+    def position(self, download_id: str) -> Optional[int]:
+        # Travaux en attente avant celui-ci, None s'il n'est plus en attente
+        conn = self.db.get()
+        row = conn.execute(
+            "SELECT seq FROM queue WHERE claimed_by IS NULL AND json_extract(payload, '$.download_id') = ?",
+            (download_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return conn.execute("SELECT COUNT(*) FROM queue WHERE claimed_by IS NULL AND seq < ?", (row[0],)).fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+# File Redis (ou tout serveur compatible avec le protocole Redis), pour des
+# workers répartis sur plusieurs machines. Chaque worker déplace le travail
+# pris dans sa propre liste, d'où il est retiré une fois traité.
+class RedisJobQueue:
+    def __init__(self, url: str, prefix: str = "firedown"):
+        self.client = connect_redis(url)
+        self.key = f"{prefix}:queue"
+        self.prefix = prefix
+
+    def _claimed_key(self, worker: str) -> str:
+        return f"{self.prefix}:claimed:{worker}"
+
+    def put(self, job: dict):
+        self.client.lpush(self.key, json.dumps(job))
+
+    def get(self, worker: str, timeout: float) -> Optional[tuple]:
+        payload = self.client.brpoplpush(self.key, self._claimed_key(worker), timeout=max(1, int(timeout)))
+        if payload is None:
+            return None
+        return (worker, payload), json.loads(payload)
+
+    def done(self, token):
+        worker, payload = token
+        self.client.lrem(self._claimed_key(worker), 1, payload)
+
+    def release_claims(self, worker: str):
+        # Remis en tête de file (côté lu par brpoplpush)
+        while self.client.lmove(self._claimed_key(worker), self.key, "RIGHT", "RIGHT") is not None:
+            pass
+
+    def depth(self) -> int:
+        return self.client.llen(self.key)
+
+    def position(self, download_id: str) -> Optional[int]:
+        # La file est lue par la droite : le travail le plus à droite passe en premier
+        payloads = self.client.lrange(self.key, 0, -1)
+        for index, payload in enumerate(reversed(payloads)):
+            if json.loads(payload).get('download_id') == download_id:
+                return index
+        return None
+
+    def close(self):
+        self.client.close()
+
+def create_job_queue(backend: str, path: str, redis_url: str = ""):
+    if backend == "sqlite":
+        return SQLiteJobQueue(path)
+    if backend == "redis":
+        return RedisJobQueue(redis_url)
+    raise ValueError(f"File des travaux inconnue : {backend}")
@@ -0,0 +1,420 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+try:
+    import redis
+except ImportError:  # dépendance optionnelle, seulement pour un broker Redis
+    redis = None
+
+def connect_redis(url: str):
+    if redis is None:
+        raise RuntimeError("Le paquet redis est nécessaire pour utiliser un broker Redis")
+    return redis.Redis.from_url(url)
+
+# Connexions SQLite, une par thread (boucle d'événements, pools de threads)
+class SQLiteConnections:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.get().execute("PRAGMA journal_mode=WAL")
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._local = threading.local()
+
+# Stockage des états de travaux (téléchargements, lots, sessions).
+# MemoryJobStore : tout reste dans le processus (comportement historique).
+# SQLiteJobStore : états partagés entre plusieurs workers uvicorn et conservés
+# après un redémarrage.
+# RedisJobStore : états partagés entre plusieurs machines.
+class MemoryJobStore:
+    persistent = False
+
+    def load(self, kind: str, job_id: str) -> Optional[dict]:
+        return None
+
+    def load_session_jobs(self, kind: str, session_id: str) -> dict:
+        return {}
+
+    def save_many(self, records: list):
+        pass
+
+    def delete(self, kind: str, job_id: str):
+        pass
+
+    def purge(self, max_age: float) -> int:
+        return 0
+
+    def record_completions(self, completions: list):
+        pass
+
+    def load_completions(self, since: float) -> list:
+        return []
+
+    def close(self):
+        pass
+
+class SQLiteJobStore:
+    persistent = True
+
+    def __init__(self, path: str):
+        self.db = SQLiteConnections(path)
+        with self.db.get() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " kind TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " session_id TEXT,"
+                " state TEXT NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_session ON jobs (kind, session_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated_at)")
+            # Fins des travaux de tous les processus (débit observé)
+            conn.execute("CREATE TABLE IF NOT EXISTS completions (at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_at ON completions (at)")
+
+    def load(self, kind: str, job_id: str) -> Optional[dict]:
+        row = self.db.get().execute(
+            "SELECT state FROM jobs WHERE kind = ? AND id = ?", (kind, job_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_session_jobs(self, kind: str, session_id: str) -> dict:
+        rows = self.db.get().execute(
+            "SELECT id, state FROM jobs WHERE kind = ? AND session_id = ?", (kind, session_id)
+        ).fetchall()
+        return {job_id: json.loads(state) for job_id, state in rows}
+
+    def save_many(self, records: list):
+        # records : (type, identifiant, session, état) ; une seule transaction par lot
+        if not records:
+            return
+        now = time.time()
+        with self.db.get() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (kind, id, session_id, state, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (kind, id) DO UPDATE SET"
+                " session_id = excluded.session_id, state = excluded.state, updated_at = excluded.updated_at",
+                [(kind, job_id, session_id, json.dumps(state), now) for kind, job_id, session_id, state in records]
+            )
+
+    def delete(self, kind: str, job_id: str):
+        with self.db.get() as conn:
+            conn.execute("DELETE FROM jobs WHERE kind = ? AND id = ?", (kind, job_id))
+
+    def purge(self, max_age: float) -> int:
+        # Travaux sans aucune mise à jour depuis max_age secondes
+        with self.db.get() as conn:
+            conn.execute("DELETE FROM completions WHERE at < ?", (time.time() - max_age,))
+            return conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - max_age,)).rowcount
+
+    def record_completions(self, completions: list):
+        if not completions:
+            return
+        with self.db.get() as conn:
+            conn.executemany("INSERT INTO completions (at) VALUES (?)", [(at,) for at in completions])
+
+    def load_completions(self, since: float) -> list:
+        rows = self.db.get().execute("SELECT at FROM completions WHERE at >= ? ORDER BY at", (since,)).fetchall()
+        return [at for at, in rows]
+
+    def close(self):
+        self.db.close()
+
+class RedisJobStore:
+    persistent = True
+
+    def __init__(self, url: str, ttl: float, prefix: str = "firedown"):
+        self.client = connect_redis(url)
+        self.ttl = int(ttl)  # les clés expirent d'elles-mêmes sans mise à jour
+        self.prefix = prefix
+
+    def _key(self, kind: str, job_id: str) -> str:
+        return f"{self.prefix}:job:{kind}:{job_id}"
+
+    def _session_key(self, kind: str, session_id: str) -> str:
+        return f"{self.prefix}:session:{kind}:{session_id}"
+
+    @property
+    def _completions_key(self) -> str:
+        return f"{self.prefix}:completions"
+
+    def load(self, kind: str, job_id: str) -> Optional[dict]:
+        value = self.client.get(self._key(kind, job_id))
+        return json.loads(value) if value else None
+
+    def load_session_jobs(self, kind: str, session_id: str) -> dict:
+        job_ids = [job_id.decode() for job_id in self.client.smembers(self._session_key(kind, session_id))]
+        if not job_ids:
+            return {}
+        values = self.client.mget([self._key(kind, job_id) for job_id in job_ids])
+        return {job_id: json.loads(value) for job_id, value in zip(job_ids, values) if value}
+
+    def save_many(self, records: list):
+        if not records:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for kind, job_id, session_id, state in records:
+            pipe.set(self._key(kind, job_id), json.dumps(state), ex=self.ttl)
+            if session_id:
+                pipe.sadd(self._session_key(kind, session_id), job_id)
+                pipe.expire(self._session_key(kind, session_id), self.ttl)
+        pipe.execute()
+
+    def delete(self, kind: str, job_id: str):
+        self.client.delete(self._key(kind, job_id))
+
+    def purge(self, max_age: float) -> int:
+        return 0
+
+    def record_completions(self, completions: list):
+        # Ensemble trié par date de fin ; les fins plus anciennes que la durée
+        # de conservation des états sont retirées au passage
+        if not completions:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(self._completions_key, {f"{at}:{os.urandom(4).hex()}": at for at in completions})
+        pipe.zremrangebyscore(self._completions_key, "-inf", time.time() - self.ttl)
+        pipe.execute()
+
+    def load_completions(self, since: float) -> list:
+        return [at for _, at in self.client.zrangebyscore(self._completions_key, since, "+inf", withscores=True)]
+
+    def close(self):
+        self.client.close()
+
+def create_job_store(backend: str, path: str, redis_url: str = "", retention: float = 86400):
+    if backend == "sqlite":
+        return SQLiteJobStore(path)
+    if backend == "redis":
+        return RedisJobStore(redis_url, retention)
+    if backend == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Stockage des travaux inconnu : {backend}")
+
+# Écriture différée des tables d'un même stockage, depuis un thread dédié : les
+# états modifiés de toutes les tables partent en une seule transaction, à
+# intervalle régulier ou dès qu'une écriture urgente est demandée.
+class JobStateWriter:
+    def __init__(self, store, interval: float):
+        self.store = store
+        self.interval = interval
+        self.tables = []
+        self.requested = threading.Event()
+        self.lock = threading.Lock()  # une écriture à la fois : jamais d'état plus ancien par-dessus
+        self.periodic = []  # autres échanges avec le stockage, au même rythme (débit partagé)
+
+    def request(self):
+        self.requested.set()
+
+    def flush(self):
+        with self.lock:
+            taken = [(table, table.take_dirty()) for table in self.tables]
+            try:
+                self.store.save_many([record for _, records in taken for _, _, record in records])
+            except Exception:
+                for table, records in taken:
+                    table.restore_dirty(records)
+                raise
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            self.requested.wait(self.interval)
+            self.requested.clear()
+            try:
+                self.flush()
+                for task in self.periodic:
+                    task()
+            except Exception as e:
+                print(f"Erreur lors de l'enregistrement des états : {e}")
+
+# Table des travaux d'un type donné, utilisée comme un dictionnaire.
+# Les objets créés par ce processus restent en mémoire ; les autres sont relus
+# depuis le stockage partagé. Les modifications sont seulement marquées, puis
+# écrites par lots par flush() : le chemin chaud (progress_hook) ne touche
+# jamais la base de données. Avec un JobStateWriter, les écritures urgentes
+# (création, fin du travail) sont aussi différées : elles réveillent son thread
+# au lieu d'être faites par l'appelant.
+class JobTable(MutableMapping):
+    def __init__(self, kind: str, store, from_state: Callable[[dict], object],
+                 writer: Optional[JobStateWriter] = None):
+        self.kind = kind
+        self.store = store
+        self.from_state = from_state
+        self.writer = writer
+        if writer is not None:
+            writer.tables.append(self)
+        self._local = {}
+        self._sessions = {}  # session -> travaux locaux (session fixée à l'enregistrement)
+        self._dirty = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, job_id):
+        job = self._local.get(job_id)
+        if job is not None:
+            return job
+        state = self.store.load(self.kind, job_id) if self.store.persistent else None
+        if state is None:
+            raise KeyError(job_id)
+        return self.from_state(state)
+
+    def __setitem__(self, job_id, job):
+        self._local[job_id] = job
+        self._index(job_id, job)
+        # Le travail doit être visible des autres workers dès que son identifiant
+        # est renvoyé au client (écriture différée : voir save())
+        self.save(job_id, job)
+
+    def __delitem__(self, job_id):
+        job = self._local.pop(job_id, None)
+        found = job is not None
+        if found:
+            self._unindex(job_id, job)
+        with self._lock:
+            self._dirty.pop(job_id, None)
+        if self.store.persistent:
+            self.store.delete(self.kind, job_id)
+        elif not found:
+            raise KeyError(job_id)
+
+    def __iter__(self):
+        # Seuls les travaux de ce processus sont parcourus
+        return iter(list(self._local))
+
+    def __len__(self):
+        return len(self._local)
+
+    def local(self, job_id: str):
+        # Travail de ce processus uniquement, sans lecture du stockage partagé
+        return self._local.get(job_id)
+
+    async def fetch(self, job_id: str):
+        # Lecture depuis une route (une seule, là où « in » puis [] en feraient
+        # deux) : travail local servi directement, état partagé lu hors de la
+        # boucle d'événements ; None si le travail n'existe pas
+        job = self._local.get(job_id)
+        if job is not None or not self.store.persistent:
+            return job
+        return await asyncio.to_thread(self.get, job_id)
+
+    def _index(self, job_id: str, job):
+        session_id = getattr(job, 'session_id', None)
+        if session_id:
+            with self._lock:
+                self._sessions.setdefault(session_id, set()).add(job_id)
+
+    def _unindex(self, job_id: str, job):
+        session_id = getattr(job, 'session_id', None)
+        if session_id:
+            with self._lock:
+                job_ids = self._sessions.get(session_id)
+                if job_ids is not None:
+                    job_ids.discard(job_id)
+                    if not job_ids:
+                        del self._sessions[session_id]
+
+    def record(self, job_id: str, job) -> tuple:
+        return (self.kind, job_id, getattr(job, 'session_id', None), job.to_state())
+
+    def mark_dirty(self, job_id: str, job):
+        if not self.store.persistent or job_id is None:
+            return
+        with self._lock:
+            self._dirty[job_id] = job
+
+    def save(self, job_id: str, job):
+        # Changements que les autres processus doivent voir sans délai (création,
+        # fin du travail) : écriture immédiate, ou réveil du thread d'écriture
+        if not self.store.persistent or job_id is None:
+            return
+        if self.writer is not None:
+            self.mark_dirty(job_id, job)
+            self.writer.request()
+            return
+        with self._lock:
+            self._dirty.pop(job_id, None)
+        self.store.save_many([self.record(job_id, job)])
+
+    def detach(self, job_id: str):
+        self.detach_many([job_id])
+
+    def detach_many(self, job_ids: list):
+        # Les travaux sont confiés à un autre processus : leur état courant est
+        # écrit (une transaction) et ce processus cesse d'en être le propriétaire
+        with self.writer.lock if self.writer is not None else nullcontext():
+            records = []
+            for job_id in job_ids:
+                job = self._local.pop(job_id, None)
+                if job is not None:
+                    self._unindex(job_id, job)
+                    with self._lock:
+                        self._dirty.pop(job_id, None)
+                    records.append(self.record(job_id, job))
+            if self.store.persistent:
+                self.store.save_many(records)
+
+    def session_jobs(self, session_id: str) -> list:
+        with self._lock:
+            job_ids = list(self._sessions.get(session_id, ()))
+        jobs = {job_id: self._local[job_id] for job_id in job_ids if job_id in self._local}
+        if self.store.persistent:
+            for job_id, state in self.store.load_session_jobs(self.kind, session_id).items():
+                if job_id not in jobs:
+                    jobs[job_id] = self.from_state(state)
+        return list(jobs.values())
+
+    def take_dirty(self) -> list:
+        # Enregistrements des travaux modifiés depuis le dernier passage ; à
+        # rendre avec restore_dirty() si leur écriture échoue
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        taken = []
+        for job_id, job in dirty.items():
+            try:
+                taken.append((job_id, job, self.record(job_id, job)))
+            except AttributeError:
+                # Objet encore en construction dans un autre thread : écrit au prochain passage
+                self.mark_dirty(job_id, job)
+        return taken
+
+    def restore_dirty(self, taken: list):
+        # Les états seront réécrits au prochain passage
+        with self._lock:
+            for job_id, job, _ in taken:
+                self._dirty.setdefault(job_id, job)
+
+    def flush(self):
+        taken = self.take_dirty()
+        try:
+            self.store.save_many([record for _, _, record in taken])
+        except Exception:
+            self.restore_dirty(taken)
+            raise
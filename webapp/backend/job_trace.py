@@ -0,0 +1,117 @@
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# Chronologie d'un travail, étape par étape (attente, extraction, réseau,
+# fusion, conversion, archive) : durée, octets et débit moyen des étapes
+# réseau. Elle voyage avec l'état du travail (to_dict / from_dict) et est
+# écrite en JSON, une ligne par travail terminé, dans le journal firedown.trace.
+
+trace_logger = logging.getLogger("firedown.trace")
+
+def configure_trace_log(target: str):
+    # "stdout", "stderr", un chemin de fichier, ou "off"
+    trace_logger.handlers.clear()
+    trace_logger.propagate = False
+    if target == "off":
+        trace_logger.disabled = True
+        return
+    if target in ("stdout", "stderr"):
+        handler = logging.StreamHandler(sys.stdout if target == "stdout" else sys.stderr)
+    else:
+        handler = logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+
+class JobTrace:
+    def __init__(self, started_at: Optional[float] = None, stages: Optional[list] = None):
+        self.started_at = started_at if started_at is not None else time.time()
+        self.stages = list(stages or [])
+        self._open = {}  # étapes commencées par un hook, pas encore terminées
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float, nbytes: int = 0, **details):
+        record = {"name": name, "start": round(start - self.started_at, 4), "seconds": round(max(0.0, end - start), 4)}
+        if nbytes:
+            record["bytes"] = nbytes
+            record["throughput"] = round(nbytes / (end - start)) if end > start else None
+        record.update(details)
+        with self._lock:
+            self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name: str, **details):
+        # Les détails ajoutés au dictionnaire renvoyé sont enregistrés avec l'étape
+        start = time.time()
+        extra = dict(details)
+        try:
+            yield extra
+        finally:
+            nbytes = extra.pop("bytes", 0)
+            self.add(name, start, time.time(), nbytes, **extra)
+
+    def begin(self, name: str):
+        # Étape délimitée par des hooks (progression, post-traitements) : sans
+        # effet si elle est déjà commencée, pour rester bon marché à chaque appel
+        if name not in self._open:
+            self._open[name] = time.time()
+
+    def end(self, name: str, nbytes: int = 0, **details):
+        start = self._open.pop(name, None)
+        if start is not None:
+            self.add(name, start, time.time(), nbytes, **details)
+
+    def extend(self, other: "JobTrace", **details):
+        # Étapes d'un autre travail (vidéo d'un lot), replacées sur cette chronologie
+        for record in other.to_dict()["stages"]:
+            start = other.started_at + record["start"]
+            moved = {**record, **details, "start": round(start - self.started_at, 4)}
+            with self._lock:
+                self.stages.append(moved)
+
+    def totals(self) -> dict:
+        with self._lock:
+            return summarize(self.stages)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = [dict(record) for record in self.stages]
+        return {
+            "started_at": self.started_at,
+            "elapsed": round(time.time() - self.started_at, 4),
+            "stages": stages,
+            "totals": summarize(stages),
+        }
+
+    @classmethod
+    def from_dict(cls, state: Optional[dict]) -> "JobTrace":
+        if not state:
+            return cls()
+        return cls(state.get("started_at"), state.get("stages"))
+
+def summarize(stages: list) -> dict:
+    # Étape -> nombre, durée cumulée, octets et débit moyen
+    totals = {}
+    for record in stages:
+        merge_totals(totals, {record["name"]: {"count": 1, "seconds": record["seconds"], "bytes": record.get("bytes", 0)}})
+    return totals
+
+def merge_totals(into: dict, totals: dict) -> dict:
+    for name, item in totals.items():
+        total = into.setdefault(name, {"count": 0, "seconds": 0.0, "bytes": 0})
+        total["count"] += item["count"]
+        total["seconds"] = round(total["seconds"] + item["seconds"], 4)
+        total["bytes"] += item.get("bytes", 0)
+        if total["bytes"]:
+            total["throughput"] = round(total["bytes"] / total["seconds"]) if total["seconds"] else None
+    return into
+
+def log_trace(kind: str, job_id: str, outcome: str, trace: dict):
+    if trace_logger.isEnabledFor(logging.INFO):
+        trace_logger.info(json.dumps({"event": "job_trace", "kind": kind, "id": job_id, "outcome": outcome, **trace}, default=str))
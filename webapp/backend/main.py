@@ -1,16 +1,39 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import yt_dlp
 import os
 import shutil
-import zipfile
 from typing import Optional
+from urllib.parse import quote, urlparse
 import asyncio
 import uuid
 import time
-from starlette.background import BackgroundTask
+import copy
+import hashlib
+import bisect
+import socket
+import threading
+import contextlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from metadata_cache import MetadataCache
+from content_store import ContentPending, ContentStore, link_into
+from zipstream import ArchiveManifest, ZipEntry, ZipStream, unique_arcnames
+from events import EventBroker
+from ffmpeg_pool import FFmpegError, FFmpegPool
+from admission import AdmissionController, AdmissionRejected, PendingItems, ThroughputMeter, WaitingLine
+from janitor import DiskJanitor, parse_size
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, LoopLagMonitor, Registry
+from job_trace import JobTrace, configure_trace_log, log_trace, merge_totals
+from profiler import SamplingProfiler
+from media_codecs import audio_format_selection, conversion_args, format_selection, merge_format
+from job_store import JobStateWriter, JobTable, create_job_store
+from job_queue import create_job_queue
+from http_ranges import archive_validators, file_response, stream_response
+import segmented
+from bandwidth import BandwidthGovernor
 
 app = FastAPI()
 
@@ -21,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Range", "Content-Disposition", "ETag", "Accept-Ranges", "Retry-After"],
 )
 
 # Création du dossier pour les téléchargements
@@ -28,9 +52,263 @@ DOWNLOAD_DIR = "downloads"
 if not os.path.exists(DOWNLOAD_DIR):
     os.makedirs(DOWNLOAD_DIR)
 
+# Chaque téléchargement écrit dans son propre dossier (jobs/<id>) : son fichier
+# final est connu sans parcourir de dossier partagé
+JOBS_DIR = os.path.join(DOWNLOAD_DIR, "jobs")
+
+def job_folder(download_id: str) -> str:
+    return os.path.join(JOBS_DIR, download_id)
+
+STORE_DIR = os.path.join(DOWNLOAD_DIR, "store")
+# Réservations des téléchargements du magasin en cours, entre processus
+STORE_CLAIMS_DIR = os.path.join(DOWNLOAD_DIR, "claims")
+
 # Chemin vers le fichier de cookies
 COOKIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "youtube.cookies")
 
+# Nombre de téléchargements exécutés en parallèle (les suivants attendent dans la file)
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("FIREDOWN_MAX_CONCURRENT_DOWNLOADS", os.cpu_count() or 2))
+
+# Téléchargements simultanés d'un même lot, et par site d'origine (tous travaux confondus)
+BATCH_CONCURRENCY = int(os.getenv("FIREDOWN_BATCH_CONCURRENCY", 4))
+PER_HOST_CONCURRENCY = int(os.getenv("FIREDOWN_PER_HOST_CONCURRENCY", 4))
+
+# Conversions ffmpeg simultanées (hors emplacements de téléchargement) et
+# threads accordés à chacune
+FFMPEG_WORKERS = int(os.getenv("FIREDOWN_FFMPEG_WORKERS", os.cpu_count() or 2))
+FFMPEG_THREADS = int(os.getenv("FIREDOWN_FFMPEG_THREADS", max(1, (os.cpu_count() or 2) // max(1, FFMPEG_WORKERS))))
+FFMPEG_LOCATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ffmpeg", "bin")
+
+# Part de la barre de progression occupée par le téléchargement quand une
+# conversion suit, le reste suit l'avancement de ffmpeg
+CONVERSION_PROGRESS_START = 90
+
+# Extraction des entrées de playlist : nombre d'extractions simultanées et délai par entrée (s)
+PLAYLIST_INFO_CONCURRENCY = int(os.getenv("FIREDOWN_PLAYLIST_INFO_CONCURRENCY", 8))
+PLAYLIST_ENTRY_TIMEOUT = float(os.getenv("FIREDOWN_PLAYLIST_ENTRY_TIMEOUT", 30))
+
+# Cache des métadonnées : taille du LRU, durée de vie (s) et dossier du cache disque (optionnel)
+METADATA_CACHE_SIZE = int(os.getenv("FIREDOWN_METADATA_CACHE_SIZE", 512))
+METADATA_CACHE_TTL = float(os.getenv("FIREDOWN_METADATA_CACHE_TTL", 1800))
+METADATA_CACHE_DIR = os.getenv("FIREDOWN_METADATA_CACHE_DIR") or None
+
+# Durée après laquelle la réservation d'un téléchargement du magasin par un
+# autre processus est ignorée (s) : au-delà de la durée du plus long téléchargement
+STORE_CLAIM_TTL = float(os.getenv("FIREDOWN_STORE_CLAIM_TTL", 3 * 3600))
+
+# Fréquence maximale des mises à jour envoyées à un client abonné (par seconde)
+EVENTS_MAX_RATE = float(os.getenv("FIREDOWN_EVENTS_MAX_RATE", 2))
+
+# Exécution des téléchargements : "inline" (dans le processus de l'API) ou "queue"
+# (mis en file pour des processus firedown-worker, voir worker.py)
+EXECUTION_MODE = os.getenv("FIREDOWN_EXECUTION_MODE", "inline")
+
+# File des travaux du mode "queue" : "sqlite" (workers sur la même machine, base
+# sur un disque local : SQLite en mode WAL ne fonctionne pas sur un système de
+# fichiers réseau) ou "redis" (workers sur plusieurs machines)
+JOB_QUEUE_BACKEND = os.getenv("FIREDOWN_JOB_QUEUE", "sqlite")
+REDIS_URL = os.getenv("FIREDOWN_REDIS_URL", "redis://localhost:6379/0")
+
+# États des travaux : "memory" (un seul worker), "sqlite" (partagés entre workers
+# uvicorn et conservés au redémarrage) ou "redis" (partagés entre machines),
+# écrits par lots à l'intervalle donné (s). En mode "queue", même stockage que la file
+JOB_STORE_BACKEND = os.getenv("FIREDOWN_JOB_STORE", JOB_QUEUE_BACKEND if EXECUTION_MODE == "queue" else "memory")
+JOB_STORE_PATH = os.getenv("FIREDOWN_JOB_STORE_PATH", os.path.join(DOWNLOAD_DIR, "jobs.db"))
+JOB_STORE_FLUSH_INTERVAL = float(os.getenv("FIREDOWN_JOB_STORE_FLUSH_INTERVAL", 0.5))
+
+# Espace disque des téléchargements : quota ("20G", "500M" ou octets ; par défaut
+# la taille du volume) et seuils haut et bas de l'éviction, en fraction du quota
+DISK_QUOTA = parse_size(os.getenv("FIREDOWN_DISK_QUOTA", "0")) or shutil.disk_usage(DOWNLOAD_DIR).total
+DISK_HIGH_WATERMARK = float(os.getenv("FIREDOWN_DISK_HIGH_WATERMARK", 0.9))
+DISK_LOW_WATERMARK = float(os.getenv("FIREDOWN_DISK_LOW_WATERMARK", 0.75))
+
+# Contrôle d'admission : travaux en attente au-delà desquels les nouvelles
+# demandes sont refusées (0 : sans limite) et espace disque libre exigé
+MAX_QUEUE_DEPTH = int(os.getenv("FIREDOWN_MAX_QUEUE_DEPTH", 100))
+MIN_FREE_DISK = parse_size(os.getenv("FIREDOWN_MIN_FREE_DISK", "1G"))
+
+# Téléchargement segmenté : connexions HTTP Range simultanées au plus par
+# fichier (1 : une seule connexion, comme yt-dlp par défaut), taille maximale
+# d'un segment, et fragments DASH/HLS téléchargés en parallèle
+SEGMENT_CONNECTIONS = int(os.getenv("FIREDOWN_SEGMENT_CONNECTIONS", 8))
+SEGMENT_SIZE = parse_size(os.getenv("FIREDOWN_SEGMENT_SIZE", "8M"))
+segmented.install()
+
+# Débit total accordé aux téléchargements en cours, partagé entre eux (octets/s,
+# "20M" ; 0 : sans limite), plafond par session, part minimale réservée à
+# chaque petit travail (audio ou fichier plus court que FIREDOWN_SMALL_JOB_SIZE)
+BANDWIDTH_BUDGET = parse_size(os.getenv("FIREDOWN_BANDWIDTH_BUDGET", "0"))
+SESSION_BANDWIDTH = parse_size(os.getenv("FIREDOWN_SESSION_BANDWIDTH", "0"))
+BANDWIDTH_MIN_SHARE = parse_size(os.getenv("FIREDOWN_BANDWIDTH_MIN_SHARE", "256K"))
+SMALL_JOB_SIZE = parse_size(os.getenv("FIREDOWN_SMALL_JOB_SIZE", "50M"))
+
+# Chronologies des travaux : journal JSON ("stdout", "stderr", chemin, "off")
+# et profilage à la demande d'un téléchargement (?profile=1), désactivé par défaut
+configure_trace_log(os.getenv("FIREDOWN_TRACE_LOG", "stdout"))
+PROFILING_ENABLED = os.getenv("FIREDOWN_PROFILING", "0") == "1"
+
+metadata_cache = MetadataCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_CACHE_DIR)
+
+# Magasin des fichiers produits, partagé entre utilisateurs pour les requêtes identiques
+content_store = ContentStore(STORE_DIR, STORE_CLAIMS_DIR, STORE_CLAIM_TTL)
+
+bandwidth_governor = BandwidthGovernor(BANDWIDTH_BUDGET, SESSION_BANDWIDTH, BANDWIDTH_MIN_SHARE, SMALL_JOB_SIZE)
+
+# Durée pendant laquelle l'état d'un travail terminé est conservé (s) : ses
+# fichiers restent disponibles pendant ce délai, tant que le quota disque le permet
+STATUS_RETENTION = 3600
+
+def download_active(download_id: str) -> bool:
+    status = download_statuses.get(download_id)
+    return status is not None and status.state not in ("completed", "error")
+
+def session_active(session_id: Optional[str]) -> bool:
+    session = download_sessions.get(session_id) if session_id else None
+    return session is not None and session.status not in ("completed", "error")
+
+def status_expired(status, now: float) -> bool:
+    # Travail (ou lot) terminé depuis plus que la durée de conservation, hors
+    # d'une session encore en cours (dont l'archive n'a pas encore pu être demandée)
+    if not (status.is_ready or status.error):
+        return False
+    finished_at = getattr(status, 'finished_at', None) or getattr(status, 'started_at', None) or 0
+    return now - finished_at > STATUS_RETENTION and not session_active(getattr(status, 'session_id', None))
+
+def batch_active(batch_id: str) -> bool:
+    status = batch_statuses.get(batch_id)
+    return status is not None and not (status.is_ready or status.error)
+
+def disk_item_active(path: str) -> bool:
+    # Seuls les travaux en attente ou en cours (et les entrées du magasin qu'ils
+    # utilisent) sont protégés ; les fichiers des travaux terminés restent
+    # évictables, y compris en mode queue où leur état n'est plus local. Les
+    # fichiers en cours d'envoi sont protégés par le gestionnaire lui-même (pin)
+    name = os.path.basename(path)
+    parent = os.path.dirname(path)
+    if parent == os.path.abspath(JOBS_DIR):
+        return download_active(name)
+    if parent == os.path.abspath(STORE_DIR):
+        return any(download_active(owner) for owner in content_store.owners(name))
+    if name.startswith("batch_"):
+        return batch_active(name[len("batch_"):])
+    return False
+
+def disk_item_evicted(path: str):
+    parent = os.path.dirname(path)
+    if parent == os.path.abspath(STORE_DIR):
+        content_store.discard(os.path.basename(path))
+    elif parent == os.path.abspath(JOBS_DIR):
+        content_store.release(os.path.basename(path))
+
+# Occupation du volume des téléchargements et éviction des fichiers les moins
+# récemment utilisés (une entrée du magasin part avec les dossiers des travaux
+# qui la lient : c'est le seul moyen de libérer sa place)
+disk_janitor = DiskJanitor(
+    DOWNLOAD_DIR,
+    [JOBS_DIR, STORE_DIR],
+    ("batch_", "session_", "videos"),
+    DISK_QUOTA,
+    DISK_HIGH_WATERMARK,
+    DISK_LOW_WATERMARK,
+    disk_item_active,
+    disk_item_evicted
+)
+
+job_store = create_job_store(JOB_STORE_BACKEND, JOB_STORE_PATH, REDIS_URL)
+if EXECUTION_MODE == "queue" and not job_store.persistent:
+    raise RuntimeError("Le mode queue nécessite un stockage des travaux partagé (sqlite ou redis)")
+job_queue = create_job_queue(JOB_QUEUE_BACKEND, JOB_STORE_PATH, REDIS_URL) if EXECUTION_MODE == "queue" else None
+
+# Écriture des états par un thread dédié, jamais depuis la boucle d'événements
+job_writer = JobStateWriter(job_store, JOB_STORE_FLUSH_INTERVAL)
+
+# Téléchargements admis pas encore commencés (mode inline ; en mode queue, la
+# file des workers en tient lieu) et vidéos des lots pas encore démarrées
+waiting_line = WaitingLine()
+pending_batch_items = PendingItems()
+
+# Débit observé, pour les délais estimés et le Retry-After des refus. Avec un
+# stockage partagé, il compte les travaux de tous les processus (workers du
+# mode queue compris), relus par le thread d'écriture des états
+throughput = ThroughputMeter(shared=job_store.persistent)
+if job_store.persistent:
+    job_writer.periodic.append(lambda: throughput.sync(job_store))
+
+def queue_depth() -> int:
+    # Appelée hors de la boucle (admission, métriques) : que des compteurs
+    waiting = job_queue.depth() if job_queue is not None else len(waiting_line)
+    return waiting + len(pending_batch_items)
+
+admission = AdmissionController(MAX_QUEUE_DEPTH, MIN_FREE_DISK, queue_depth, disk_janitor.ensure_space, throughput)
+
+@contextlib.asynccontextmanager
+async def admit(cost: int):
+    # Refus immédiat (429) plutôt qu'un ralentissement de tous les travaux acceptés.
+    # Les places sont réservées le temps du bloc, qui met les travaux en file
+    try:
+        reservation = await asyncio.to_thread(admission.admit, cost)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    try:
+        yield
+    finally:
+        reservation.release()
+
+# ---------------------------
+# Métriques (/metrics)
+# ---------------------------
+# Les compteurs ne sont mis à jour qu'aux changements d'état et en fin de
+# téléchargement, jamais à chaque appel de progress_hook ; le reste est lu
+# au moment de la collecte. En mode queue, chaque worker expose les siennes.
+metrics = Registry()
+jobs_finished = metrics.counter("firedown_jobs_finished_total", "Téléchargements terminés, par état final", ("state",))
+extraction_seconds = metrics.histogram("firedown_extraction_seconds", "Durée des extractions yt-dlp (hors cache)", ("mode",))
+download_bytes = metrics.counter("firedown_download_bytes_total", "Octets téléchargés")
+download_speed = metrics.histogram(
+    "firedown_download_speed_bytes_per_second", "Débit moyen de chaque fichier téléchargé",
+    buckets=tuple(2 ** n * 1024 for n in range(4, 18, 2))
+)
+conversion_seconds = metrics.histogram("firedown_conversion_seconds", "Durée des conversions ffmpeg, attente comprise", ("outcome",))
+zip_build_seconds = metrics.histogram("firedown_zip_build_seconds", "Préparation des archives ZIP (CRC des fichiers, plan de l'archive)", ("step",))
+loop_lag = metrics.histogram("firedown_event_loop_lag_seconds", "Retard de réveil de la boucle d'événements")
+loop_lag_monitor = LoopLagMonitor(loop_lag)
+
+def jobs_by_state() -> dict:
+    counts = {}
+    for download_id in download_statuses:
+        status = download_statuses.local(download_id)
+        if status is not None:
+            counts[status.state] = counts.get(status.state, 0) + 1
+    return counts
+
+def cache_lookups() -> dict:
+    metadata = metadata_cache.stats()
+    downloads = content_store.stats()
+    return {
+        ("metadata", "hit"): metadata["hits"],
+        ("metadata", "disk_hit"): metadata["disk_hits"],
+        ("metadata", "miss"): metadata["misses"],
+        ("downloads", "hit"): downloads["hits"],
+        ("downloads", "miss"): downloads["misses"],
+    }
+
+metrics.gauge("firedown_jobs", "Téléchargements suivis par ce processus, par état", jobs_by_state, ("state",))
+metrics.gauge("firedown_queue_depth", "Téléchargements admis en attente", queue_depth)
+metrics.collected_counter("firedown_admission_rejected_total", "Demandes refusées par le contrôle d'admission", lambda: admission.rejected)
+metrics.collected_counter("firedown_cache_lookups_total", "Consultations des caches", cache_lookups, ("cache", "result"))
+metrics.gauge("firedown_cache_hit_ratio", "Part des consultations servies par le cache", lambda: {
+    "metadata": metadata_cache.stats()["hit_rate"],
+    "downloads": content_store.stats()["hit_rate"],
+}, ("cache",))
+metrics.gauge("firedown_disk_used_bytes", "Occupation du dossier des téléchargements", lambda: disk_janitor.used)
+metrics.gauge("firedown_disk_quota_bytes", "Quota du dossier des téléchargements", lambda: disk_janitor.quota)
+metrics.collected_counter("firedown_disk_evictions_total", "Éléments supprimés pour respecter le quota", lambda: disk_janitor.evictions)
+metrics.gauge("firedown_bandwidth_allocated_bytes_per_second", "Débit accordé aux téléchargements en cours", lambda: bandwidth_governor.stats()["allocated"])
+metrics.gauge("firedown_bandwidth_observed_bytes_per_second", "Débit mesuré des téléchargements en cours", lambda: bandwidth_governor.stats()["observed"])
+metrics.gauge("firedown_ffmpeg_running", "Conversions ffmpeg en cours", lambda: ffmpeg_pool.running)
+metrics.gauge("firedown_ffmpeg_waiting", "Conversions ffmpeg en attente d'un emplacement", lambda: ffmpeg_pool.waiting)
+metrics.gauge("firedown_event_loop_lag_last_seconds", "Dernier retard de réveil mesuré", lambda: loop_lag_monitor.last_lag)
+
 # ---------------------------
 # Modèles de données
 # ---------------------------
@@ -39,24 +317,88 @@ class DownloadRequest(BaseModel):
     format: str
     quality: str
     fileFormat: str
+    session_id: Optional[str] = None
+
+# Champs dont la modification est signalée aux clients abonnés au flux d'événements
+DOWNLOAD_EVENT_FIELDS = {"progress", "title", "filename", "is_ready", "error", "state"}
+BATCH_EVENT_FIELDS = {"progress", "current_video", "filename", "is_ready", "error", "current_index", "total_files"}
+
+# Champs dont la modification met à jour les compteurs de la session du téléchargement
+SESSION_PROGRESS_FIELDS = {"session_id", "progress", "title", "is_ready", "error"}
 
 class DownloadStatus:
-    def __init__(self):
+    def __init__(self, download_id: str = None):
+        self.download_id = download_id
+        self.version = 0  # incrémentée à chaque changement visible des clients
+        self.session_id = None
         self.progress = 0
         self.title = ""
         self.filename = ""
+        self.filepath = ""
         self.is_ready = False
         self.error = None
         self.download_folder = ""
-        self.session_id = None
+        self.started_at = None
+        self.finished_at = None
+        self.trace = JobTrace()  # durée de chaque étape du travail
+        self.profile = False  # profil d'exécution demandé (?profile=1)
+        self.profile_path = ""
+        self.state = "queued"  # queued, downloading, converting, completed, error
+
+    def __setattr__(self, name, value):
+        old = self.__dict__.get(name)
+        object.__setattr__(self, name, value)
+        if name in SESSION_PROGRESS_FIELDS and old != value and self.__dict__.get('session_id'):
+            local_session_progress(self.session_id).apply(self, name, old, value)
+        if name in DOWNLOAD_EVENT_FIELDS:
+            self.notify()
+        else:
+            download_statuses.mark_dirty(self.download_id, self)
+        if name == "state" and old == "queued" and value != "queued":
+            waiting_line.leave(self.download_id)
+        if name == "state" and value == "downloading" and self.started_at is None:
+            self.started_at = time.time()
+        if name == "state" and value == "completed" and old != "completed":
+            throughput.record()
+        if name == "state" and value in ("completed", "error"):
+            if old != value:
+                self.finished_at = time.time()
+                jobs_finished.labels(value).inc()
+                log_trace("download", self.download_id, value, self.trace.to_dict())
+            download_statuses.save(self.download_id, self)
+            # Le dossier du travail est désormais complet : sa taille est comptée
+            if self.download_folder:
+                disk_janitor.track(self.download_folder)
+
+    def notify(self):
+        object.__setattr__(self, 'version', self.__dict__.get('version', 0) + 1)
+        if self.download_id:
+            download_statuses.mark_dirty(self.download_id, self)
+            event_broker.publish(f"download:{self.download_id}")
+            if self.session_id:
+                event_broker.publish(f"session:{self.session_id}")
+
+    def to_state(self) -> dict:
+        state = dict(self.__dict__)
+        state['trace'] = self.trace.to_dict()
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "DownloadStatus":
+        # Copie relue depuis le stockage partagé (travail suivi par un autre worker)
+        status = cls()
+        status.__dict__.update(state)
+        status.__dict__['trace'] = JobTrace.from_dict(state.get('trace'))
+        return status
 
 class VideoInfo(BaseModel):
     title: str
     duration: str
-    thumbnail: str
+    thumbnail: Optional[str] = None  # absente pour certains extracteurs (liens directs)
     size: Optional[str] = None
     isPlaylist: bool = False
     playlistItems: list = []
+    skippedItems: list = []  # entrées de playlist non extraites : url, titre, raison ("timeout", "error")
     status: str = "pending"  # pending, downloading, completed, error
     progress: float = 0
     error: Optional[str] = None
@@ -67,7 +409,9 @@ class BatchDownloadRequest(BaseModel):
     videos: list[DownloadRequest]
 
 class BatchStatus:
-    def __init__(self):
+    def __init__(self, batch_id: str = None):
+        self.batch_id = batch_id
+        self.version = 0  # incrémentée à chaque changement visible des clients
         self.progress = 0
         self.current_video = ""
         self.filename = ""
@@ -78,15 +422,205 @@ class BatchStatus:
         self.total_files = 0
         self.completed_files = []
         self.failed_files = []
+        self.archive = ArchiveManifest()  # complétée à chaque vidéo terminée
+        self.trace = JobTrace()  # étapes de chaque vidéo et de l'archive
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in BATCH_EVENT_FIELDS:
+            self.notify()
+        else:
+            batch_statuses.mark_dirty(self.batch_id, self)
+        if name in ("is_ready", "error") and value:
+            if self.__dict__.get('finished_at') is None:
+                object.__setattr__(self, 'finished_at', time.time())
+            batch_statuses.save(self.batch_id, self)
+
+    def notify(self):
+        object.__setattr__(self, 'version', self.__dict__.get('version', 0) + 1)
+        if self.batch_id:
+            batch_statuses.mark_dirty(self.batch_id, self)
+            event_broker.publish(f"batch:{self.batch_id}")
+
+    def to_state(self) -> dict:
+        state = {name: value for name, value in self.__dict__.items() if name not in ('archive', 'trace')}
+        state['trace'] = self.trace.to_dict()
+        state['completed_files'] = list(self.completed_files)
+        state['failed_files'] = list(self.failed_files)
+        state['archive'] = [
+            [entry.path, entry.arcname, entry.size, entry.mtime, entry.crc]
+            for entry in list(self.archive.entries)
+        ]
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "BatchStatus":
+        status = cls()
+        status.__dict__.update(state)
+        status.__dict__['archive'] = ArchiveManifest.from_entries(
+            [ZipEntry(*values) for values in state.get('archive', [])]
+        )
+        status.__dict__['trace'] = JobTrace.from_dict(state.get('trace'))
+        return status
+
+# Compteurs d'une session, tenus à jour à chaque changement d'état de ses
+# téléchargements : l'état d'une session se lit sans parcourir les travaux.
+# Chaque processus tient ses propres compteurs (un enregistrement par processus
+# dans le stockage partagé), additionnés à la lecture.
+class SessionProgress:
+    def __init__(self, session_id: str = None, process_id: str = None):
+        self.session_id = session_id
+        self.process_id = process_id
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+        self.progress_sum = 0.0
+        self.active = {}  # téléchargements en cours ici : id -> titre et progression
+        self.files = {}  # téléchargements terminés : id -> fichier produit
+        self.stages = {}  # durées cumulées des étapes des téléchargements terminés
+        self.version = 0  # incrémentée à chaque changement des compteurs
+        self._lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        return f"{self.session_id}@{self.process_id}"
+
+    def apply(self, status: "DownloadStatus", name: str, old, value):
+        download_id = status.download_id
+        with self._lock:
+            if name == "session_id" and old is None:
+                self.total += 1
+                self.progress_sum += status.progress
+                if status.is_ready:
+                    self._complete(status)
+                elif status.error:
+                    self._fail(status)
+                else:
+                    self.active[download_id] = {"title": status.title, "progress": status.progress}
+            elif name == "progress":
+                self.progress_sum += value - (old or 0)
+                if download_id in self.active:
+                    self.active[download_id]["progress"] = value
+            elif name == "title":
+                if download_id in self.active:
+                    self.active[download_id]["title"] = value
+            elif name == "is_ready" and value:
+                self._complete(status)
+            elif name == "error" and value and not old:
+                self._fail(status)
+            self.version += 1
+        session_progress.mark_dirty(self.key, self)
+
+    def set_active(self, status: "DownloadStatus", active: bool):
+        # Travail confié à un autre processus (mode "queue") ou repris par celui-ci
+        with self._lock:
+            if active and not status.is_ready and not status.error:
+                self.active[status.download_id] = {"title": status.title, "progress": status.progress}
+            else:
+                self.active.pop(status.download_id, None)
+            self.version += 1
+        session_progress.mark_dirty(self.key, self)
+
+    def _complete(self, status: "DownloadStatus"):
+        self.completed += 1
+        self.active.pop(status.download_id, None)
+        self.files[status.download_id] = {"path": status.filepath, "completed_at": time.time()}
+        merge_totals(self.stages, status.trace.totals())
 
-# Stockage des statuts de téléchargement
-download_statuses = {}
+    def _fail(self, status: "DownloadStatus"):
+        self.failed += 1
+        self.active.pop(status.download_id, None)
+        merge_totals(self.stages, status.trace.totals())
+
+    def counters(self, limit: int) -> tuple:
+        # Lu à chaque interrogation de la session : compteurs et au plus limit
+        # téléchargements en cours, sans copier les fichiers ni les étapes
+        with self._lock:
+            active = [dict(item) for item in itertools.islice(self.active.values(), max(0, limit))]
+            return self.total, self.completed, self.failed, self.progress_sum, active
+
+    def files_copy(self) -> dict:
+        with self._lock:
+            return dict(self.files)
+
+    def stages_copy(self) -> dict:
+        with self._lock:
+            return {name: dict(item) for name, item in self.stages.items()}
+
+    def to_state(self) -> dict:
+        with self._lock:
+            state = {name: value for name, value in self.__dict__.items() if name != '_lock'}
+            state['active'] = {download_id: dict(item) for download_id, item in self.active.items()}
+            state['files'] = dict(self.files)
+            state['stages'] = {name: dict(item) for name, item in self.stages.items()}
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SessionProgress":
+        progress = cls()
+        progress.__dict__.update(state)
+        return progress
+
+# Identifiant de ce processus parmi ceux qui partagent le stockage des travaux
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+session_progress = JobTable("session_progress", job_store, SessionProgress.from_state, job_writer)
+session_progress_lock = threading.Lock()
+
+def local_session_progress(session_id: str) -> SessionProgress:
+    progress = session_progress.local(f"{session_id}@{PROCESS_ID}")
+    if progress is None:
+        with session_progress_lock:
+            progress = session_progress.local(f"{session_id}@{PROCESS_ID}")
+            if progress is None:
+                progress = SessionProgress(session_id, PROCESS_ID)
+                session_progress[progress.key] = progress
+    return progress
+
+# Téléchargements en cours renvoyés au plus par /session-status
+SESSION_ACTIVE_LIMIT = 20
+
+def session_summary(session_id: str, limit: int = SESSION_ACTIVE_LIMIT) -> dict:
+    # Compteurs de la session, cumulés sur les processus qui l'exécutent : le
+    # coût ne dépend pas du nombre de téléchargements de la session
+    summary = {"total": 0, "completed": 0, "failed": 0, "progress_sum": 0.0, "active": []}
+    for progress in session_progress.session_jobs(session_id):
+        total, completed, failed, progress_sum, active = progress.counters(limit - len(summary["active"]))
+        summary["total"] += total
+        summary["completed"] += completed
+        summary["failed"] += failed
+        summary["progress_sum"] += progress_sum
+        summary["active"] += active
+    return summary
+
+def session_files(session_id: str) -> dict:
+    # Fichiers produits par la session : id du téléchargement -> chemin et date
+    files = {}
+    for progress in session_progress.session_jobs(session_id):
+        files.update(progress.files_copy())
+    return files
+
+def session_stages(session_id: str) -> dict:
+    # Durées cumulées des étapes des téléchargements terminés de la session
+    stages = {}
+    for progress in session_progress.session_jobs(session_id):
+        merge_totals(stages, progress.stages_copy())
+    return stages
+
+# Stockage des statuts de téléchargement (les changements sont enregistrés par
+# lots dans le stockage des travaux, voir flush_job_states)
+download_statuses = JobTable("download", job_store, DownloadStatus.from_state, job_writer)
 
 # Stockage des statuts de téléchargement par lot
-batch_statuses = {}
+batch_statuses = JobTable("batch", job_store, BatchStatus.from_state, job_writer)
 
 # Stockage des sessions
-download_sessions = {}
+download_sessions = JobTable("session", job_store, lambda state: DownloadSession(**state), job_writer)
+
+# Diffusion des changements d'état aux clients abonnés (Server-Sent Events)
+event_broker = EventBroker()
 
 class DownloadSession(BaseModel):
     session_id: str
@@ -96,12 +630,19 @@ class DownloadSession(BaseModel):
     total_progress: float = 0
     current_video_index: int = 0
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        download_sessions.mark_dirty(self.session_id, self)
+
+    def to_state(self) -> dict:
+        return self.model_dump()
+
 # ---------------------------
 # Fonctions utilitaires
 # ---------------------------
 def get_format_selection(format_type: str, quality: str, file_format: str) -> str:
     if format_type == "audio":
-        return "bestaudio/best"
+        return audio_format_selection(file_format)
     
     quality_filter = ""
     if quality == "medium":
@@ -112,18 +653,133 @@ def get_format_selection(format_type: str, quality: str, file_format: str) -> st
     if file_format in ['mp4', 'webm']:
         return f"bestvideo[ext={file_format}]{quality_filter}+bestaudio[ext={file_format}]/best[ext={file_format}]{quality_filter}/best"
     else:
-        return f"bestvideo{quality_filter}+bestaudio/best{quality_filter}/best"
+        # Codecs déjà acceptés par le conteneur d'abord : la conversion finale
+        # se limite alors à une copie des flux
+        return format_selection(file_format, quality_filter)
 
-def progress_hook(d, download_id):
-    if download_id in download_statuses:
-        status = download_statuses[download_id]
+def progress_hook(d, download_id, scale: float = 1.0):
+    status = download_statuses.get(download_id)
+    if status is not None:
         if d['status'] == 'downloading':
+            status.trace.begin("network")
+            bandwidth_governor.report(download_id, d.get('downloaded_bytes') or 0)
             if 'total_bytes' in d and 'downloaded_bytes' in d:
-                status.progress = (d['downloaded_bytes'] / d['total_bytes']) * 100
+                status.progress = (d['downloaded_bytes'] / d['total_bytes']) * 100 * scale
             elif 'total_bytes_estimate' in d and 'downloaded_bytes' in d:
-                status.progress = (d['downloaded_bytes'] / d['total_bytes_estimate']) * 100
+                status.progress = (d['downloaded_bytes'] / d['total_bytes_estimate']) * 100 * scale
         elif d['status'] == 'finished':
-            status.progress = 99
+            status.progress = 99 * scale
+            details = {"connections": d['connections']} if 'connections' in d else {}
+            status.trace.end("network", d.get('total_bytes') or d.get('downloaded_bytes') or 0, **details)
+    if d['status'] == 'finished':
+        # Une fois par fichier : le chemin chaud ('downloading') n'est pas mesuré
+        size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+        download_bytes.inc(size)
+        if size and d.get('elapsed'):
+            download_speed.observe(size / d['elapsed'])
+
+def postprocessor_hook(d, download_id):
+    # Fusion des flux et post-traitements de yt-dlp (extraction audio...)
+    status = download_statuses.local(download_id)
+    if status is None:
+        return
+    stage = "merge" if d['postprocessor'] == 'Merger' else f"postprocess:{d['postprocessor']}"
+    if d['status'] == 'started':
+        status.trace.begin(stage)
+    elif d['status'] == 'finished':
+        status.trace.end(stage)
+
+def extract_info_cached(url: str, ydl_opts: dict, mode: str = "full", ydl: yt_dlp.YoutubeDL = None) -> Optional[dict]:
+    # mode "flat" : premier passage extract_flat (playlists), "full" : vidéo complète
+    info = metadata_cache.get(mode, url)
+    if info is not None:
+        return info
+
+    with extraction_seconds.labels(mode).time():
+        if ydl is None:
+            with yt_dlp.YoutubeDL(ydl_opts) as own_ydl:
+                info = own_ydl.extract_info(url, download=False)
+        else:
+            info = ydl.extract_info(url, download=False)
+    if info is None:
+        return None
+
+    # Les clés privées (fichiers, formats demandés) dépendent des options : on ne garde
+    # pour une vidéo que ce qui permet de relancer le traitement de yt-dlp
+    raw_info = info
+    info = yt_dlp.YoutubeDL.sanitize_info(raw_info, remove_private_keys=(mode == "full" and 'entries' not in raw_info))
+    metadata_cache.put(mode, url, info)
+    if mode == "flat" and 'entries' not in raw_info:
+        # Pour une vidéo seule, le passage extract_flat est une extraction complète
+        metadata_cache.put("full", url, yt_dlp.YoutubeDL.sanitize_info(raw_info, remove_private_keys=True))
+    return info
+
+def download_cache_key(info: dict, ydl_opts: dict, file_format: str) -> Optional[str]:
+    # Seules les vidéos identifiées par leur extracteur peuvent être partagées
+    if info.get('_type', 'video') != 'video' or not info.get('extractor_key') or not info.get('id'):
+        return None
+    return ContentStore.make_key(
+        info['extractor_key'],
+        info['id'],
+        ydl_opts['format'],
+        file_format,
+        ydl_opts.get('postprocessors', [])
+    )
+
+def downloaded_filepath(info: Optional[dict]) -> Optional[str]:
+    # Dernier fichier produit par process_ie_result (les playlists renvoient leurs entrées)
+    if not info:
+        return None
+    for entry in reversed(info.get('entries') or []):
+        filepath = downloaded_filepath(entry)
+        if filepath:
+            return filepath
+    for download in reversed(info.get('requested_downloads') or []):
+        if download.get('filepath'):
+            return download['filepath']
+    return info.get('filepath')
+
+def expected_size(info: dict) -> int:
+    # Taille annoncée par le site pour les formats choisis lors de l'extraction
+    return int(info.get('filesize') or info.get('filesize_approx') or 0)
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+def send_files(paths: list, build) -> Response:
+    # Fichiers protégés de l'éviction jusqu'à la fin de leur envoi : build
+    # reçoit la fonction à appeler à ce moment (on_close des réponses)
+    for path in paths:
+        disk_janitor.touch(path)
+        disk_janitor.pin(path)
+
+    def release():
+        for path in paths:
+            disk_janitor.unpin(path)
+
+    try:
+        return build(release)
+    except BaseException:
+        release()
+        raise
+
+def archive_response(request: Request, entries: list, filename: str):
+    # ZIP sans compression envoyé au fil de l'eau, taille connue à l'avance :
+    # les plages (reprise d'un téléchargement interrompu) sont produites directement
+    with zip_build_seconds.labels("layout").time():
+        archive = ZipStream(entries)
+    return send_files([entry.path for entry in entries], lambda release: stream_response(
+        request,
+        archive.size,
+        archive_validators(entries),
+        archive.iter_range,
+        headers={'Content-Disposition': content_disposition(filename)},
+        media_type='application/zip',
+        on_close=release
+    ))
 
 def format_duration(duration: int) -> str:
     hours = duration // 3600
@@ -140,245 +796,849 @@ def format_size(size: int) -> str:
         size /= 1024
     return f"{size:.1f} TB"
 
+# ---------------------------
+# Planificateur de téléchargements
+# ---------------------------
+# File d'attente servie par un nombre borné de workers. Le travail bloquant
+# (yt-dlp, ffmpeg) tourne dans un pool de threads pour ne jamais bloquer la
+# boucle d'événements d'uvicorn.
+class DownloadScheduler:
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="firedown-dl")
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers = []
+        self.active = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent)]
+
+    async def shutdown(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, func, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((func, args, future))
+        return future
+
+    async def run(self, func, *args):
+        return await self.submit(func, *args)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            func, args, future = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                self.active += 1
+                try:
+                    result = await loop.run_in_executor(self.executor, func, *args)
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    self.active -= 1
+            finally:
+                self.queue.task_done()
+
+download_scheduler = DownloadScheduler(MAX_CONCURRENT_DOWNLOADS)
+
+# Conversions ffmpeg, exécutées dans la boucle d'événements du processus
+ffmpeg_pool = FFmpegPool(FFMPEG_WORKERS, FFMPEG_THREADS)
+
+# Limite de téléchargements simultanés par site, pour ne pas déclencher la
+# limitation de débit d'un site pendant que les autres restent inoccupés
+host_semaphores = {}
+
+def host_key(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return "youtube.com" if host == "youtu.be" else host
+
+def host_semaphore(url: str) -> asyncio.Semaphore:
+    key = host_key(url)
+    semaphore = host_semaphores.get(key)
+    if semaphore is None:
+        semaphore = host_semaphores[key] = asyncio.Semaphore(max(1, PER_HOST_CONCURRENCY))
+    return semaphore
+
+# Pool dédié aux extractions de métadonnées, séparé de celui des téléchargements
+metadata_executor = ThreadPoolExecutor(max_workers=max(1, PLAYLIST_INFO_CONCURRENCY), thread_name_prefix="firedown-info")
+
+# Références vers les tâches lancées en arrière-plan (évite leur collecte par le GC)
+running_tasks = set()
+
+def _on_task_done(task: asyncio.Task):
+    running_tasks.discard(task)
+    # Les erreurs sont déjà reportées dans les statuts, on les consomme ici
+    if not task.cancelled():
+        task.exception()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    running_tasks.add(task)
+    task.add_done_callback(_on_task_done)
+    return task
+
 # ---------------------------
 # Fonction de téléchargement
 # ---------------------------
-async def download_video(url: str, format_type: str, quality: str, file_format: str, download_id: str, session_id: str = None):
-    # Créer et stocker le status avant tout
-    status = DownloadStatus()
-    download_statuses[download_id] = status
-    status.session_id = session_id
-    
+# Conversion à faire une fois le fichier téléchargé et l'emplacement libéré
+class PendingConversion:
+    def __init__(self, source: str, target: str, output_args: list, duration: Optional[float], cache_key: Optional[str]):
+        self.source = source
+        self.target = target
+        self.output_args = output_args
+        self.duration = duration
+        self.cache_key = cache_key
+
+def finish_download(status: DownloadStatus, cache_key: Optional[str], keep: bool):
+    # Le fichier final rejoint le magasin ; un lien reste à son emplacement,
+    # qui demeure le chemin du téléchargement
+    if cache_key and keep:
+        disk_janitor.track(content_store.ingest(cache_key, status.filepath, status.download_id))
+    elif cache_key:
+        content_store.abandon(cache_key)
+
+    status.progress = 100
+    status.is_ready = True
+    status.state = "completed"
+
+def _download_video_sync(url: str, format_type: str, quality: str, file_format: str, download_id: str, status: DownloadStatus) -> Optional[PendingConversion]:
+    # Renvoie la conversion qui reste à faire, exécutée ensuite par convert_download
+    if status.state != "downloading":  # pas de nouvelle attente pour un travail relancé
+        status.trace.add("queue", status.trace.started_at, time.time())
+    status.state = "downloading"
+
+    # Profil d'exécution demandé pour ce travail : échantillons de ce thread
+    profiler = SamplingProfiler(threading.get_ident()) if status.profile else None
+    if profiler is not None:
+        profiler.start()
     try:
-        # Un seul dossier pour tout
-        download_folder = os.path.join(DOWNLOAD_DIR, "videos")
-        os.makedirs(download_folder, exist_ok=True)
-        status.download_folder = download_folder
+        return _run_download(url, format_type, quality, file_format, download_id, status)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            profile_path = os.path.join(status.download_folder or job_folder(download_id), "profile.folded")
+            try:
+                profiler.write(profile_path)
+                status.profile_path = profile_path
+            except OSError as e:
+                print(f"Erreur lors de l'écriture du profil : {e}")
+
+def _run_download(url: str, format_type: str, quality: str, file_format: str, download_id: str, status: DownloadStatus) -> Optional[PendingConversion]:
 
-        ffmpeg_location = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ffmpeg", "bin")
+    # Dossier propre au travail, sauf si l'appelant en a imposé un (lot)
+    download_folder = status.download_folder or job_folder(download_id)
+    os.makedirs(download_folder, exist_ok=True)
+    status.download_folder = download_folder
+
+    may_convert = format_type == "video" and file_format not in ['mp4', 'webm']
+    progress_scale = CONVERSION_PROGRESS_START / 100 if may_convert else 1.0
+    
+    ydl_opts = {
+        'format': get_format_selection(format_type, quality, file_format),
+        'outtmpl': os.path.join(download_folder, f'%(title)s.%(ext)s'),
+        'progress_hooks': [lambda d: progress_hook(d, download_id, progress_scale)],
+        'postprocessor_hooks': [lambda d: postprocessor_hook(d, download_id)],
+        'no_check_certificates': True,
+        'nocheckcertificate': True,
+        'ignoreerrors': True,
+        'no_warnings': True,
+        'quiet': True,
+        'extract_flat': False,
+        'extractor_retries': 3,
+        'file_access_retries': 3,
+        'fragment_retries': 3,
+        'segment_connections': SEGMENT_CONNECTIONS,
+        'segment_size': SEGMENT_SIZE,
+        'concurrent_fragment_downloads': SEGMENT_CONNECTIONS,
+        'skip_download': False,
+        'rm_cachedir': True,
+        'ffmpeg_location': FFMPEG_LOCATION,
+        'retries': 10,
+    }
+
+    if may_convert and merge_format(file_format):
+        # Fusion directe dans le conteneur demandé, sans conversion ensuite
+        ydl_opts['merge_output_format'] = merge_format(file_format)
+
+    if format_type == "audio":
+        ydl_opts.update({
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': file_format,
+                'preferredquality': '192',  # seulement si le flux doit être réencodé
+            }],
+            'extractaudio': True,
+        })
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # Extraire les informations d'abord (ou les reprendre du cache)
+        with status.trace.stage("extraction"):
+            info = extract_info_cached(url, ydl_opts, ydl=ydl)
+        if info is None:
+            raise Exception("Impossible d'extraire les informations de la vidéo")
         
-        ydl_opts = {
-            'format': get_format_selection(format_type, quality, file_format),
-            'outtmpl': os.path.join(download_folder, f'%(title)s.%(ext)s'),
-            'progress_hooks': [lambda d: progress_hook(d, download_id)],
-            'no_check_certificates': True,
-            'nocheckcertificate': True,
-            'ignoreerrors': True,
-            'no_warnings': True,
-            'quiet': True,
-            'extract_flat': False,
-            'extractor_retries': 3,
-            'file_access_retries': 3,
-            'fragment_retries': 3,
-            'skip_download': False,
-            'rm_cachedir': True,
-            'ffmpeg_location': ffmpeg_location,
-            'retries': 10,
-        }
+        # Mettre à jour le titre
+        status.title = info.get('title', '')
 
-        if format_type == "audio":
-            ydl_opts.update({
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': file_format,
-                    'preferredquality': '192',
-                }],
-                'extractaudio': True,
-                'format': 'bestaudio/best',
-            })
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Extraire les informations d'abord
-            info = ydl.extract_info(url, download=False)
-            if info is None:
-                raise Exception("Impossible d'extraire les informations de la vidéo")
-            
-            # Mettre à jour le titre
-            status.title = info.get('title', '')
-            
-            # Télécharger la vidéo
-            info = ydl.extract_info(url, download=True)
+        # Contenu déjà produit pour une requête identique : servi depuis le magasin
+        cache_key = download_cache_key(info, ydl_opts, file_format)
+        if cache_key:
+            # Un téléchargement identique en cours lève ContentPending : l'appelant
+            # attend sa fin après avoir rendu son emplacement, puis relance le travail
+            with status.trace.stage("store") as stage:
+                cached_path = content_store.acquire(cache_key, download_id, wait=False)
+                stage["hit"] = cached_path is not None
+            if cached_path:
+                disk_janitor.touch(cached_path)
+                status.filepath = link_into(cached_path, download_folder)
+                status.filename = os.path.basename(status.filepath)
+                status.progress = 100
+                status.is_ready = True
+                status.state = "completed"
+                return
+
+        try:
+            # Place libérée au besoin (éviction des fichiers les moins récemment
+            # utilisés) avant d'écrire quoi que ce soit
+            if not disk_janitor.ensure_space(expected_size(info)):
+                raise Exception("Espace disque insuffisant pour ce téléchargement")
+
+            # Télécharger la vidéo en reprenant les informations déjà extraites :
+            # yt-dlp ne refait que la sélection des formats, sans nouvel accès réseau.
+            # Sa limite de débit suit la part du budget commun accordée au travail
+            small = bandwidth_governor.is_small(format_type == "audio", expected_size(info))
+            with bandwidth_governor.job(download_id, ydl.params, status.session_id, small):
+                info = ydl.process_ie_result(copy.deepcopy(info), download=True)
             
-            files = os.listdir(download_folder)
-            if not files:
+            # Chemin final (après post-traitement) renvoyé par ce même passage
+            latest_file = downloaded_filepath(info)
+            if not latest_file or not os.path.exists(latest_file):
                 raise Exception("Le fichier n'a pas pu être téléchargé")
-            
-            # Trouver le fichier le plus récent dans le dossier (celui qu'on vient de télécharger)
-            latest_file = max([os.path.join(download_folder, f) for f in files], key=os.path.getctime)
             status.filename = os.path.basename(latest_file)
+            status.filepath = latest_file
+        except BaseException:
+            if cache_key:
+                content_store.abandon(cache_key)
+            raise
 
-            if format_type == "video" and file_format not in ['mp4', 'webm']:
-                final_filename = f"{os.path.splitext(status.filename)[0]}.{file_format}"
-                final_path = os.path.join(download_folder, final_filename)
-                try:
-                    import subprocess
-                    cmd = [
-                        os.path.join(ffmpeg_location, 'ffmpeg'),
-                        '-i', latest_file,
-                        '-c:v', 'libx264' if file_format == 'avi' else 'copy',
-                        '-c:a', 'aac',
-                        final_path
-                    ]
-                    subprocess.run(cmd, check=True)
-                    os.remove(latest_file)  # Supprimer le fichier original
-                    status.filename = final_filename
-                except subprocess.CalledProcessError as e:
-                    print(f"Erreur lors de la conversion: {e}")
-
-            status.progress = 100
-            status.is_ready = True
+        # Passage au conteneur demandé : copie des flux compatibles, réencodage
+        # des seuls flux que le conteneur n'accepte pas
+        output_args = conversion_args(info, file_format) if may_convert else None
+        if output_args is not None:
+            final_filename = f"{os.path.splitext(status.filename)[0]}.{file_format}"
+            return PendingConversion(
+                latest_file,
+                os.path.join(download_folder, final_filename),
+                output_args,
+                info.get('duration'),
+                cache_key
+            )
 
-    except Exception as e:
-        status.error = str(e)
-        print(f"Erreur lors du téléchargement: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        finish_download(status, cache_key, keep=True)
+        return None
+
+async def convert_download(status: DownloadStatus, conversion: PendingConversion):
+    def on_progress(fraction: float):
+        status.progress = CONVERSION_PROGRESS_START + (99 - CONVERSION_PROGRESS_START) * fraction
+
+    status.state = "converting"
+    started = time.perf_counter()
+    try:
+        with status.trace.stage("conversion", args=" ".join(conversion.output_args)):
+            await ffmpeg_pool.run(
+                os.path.join(FFMPEG_LOCATION, 'ffmpeg'),
+                [conversion.source],
+                conversion.output_args,
+                conversion.target,
+                conversion.duration,
+                on_progress
+            )
+    except FFmpegError as e:
+        conversion_seconds.labels("error").observe(time.perf_counter() - started)
+        # Le fichier téléchargé est livré tel quel, sans entrer dans le magasin
+        print(f"Erreur lors de la conversion: {e}")
+        finish_download(status, conversion.cache_key, keep=False)
+        return
+    except BaseException:
+        if conversion.cache_key:
+            content_store.abandon(conversion.cache_key)
+        raise
+    conversion_seconds.labels("success").observe(time.perf_counter() - started)
+    os.remove(conversion.source)  # Supprimer le fichier original
+    status.filename = os.path.basename(conversion.target)
+    status.filepath = conversion.target
+    finish_download(status, conversion.cache_key, keep=True)
+
+async def download_video(url: str, format_type: str, quality: str, file_format: str, download_id: str, session_id: str = None):
+    # Le statut peut déjà exister s'il a été créé lors de la mise en file d'attente
+    status = download_statuses.get(download_id)
+    if status is None:
+        status = register_download(download_id, session_id)
+    elif session_id is not None:
+        status.session_id = session_id
+    
+    if EXECUTION_MODE == "queue":
+        async with host_semaphore(url):
+            await submit_to_workers([worker_job(url, format_type, quality, file_format, download_id)])
+            status = await wait_for_worker(download_id)
+        if status.error:
+            raise HTTPException(status_code=500, detail=status.error)
+        return
+    
+    while True:
+        # La limite par site est prise avant la file du planificateur : un travail en
+        # attente de son site n'occupe pas d'emplacement de téléchargement
+        async with host_semaphore(url):
+            try:
+                # Le travail bloquant est exécuté par le planificateur, hors de la boucle d'événements
+                conversion = await download_scheduler.run(_download_video_sync, url, format_type, quality, file_format, download_id, status)
+                break
+            except ContentPending as pending:
+                key = pending.key
+            except Exception as e:
+                fail_download(status, e)
+        # Téléchargement identique en cours : attendu sur la boucle, emplacement
+        # et limite par site rendus, puis le travail est relancé (servi par le magasin)
+        with status.trace.stage("store", wait=True):
+            await wait_for_content(key)
+    
+    # La conversion libère l'emplacement de téléchargement et la limite par site
+    if conversion is not None:
+        try:
+            await convert_download(status, conversion)
+        except Exception as e:
+            fail_download(status, e)
+
+async def wait_for_content(key: str):
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def wake():
+        loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+    if content_store.add_waiter(key, wake):
+        await done
+
+def fail_download(status: DownloadStatus, e: Exception):
+    status.error = str(e)
+    status.state = "error"
+    print(f"Erreur lors du téléchargement: {str(e)}")
+    raise HTTPException(status_code=500, detail=str(e))
+
+def register_download(download_id: str, session_id: str = None, profile: bool = False) -> DownloadStatus:
+    # Statut créé dès l'admission : le téléchargement prend sa place dans la file
+    status = DownloadStatus(download_id)
+    status.session_id = session_id
+    status.profile = profile
+    download_statuses[download_id] = status
+    if EXECUTION_MODE != "queue":
+        waiting_line.join(download_id)
+    return status
+
+def enqueue_download(url: str, format_type: str, quality: str, file_format: str, download_id: str, session_id: str = None, profile: bool = False) -> Optional[dict]:
+    # Créer le statut dès la mise en file pour que /check-status réponde immédiatement.
+    # En mode "queue", renvoie le travail à confier aux workers (submit_to_workers)
+    register_download(download_id, session_id, profile)
+    if EXECUTION_MODE == "queue":
+        return worker_job(url, format_type, quality, file_format, download_id)
+    spawn(download_video(url, format_type, quality, file_format, download_id, session_id))
+    return None
+
+def worker_job(url: str, format_type: str, quality: str, file_format: str, download_id: str) -> dict:
+    return {
+        "download_id": download_id,
+        "url": url,
+        "format": format_type,
+        "quality": quality,
+        "fileFormat": file_format
+    }
+
+async def submit_to_workers(jobs: list):
+    # Les états sont écrits dans le stockage partagé (une transaction) avant la
+    # mise en file, hors de la boucle ; ils sont ensuite mis à jour par le worker
+    # qui exécute chaque téléchargement
+    for job in jobs:
+        status = download_statuses[job["download_id"]]
+        if status.session_id:
+            local_session_progress(status.session_id).set_active(status, False)
+
+    def submit():
+        download_statuses.detach_many([job["download_id"] for job in jobs])
+        for job in jobs:
+            job_queue.put(job)
+
+    await asyncio.to_thread(submit)
+
+async def wait_for_worker(download_id: str) -> DownloadStatus:
+    while True:
+        await asyncio.sleep(JOB_STORE_FLUSH_INTERVAL)
+        status = download_statuses.get(download_id)
+        if status is None:
+            raise Exception("Téléchargement non trouvé")
+        if status.state in ("completed", "error"):
+            # Déjà compté dans le débit par le worker, qui l'a publié
+            return status
+
+# ---------------------------
+# États exposés aux clients
+# ---------------------------
+def download_status_payload(status: DownloadStatus) -> dict:
+    response = {
+        "progress": status.progress,
+        "title": status.title,
+        "is_ready": status.is_ready,
+        "state": status.state
+    }
+    
+    if status.error:
+        response["error"] = status.error
+    if status.is_ready:
+        response["filename"] = status.filename
+    
+    # Place dans la file et délai estimé (secondes) d'après le débit observé
+    if status.state == "queued":
+        position = queue_position(status.download_id)
+        response["queue_position"] = position
+        response["eta"] = throughput.eta(position + 1) if position is not None else None
+    elif status.state in ("downloading", "converting"):
+        response["eta"] = running_eta(status)
+    
+    return response
+
+def queue_position(download_id: str) -> Optional[int]:
+    if job_queue is not None:
+        return job_queue.position(download_id)
+    return waiting_line.position(download_id)
+
+def running_eta(status: DownloadStatus) -> Optional[float]:
+    if not status.started_at or status.progress <= 0:
+        return None
+    elapsed = time.time() - status.started_at
+    return elapsed * (100 - status.progress) / status.progress
+
+def batch_status_payload(status: BatchStatus) -> dict:
+    response = {
+        "progress": status.progress,
+        "current_index": status.current_index,
+        "total_files": status.total_files,
+        "current_video": status.current_video,
+        "is_ready": status.is_ready,
+        "completed_files": len(status.completed_files),
+        "failed_files": len(status.failed_files),
+        "archive_files": len(status.archive.entries)
+    }
+    if not status.is_ready and not status.error:
+        finished = len(status.completed_files) + len(status.failed_files)
+        response["eta"] = throughput.eta(status.total_files - finished)
+    
+    if status.error:
+        response["error"] = status.error
+    if status.is_ready:
+        response["filename"] = status.filename
+    
+    return response
+
+def session_status_payload(session: DownloadSession) -> dict:
+    session_id = session.session_id
+    
+    # Compteurs tenus à jour par les téléchargements de la session
+    summary = session_summary(session_id)
+    total_downloads = summary["total"]
+    completed_downloads = summary["completed"]
+    failed_downloads = summary["failed"]
+    
+    if total_downloads > 0:
+        total_progress = summary["progress_sum"] / total_downloads
+    else:
+        total_progress = 0
+    
+    # Si tous les téléchargements sont terminés, l'archive est disponible
+    # (sa liste de fichiers est préparée une seule fois, le contenu est envoyé à la volée)
+    if completed_downloads + failed_downloads == total_downloads and total_downloads > 0:
+        if session.status != "completed":
+            session.status = "completed"
+            log_trace("session", session_id, "completed", {"totals": session_stages(session_id)})
+        session_archive(session_id, completed_downloads)
+        return {
+            "status": "completed",
+            "progress": 100,
+            "completed": completed_downloads,
+            "failed": failed_downloads,
+            "total": total_downloads,
+            "filename": f"session_{session_id}.zip"
+        }
+    
+    # Sinon, renvoyer la progression
+    return {
+        "status": "downloading",
+        "progress": total_progress,
+        "completed": completed_downloads,
+        "failed": failed_downloads,
+        "total": total_downloads,
+        "eta": throughput.eta(total_downloads - completed_downloads - failed_downloads),
+        "current_downloads": [
+            {
+                "title": item["title"],
+                "progress": item["progress"],
+                "error": None
+            }
+            for item in summary["active"]
+        ]
+    }
+
+# Archive de chaque session, figée quand ses téléchargements sont terminés :
+# liste des fichiers, noms et CRC ne sont calculés qu'une fois, tant qu'aucun
+# téléchargement ne se termine en plus
+session_archives = {}  # session -> (téléchargements terminés, entrées de l'archive)
+
+def session_archive(session_id: str, completed: int) -> list:
+    cached = session_archives.get(session_id)
+    if cached is not None and cached[0] == completed:
+        return cached[1]
+    files = session_files(session_id)
+    ordered = sorted(files.values(), key=lambda item: item["completed_at"])
+    entries = unique_arcnames([item["path"] for item in ordered if os.path.exists(item["path"])])
+    session_archives[session_id] = (completed, entries)
+    spawn(asyncio.to_thread(compute_crcs, entries))
+    return entries
+
+def compute_crcs(entries: list, trace: Optional[JobTrace] = None):
+    start = time.time()
+    with zip_build_seconds.labels("crc").time():
+        for entry in entries:
+            entry.compute_crc()
+    if trace is not None:
+        trace.add("zip_crc", start, time.time(), sum(entry.size for entry in entries))
+
+def event_snapshot(topic: str) -> Optional[dict]:
+    kind, _, item_id = topic.partition(':')
+    # Une seule lecture par sujet (get), y compris depuis le stockage partagé
+    if kind == "download":
+        status = download_statuses.get(item_id)
+        return None if status is None else download_status_payload(status)
+    if kind == "batch":
+        status = batch_statuses.get(item_id)
+        return None if status is None else batch_status_payload(status)
+    if kind == "session":
+        session = download_sessions.get(item_id)
+        return None if session is None else session_status_payload(session)
+    return None
 
 # ---------------------------
 # Routes
 # ---------------------------
 @app.post("/start-download")
-async def start_download(request: DownloadRequest, background_tasks: BackgroundTasks):
+async def start_download(request: DownloadRequest, profile: bool = False):
+    if profile and not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Le profilage est désactivé (FIREDOWN_PROFILING)")
     download_id = str(uuid.uuid4())
     try:
-        background_tasks.add_task(
-            download_video,
-            request.url,
-            request.format,
-            request.quality,
-            request.fileFormat,
-            download_id
-        )
+        async with admit(1):
+            job = enqueue_download(
+                request.url,
+                request.format,
+                request.quality,
+                request.fileFormat,
+                download_id,
+                request.session_id,
+                profile
+            )
+            if job is not None:
+                await submit_to_workers([job])
+        await persist_job_states()
         return {"download_id": download_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/check-status/{download_id}")
-async def check_status(download_id: str):
-    if download_id not in download_statuses:
+async def check_status(download_id: str, trace: bool = False):
+    status = await download_statuses.fetch(download_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Téléchargement non trouvé")
     
-    status = download_statuses[download_id]
-    response = {
-        "progress": status.progress,
-        "title": status.title,
-        "is_ready": status.is_ready
-    }
+    response = download_status_payload(status)
+    if trace:
+        response["trace"] = status.trace.to_dict()
+    return response
+
+@app.get("/profile/{download_id}")
+async def get_profile(download_id: str):
+    # Piles repliées du téléchargement lancé avec ?profile=1
+    status = await download_statuses.fetch(download_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Téléchargement non trouvé")
+    if not status.profile_path or not os.path.exists(status.profile_path):
+        raise HTTPException(status_code=404, detail="Aucun profil pour ce téléchargement")
+    with open(status.profile_path, encoding='utf-8') as f:
+        return Response(content=f.read(), media_type="text/plain; charset=utf-8")
+
+@app.get("/events")
+async def events(downloads: str = "", batches: str = "", sessions: str = ""):
+    # Flux Server-Sent Events remplaçant l'interrogation périodique des statuts
+    topics = set()
+    for kind, ids in (("download", downloads), ("batch", batches), ("session", sessions)):
+        topics.update(f"{kind}:{item_id}" for item_id in ids.split(',') if item_id)
+    if not topics:
+        raise HTTPException(status_code=400, detail="Aucun téléchargement à suivre")
     
-    if status.error:
-        response["error"] = status.error
-    if status.is_ready:
-        response["filename"] = status.filename
+    # Avec un stockage partagé, les travaux d'un autre worker sont relus périodiquement
+    poll_interval = JOB_STORE_FLUSH_INTERVAL if job_store.persistent else None
+    return StreamingResponse(
+        event_broker.stream(topics, event_snapshot, 1 / EVENTS_MAX_RATE, poll_interval=poll_interval),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # nginx ne doit pas mettre le flux en tampon
+        }
+    )
+
+def topic_version(kind: str, item_id: str) -> str:
+    # Version de l'état d'un sujet, sans construire sa réponse ; relue depuis
+    # le stockage partagé pour les travaux suivis par un autre processus
+    if kind == "download":
+        status = download_statuses.get(item_id)
+        if status is None:
+            return "-"
+        if status.state == "queued":
+            # La place dans la file change sans que le travail change
+            return f"{status.version}@{queue_position(item_id)}"
+        return str(status.version)
+    if kind == "batch":
+        status = batch_statuses.get(item_id)
+        return "-" if status is None else str(status.version)
+    session = download_sessions.get(item_id)
+    if session is None:
+        return "-"
+    versions = sum(progress.version for progress in session_progress.session_jobs(item_id))
+    return f"{session.status}:{versions}"
+
+@app.get("/statuses")
+async def bulk_statuses(request: Request, downloads: str = "", batches: str = "", sessions: str = ""):
+    # États de plusieurs téléchargements, lots et sessions en une requête.
+    # L'ETag résume leurs versions : If-None-Match reçoit 304 sans qu'aucun
+    # état ne soit construit ni envoyé
+    topics = [
+        (kind, item_id)
+        for kind, ids in (("download", downloads), ("batch", batches), ("session", sessions))
+        for item_id in dict.fromkeys(ids.split(',')) if item_id
+    ]
+    if not topics:
+        raise HTTPException(status_code=400, detail="Aucun téléchargement à suivre")
     
-    return response
+    # Versions relues à chaque interrogation, depuis le stockage partagé pour les
+    # travaux des autres processus : hors de la boucle d'événements dans ce cas
+    def read_versions() -> list:
+        return [topic_version(kind, item_id) for kind, item_id in topics]
 
-@app.get("/download-file/{download_id}")
-async def download_file(download_id: str):
-    if download_id not in download_statuses:
+    versions = await asyncio.to_thread(read_versions) if job_store.persistent else read_versions()
+    digest = hashlib.sha1()
+    for (kind, item_id), version in zip(topics, versions):
+        digest.update(f"{kind}:{item_id}={version}\n".encode('utf-8'))
+    etag = f'"{digest.hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+    
+    response = {"downloads": {}, "batches": {}, "sessions": {}}
+    for kind, item_id in topics:
+        response[f"{kind}s"][item_id] = event_snapshot(f"{kind}:{item_id}")
+    return JSONResponse(response, headers=headers)
+
+@app.api_route("/download-file/{download_id}", methods=["GET", "HEAD"])
+async def download_file(download_id: str, request: Request):
+    status = await download_statuses.fetch(download_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Téléchargement non trouvé")
     
-    status = download_statuses[download_id]
     if not status.is_ready:
         raise HTTPException(status_code=400, detail="Le fichier n'est pas encore prêt")
     
-    file_path = os.path.join(DOWNLOAD_DIR, status.filename)
-    if not os.path.exists(file_path):
+    if not status.filepath or not os.path.exists(status.filepath):
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(
-        file_path,
-        media_type='application/octet-stream',
-        filename=status.filename
-    )
+    headers = {'Content-Disposition': content_disposition(status.filename)}
+    return send_files([status.filepath], lambda release: file_response(request, status.filepath, headers=headers, on_close=release))
 
 @app.post("/cleanup/{download_id}")
 async def cleanup(download_id: str):
-    if download_id not in download_statuses:
+    status = await download_statuses.fetch(download_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Téléchargement non trouvé")
     
-    status = download_statuses[download_id]
     file_path = os.path.join(DOWNLOAD_DIR, status.filename)
     
     try:
         # if os.path.exists(file_path):
         #     os.remove(file_path)
         del download_statuses[download_id]
+        waiting_line.leave(download_id)
+        content_store.release(download_id)
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Options yt-dlp utilisées pour l'aperçu des vidéos et playlists
+VIDEO_INFO_OPTS = {
+    'no_check_certificates': True,
+    'nocheckcertificate': True,
+    'quiet': True,
+    'extract_flat': True,
+    'force_generic_extractor': False,
+    'ignoreerrors': True,
+}
+
+def build_video_item(info: dict) -> dict:
+    thumbnails = info.get('thumbnails') or []
+    filesize = info.get('filesize') or info.get('filesize_approx')
+    return {
+        'title': info.get('title') or 'Unknown',
+        'duration': format_duration(int(info.get('duration') or 0)),
+        'thumbnail': info.get('thumbnail') or (thumbnails[-1].get('url') if thumbnails else None),
+        'url': info.get('webpage_url') or info.get('url'),
+        'id': info.get('id', None),
+        'size': format_size(filesize) if filesize else None,
+        'status': 'pending'  # État initial
+    }
+
+def extract_video_item(video_url: str) -> Optional[dict]:
+    try:
+        info = extract_info_cached(video_url, VIDEO_INFO_OPTS)
+        if info is None:
+            return None
+        return build_video_item(info)
+    except Exception as e:
+        print(f"Erreur lors de l'extraction de {video_url}: {str(e)}")
+        return None
+
+def extract_playlist_info(url: str) -> Optional[dict]:
+    return extract_info_cached(url, VIDEO_INFO_OPTS, mode="flat")
+
+async def resolve_playlist_entries(entries: list) -> list:
+    # Chaque entrée est extraite dans un pool propre à la requête, de la taille
+    # du plafond d'extractions simultanées : une entrée n'attend jamais derrière
+    # celles d'une autre prévisualisation, et une extraction abandonnée n'occupe
+    # qu'un thread de cette requête. Le délai par entrée court à partir du début
+    # effectif de l'extraction, pas de sa mise en attente dans le pool.
+    # Renvoie, dans l'ordre de la playlist, (informations, raison de l'échec)
+    loop = asyncio.get_running_loop()
+    workers = max(1, PLAYLIST_INFO_CONCURRENCY)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="firedown-preview")
+    stalled = asyncio.Event()  # tous les threads retenus par des extractions abandonnées
+    abandoned = 0
+
+    def release(_):
+        nonlocal abandoned
+        abandoned -= 1
+
+    async def resolve(entry):
+        nonlocal abandoned
+        video_url = entry.get('url') or entry.get('webpage_url')
+        started = asyncio.Event()
+
+        def run():
+            loop.call_soon_threadsafe(started.set)
+            return extract_video_item(video_url)
+
+        future = loop.run_in_executor(executor, run)
+        waiters = [asyncio.ensure_future(started.wait()), asyncio.ensure_future(stalled.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        if not started.is_set():
+            future.cancel()
+            return None, "timeout"
+        try:
+            item = await asyncio.wait_for(asyncio.shield(future), timeout=PLAYLIST_ENTRY_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Délai dépassé lors de l'extraction de {video_url}")
+            abandoned += 1
+            if abandoned >= workers:
+                stalled.set()
+            future.add_done_callback(release)
+            return None, "timeout"
+        return (item, None) if item else (None, "error")
+
+    try:
+        return await asyncio.gather(*(resolve(entry) for entry in entries))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 @app.get("/video-info")
-async def get_video_info(url: str):
+async def get_video_info(url: str, flat: bool = False):
     try:
-        ydl_opts = {
-            'no_check_certificates': True,
-            'nocheckcertificate': True,
-            'quiet': True,
-            'extract_flat': True,
-            'force_generic_extractor': False,
-            'ignoreerrors': True,
-        }
+        # Les extractions yt-dlp sont bloquantes : on les exécute hors de la boucle
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(metadata_executor, extract_playlist_info, url)
+        if info is None:
+            raise Exception("Impossible d'extraire les informations")
         
-        async def extract_video_info(video_url):
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                try:
-                    info = ydl.extract_info(video_url, download=False)
-                    if info is None:
-                        return None
-                    
-                    return {
-                        'title': info.get('title', 'Unknown'),
-                        'duration': format_duration(info.get('duration', 0)),
-                        'thumbnail': info.get('thumbnail', None),
-                        'url': info.get('webpage_url', None),
-                        'id': info.get('id', None),
-                        'size': format_size(info.get('filesize', 0)) if info.get('filesize') else None,
-                        'status': 'pending'  # État initial
-                    }
-                except Exception as e:
-                    print(f"Erreur lors de l'extraction de {video_url}: {str(e)}")
-                    return None
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if info is None:
-                raise Exception("Impossible d'extraire les informations")
+        if 'entries' in info:  # C'est une playlist
+            entries = [
+                entry for entry in info['entries']
+                if entry and (entry.get('url') or entry.get('webpage_url'))
+            ]
             
-            if 'entries' in info:  # C'est une playlist
-                playlist_items = []
-                total_duration = 0
-                
-                for entry in info['entries']:
-                    if entry and entry.get('url') or entry.get('webpage_url'):
-                        video_info = await extract_video_info(entry.get('url') or entry.get('webpage_url'))
-                        if video_info:
-                            playlist_items.append(video_info)
-                            if 'duration' in entry:
-                                total_duration += entry['duration']
-                
-                if not playlist_items:
-                    raise Exception("Aucune vidéo valide trouvée dans la playlist")
-                
-                return VideoInfo(
-                    title=info.get('title', 'Unknown Playlist'),
-                    duration=f"{len(playlist_items)} vidéos ({format_duration(total_duration)})",
-                    thumbnail=info.get('thumbnail') or playlist_items[0].get('thumbnail'),
-                    isPlaylist=True,
-                    playlistItems=playlist_items,
-                    size=None  # La taille totale sera calculée plus tard
-                )
-            else:  # C'est une vidéo unique
-                video_info = await extract_video_info(url)
-                if not video_info:
-                    raise Exception("Impossible d'extraire les informations de la vidéo")
-                
-                return VideoInfo(
-                    title=video_info['title'],
-                    duration=video_info['duration'],
-                    thumbnail=video_info['thumbnail'],
-                    size=video_info['size'],
-                    isPlaylist=False,
-                    playlistItems=[video_info]  # On inclut quand même la vidéo dans la liste
-                )
+            # En mode rapide, on se contente des données du premier passage extract_flat
+            if flat:
+                resolved = [(build_video_item(entry), None) for entry in entries]
+            else:
+                resolved = await resolve_playlist_entries(entries)
+            
+            playlist_items = []
+            skipped_items = []  # entrées illisibles, signalées au client plutôt qu'omises
+            total_duration = 0
+            for entry, (video_info, reason) in zip(entries, resolved):
+                if video_info:
+                    playlist_items.append(video_info)
+                    if entry.get('duration'):
+                        total_duration += entry['duration']
+                else:
+                    skipped_items.append({
+                        "url": entry.get('url') or entry.get('webpage_url'),
+                        "title": entry.get('title'),
+                        "reason": reason
+                    })
+            
+            if not playlist_items:
+                raise Exception("Aucune vidéo valide trouvée dans la playlist")
+            
+            return VideoInfo(
+                title=info.get('title', 'Unknown Playlist'),
+                duration=f"{len(playlist_items)} vidéos ({format_duration(int(total_duration))})",
+                thumbnail=info.get('thumbnail') or playlist_items[0].get('thumbnail'),
+                isPlaylist=True,
+                playlistItems=playlist_items,
+                skippedItems=skipped_items,
+                size=None  # La taille totale sera calculée plus tard
+            )
+        else:  # C'est une vidéo unique, déjà entièrement extraite par le premier passage
+            video_info = build_video_item(info)
+            
+            return VideoInfo(
+                title=video_info['title'],
+                duration=video_info['duration'],
+                thumbnail=video_info['thumbnail'],
+                size=video_info['size'],
+                isPlaylist=False,
+                playlistItems=[video_info]  # On inclut quand même la vidéo dans la liste
+            )
     except Exception as e:
         print(f"Erreur dans get_video_info: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -393,56 +1653,167 @@ async def add_playlist(url: str, format: str = "audio", quality: str = "highest"
             'quiet': True,
             'extract_flat': 'in_playlist',
         }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            if not info or 'entries' not in info:
-                raise HTTPException(status_code=400, detail="URL invalide ou playlist non trouvée")
-            
-            # Créer une liste de vidéos à télécharger
-            videos = []
-            for entry in info['entries']:
-                if entry and entry.get('webpage_url'):
-                    videos.append({
-                        "url": entry['webpage_url'],
-                        "format": format,
-                        "quality": quality,
-                        "fileFormat": fileFormat,
-                        "title": entry.get('title', 'Unknown')
-                    })
-            
-            return {
-                "videos": videos,
-                "playlist_title": info.get('title', 'Unknown Playlist'),
-                "video_count": len(videos)
-            }
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(metadata_executor, extract_info_cached, url, ydl_opts, "flat")
+        if not info or 'entries' not in info:
+            raise HTTPException(status_code=400, detail="URL invalide ou playlist non trouvée")
+        
+        # Créer une liste de vidéos à télécharger
+        videos = []
+        for entry in info['entries']:
+            if entry and entry.get('webpage_url'):
+                videos.append({
+                    "url": entry['webpage_url'],
+                    "format": format,
+                    "quality": quality,
+                    "fileFormat": fileFormat,
+                    "title": entry.get('title', 'Unknown')
+                })
+        
+        return {
+            "videos": videos,
+            "playlist_title": info.get('title', 'Unknown Playlist'),
+            "video_count": len(videos)
+        }
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def flush_job_states():
+    # États modifiés de toutes les tables, en une seule transaction
+    job_writer.flush()
+
+async def persist_job_states():
+    # Avant de renvoyer des identifiants au client : ils doivent être lisibles
+    # par les autres processus
+    if job_store.persistent:
+        await asyncio.to_thread(flush_job_states)
+
+job_writer_stop = threading.Event()
+
 # Nettoyage périodique
 @app.on_event("startup")
 async def startup_event():
+    download_scheduler.start()
+    spawn(loop_lag_monitor.run())
+
+    # Inventaire de l'espace disque, tenu à jour ensuite à chaque fin de travail
+    await asyncio.to_thread(disk_janitor.scan)
+
+    if job_store.persistent:
+        threading.Thread(target=job_writer.run, args=(job_writer_stop,), name="firedown-flush", daemon=True).start()
+
     async def cleanup_downloads():
         while True:
             await asyncio.sleep(3600)  # Nettoyage toutes les heures
             try:
-                current_time = time.time()
-                # Nettoyage des fichiers
-                for filename in os.listdir(DOWNLOAD_DIR):
-                    file_path = os.path.join(DOWNLOAD_DIR, filename)
-                    if os.path.isfile(file_path):
-                        if os.path.getmtime(file_path) < current_time - 3600:
-                            os.remove(file_path)
+                # Fichiers inutilisés depuis une heure (travaux, lots, magasin),
+                # d'après l'inventaire tenu à jour, sans parcourir le volume
+                await asyncio.to_thread(disk_janitor.expire, 3600)
                 
-                # Nettoyage des statuts
+                # Purge des métadonnées expirées
+                metadata_cache.purge_expired()
+
+                # États partagés que plus aucun processus ne met à jour
+                job_store.purge(86400)
+                
+                # Archives de sessions dont les fichiers ont été supprimés
+                for session_id, (_, entries) in list(session_archives.items()):
+                    if not all(os.path.exists(entry.path) for entry in entries):
+                        del session_archives[session_id]
+
+                # Nettoyage des statuts expirés : leurs fichiers redeviennent
+                # évictables au prochain passage
+                now = time.time()
                 for download_id in list(download_statuses.keys()):
                     status = download_statuses[download_id]
-                    if status.is_ready or status.error:
+                    if status_expired(status, now):
                         del download_statuses[download_id]
+                        content_store.release(download_id)
+                for batch_id in list(batch_statuses.keys()):
+                    if status_expired(batch_statuses[batch_id], now):
+                        del batch_statuses[batch_id]
             except Exception as e:
                 print(f"Erreur lors du nettoyage : {e}")
     
-    asyncio.create_task(cleanup_downloads())
+    spawn(cleanup_downloads())
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {"metadata": metadata_cache.stats(), "downloads": content_store.stats(), "ffmpeg": ffmpeg_pool.stats(), "disk": disk_janitor.stats(), "admission": admission.stats(), "bandwidth": bandwidth_governor.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    # Collecte hors de la boucle : la profondeur de file peut lire la base
+    body = await asyncio.to_thread(metrics.render)
+    return Response(content=body, media_type=METRICS_CONTENT_TYPE)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await download_scheduler.shutdown()
+    metadata_executor.shutdown(wait=False, cancel_futures=True)
+    job_writer_stop.set()
+    flush_job_states()
+    job_store.close()
+    if job_queue is not None:
+        job_queue.close()
+
+async def process_batch_item(batch_status: BatchStatus, batch_folder: str, index: int, video: DownloadRequest):
+    try:
+        batch_status.current_index = max(batch_status.current_index, index)
+        batch_status.current_video = f"Téléchargement {batch_status.current_index}/{batch_status.total_files}"
+        
+        # Télécharger la vidéo
+        download_id = str(uuid.uuid4())
+        status = register_download(download_id)
+        
+        # Un sous-dossier par vidéo : deux vidéos de même titre ne se gênent pas
+        status.download_folder = os.path.join(batch_folder, str(index))
+        
+        await download_video(
+            video.url,
+            video.format,
+            video.quality,
+            video.fileFormat,
+            download_id
+        )
+        # En mode "queue", l'état à jour est celui écrit par le worker
+        status = download_statuses[download_id]
+        batch_status.trace.extend(status.trace, item=index)
+        
+        # Les listes restent triées par position dans le lot, quel que soit
+        # l'ordre dans lequel les vidéos se terminent
+        if status.error:
+            bisect.insort(batch_status.failed_files, {
+                'index': index,
+                'title': status.title,
+                'error': status.error
+            }, key=lambda item: item['index'])
+        else:
+            filepath = status.filepath
+            bisect.insort(batch_status.completed_files, {
+                'index': index,
+                'title': status.title,
+                'filename': status.filename,
+                'filepath': filepath
+            }, key=lambda item: item['index'])
+            # Ajouter le fichier à l'archive dès maintenant ; son CRC est calculé
+            # pendant que le lot continue, l'archive finale est prête aussitôt
+            entry = batch_status.archive.add(filepath)
+            spawn(asyncio.to_thread(compute_crcs, [entry], batch_status.trace))
+        
+    except Exception as e:
+        bisect.insort(batch_status.failed_files, {
+            'index': index,
+            'title': f"Vidéo {index}",
+            'error': str(e)
+        }, key=lambda item: item['index'])
+    
+    # Mettre à jour la progression globale (toutes les mises à jour ont lieu
+    # dans la boucle d'événements, sans accès concurrent)
+    finished = len(batch_status.completed_files) + len(batch_status.failed_files)
+    batch_status.progress = (finished / batch_status.total_files) * 100
+    batch_status.notify()
 
 async def process_batch_downloads(batch_id: str, videos: list[DownloadRequest]):
     try:
@@ -453,51 +1824,16 @@ async def process_batch_downloads(batch_id: str, videos: list[DownloadRequest]):
         batch_folder = os.path.join(DOWNLOAD_DIR, f"batch_{batch_id}")
         os.makedirs(batch_folder, exist_ok=True)
         
-        # Traiter chaque vidéo séquentiellement
-        for index, video in enumerate(videos, 1):
-            try:
-                batch_status.current_index = index
-                batch_status.current_video = f"Téléchargement {index}/{batch_status.total_files}"
-                
-                # Télécharger la vidéo
-                download_id = str(uuid.uuid4())
-                status = DownloadStatus()
-                download_statuses[download_id] = status
-                
-                # Modifier le dossier de destination dans download_video
-                status.download_folder = batch_folder
-                
-                await download_video(
-                    video.url,
-                    video.format,
-                    video.quality,
-                    video.fileFormat,
-                    download_id
-                )
-                
-                if status.error:
-                    batch_status.failed_files.append({
-                        'index': index,
-                        'title': status.title,
-                        'error': status.error
-                    })
-                else:
-                    batch_status.completed_files.append({
-                        'index': index,
-                        'title': status.title,
-                        'filename': status.filename,
-                        'filepath': os.path.join(batch_folder, status.filename)
-                    })
-                
-                # Mettre à jour la progression globale
-                batch_status.progress = (index / batch_status.total_files) * 100
-                
-            except Exception as e:
-                batch_status.failed_files.append({
-                    'index': index,
-                    'title': f"Vidéo {index}",
-                    'error': str(e)
-                })
+        # Traiter les vidéos en parallèle, au plus BATCH_CONCURRENCY à la fois
+        # (les limites par site s'appliquent en plus dans download_video)
+        batch_slots = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+        
+        async def run_item(index: int, video: DownloadRequest):
+            async with batch_slots:
+                pending_batch_items.take(batch_id)
+                await process_batch_item(batch_status, batch_folder, index, video)
+        
+        await asyncio.gather(*(run_item(index, video) for index, video in enumerate(videos, 1)))
         
         # Si aucun fichier n'a été téléchargé avec succès
         if not batch_status.completed_files:
@@ -507,35 +1843,12 @@ async def process_batch_downloads(batch_id: str, videos: list[DownloadRequest]):
             batch_status.error = error_msg
             return
         
-        # Créer le ZIP avec les fichiers réussis
-        zip_filename = f"batch_{batch_id}.zip"
-        zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
-        
-        try:
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for completed in batch_status.completed_files:
-                    file_path = completed['filepath']
-                    if os.path.exists(file_path):
-                        try:
-                            # Ajouter le fichier au ZIP avec son nom comme chemin relatif
-                            zipf.write(file_path, completed['filename'])
-                        except Exception as e:
-                            print(f"Erreur lors de l'ajout du fichier {file_path} au ZIP: {e}")
-                            continue
-            
-            # Vérifier que le ZIP n'est pas vide
-            if os.path.getsize(zip_path) == 0:
-                raise Exception("Le fichier ZIP créé est vide")
-                
-            # Ne pas supprimer les fichiers pour l'instant
-            # Le nettoyage sera fait plus tard
-                
-        except Exception as e:
-            print(f"Erreur lors de la création du ZIP: {e}")
-            batch_status.error = f"Erreur lors de la création du ZIP: {str(e)}"
+        # L'archive a été assemblée au fil des téléchargements et sera envoyée en flux
+        if not any(os.path.exists(entry.path) for entry in batch_status.archive.entries):
+            batch_status.error = "Aucun fichier téléchargé n'a été trouvé"
             return
         
-        batch_status.filename = zip_filename
+        batch_status.filename = f"batch_{batch_id}.zip"
         batch_status.is_ready = True
         
         # Si certains téléchargements ont échoué
@@ -548,73 +1861,74 @@ async def process_batch_downloads(batch_id: str, videos: list[DownloadRequest]):
     except Exception as e:
         batch_status.error = str(e)
         raise
+    finally:
+        pending_batch_items.drop(batch_id)
+        batch_status = batch_statuses.local(batch_id)
+        if batch_status is not None:
+            outcome = "completed" if batch_status.is_ready else "error"
+            log_trace("batch", batch_id, outcome, batch_status.trace.to_dict())
 
 @app.post("/start-batch-download")
-async def start_batch_download(request: BatchDownloadRequest, background_tasks: BackgroundTasks):
+async def start_batch_download(request: BatchDownloadRequest):
     batch_id = str(uuid.uuid4())
     
     try:
-        # Initialiser le statut du lot
-        batch_statuses[batch_id] = BatchStatus()
-        
-        # Démarrer le traitement en arrière-plan
-        background_tasks.add_task(process_batch_downloads, batch_id, request.videos)
+        async with admit(len(request.videos)):
+            # Initialiser le statut du lot
+            batch_statuses[batch_id] = BatchStatus(batch_id)
+            pending_batch_items.add(batch_id, len(request.videos))
+            
+            # Démarrer le traitement en arrière-plan
+            spawn(process_batch_downloads(batch_id, request.videos))
+        await persist_job_states()
         
         return {"batch_id": batch_id}
         
+    except HTTPException:
+        raise
     except Exception as e:
+        pending_batch_items.drop(batch_id)
         if batch_id in batch_statuses:
             del batch_statuses[batch_id]
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/check-batch-status/{batch_id}")
-async def check_batch_status(batch_id: str):
-    if batch_id not in batch_statuses:
+async def check_batch_status(batch_id: str, trace: bool = False):
+    status = await batch_statuses.fetch(batch_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Lot non trouvé")
     
-    status = batch_statuses[batch_id]
-    response = {
-        "progress": status.progress,
-        "current_index": status.current_index,
-        "total_files": status.total_files,
-        "current_video": status.current_video,
-        "is_ready": status.is_ready,
-        "completed_files": len(status.completed_files),
-        "failed_files": len(status.failed_files)
-    }
-    
-    if status.error:
-        response["error"] = status.error
-    if status.is_ready:
-        response["filename"] = status.filename
-    
+    response = batch_status_payload(status)
+    if trace:
+        response["trace"] = status.trace.to_dict()
     return response
 
-@app.get("/download-batch/{batch_id}")
-async def download_batch(batch_id: str):
-    if batch_id not in batch_statuses:
+@app.api_route("/download-batch/{batch_id}", methods=["GET", "HEAD"])
+async def download_batch(batch_id: str, request: Request, partial: bool = False):
+    status = await batch_statuses.fetch(batch_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Lot non trouvé")
     
-    status = batch_statuses[batch_id]
-    if not status.is_ready:
+    entries = status.archive.snapshot()
+    if status.is_ready:
+        filename = status.filename
+    elif partial and entries:
+        # Archive partielle des vidéos déjà terminées
+        filename = f"batch_{batch_id}_partiel.zip"
+    else:
         raise HTTPException(status_code=400, detail="Le fichier ZIP n'est pas encore prêt")
     
-    file_path = os.path.join(DOWNLOAD_DIR, status.filename)
-    if not os.path.exists(file_path):
+    if not all(os.path.exists(entry.path) for entry in entries):
         raise HTTPException(status_code=404, detail="Fichier ZIP non trouvé")
     
-    return FileResponse(
-        file_path,
-        media_type='application/zip',
-        filename=status.filename
-    )
+    return archive_response(request, entries, filename)
 
 @app.post("/cleanup-batch/{batch_id}")
 async def cleanup_batch(batch_id: str):
-    if batch_id not in batch_statuses:
+    status = await batch_statuses.fetch(batch_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Lot non trouvé")
     
-    status = batch_statuses[batch_id]
     file_path = os.path.join(DOWNLOAD_DIR, status.filename)
     
     try:
@@ -650,6 +1964,7 @@ async def create_session(url: str, format: str = "audio", quality: str = "highes
             status="pending"
         )
         download_sessions[session_id] = session
+        await persist_job_states()
         
         return {
             "session_id": session_id,
@@ -661,41 +1976,50 @@ async def create_session(url: str, format: str = "audio", quality: str = "highes
 
 @app.get("/session/{session_id}")
 async def get_session(session_id: str):
-    if session_id not in download_sessions:
+    session = await download_sessions.fetch(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session non trouvée")
     
-    session = download_sessions[session_id]
     return session
 
 @app.post("/start-session/{session_id}")
-async def start_session(session_id: str, background_tasks: BackgroundTasks):
-    if session_id not in download_sessions:
+async def start_session(session_id: str):
+    session = await download_sessions.fetch(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session non trouvée")
     
-    session = download_sessions[session_id]
     if session.status == "downloading":
         return {"message": "La session est déjà en cours de téléchargement"}
     
-    # Mettre à jour le statut
+    # Statut changé avant d'attendre l'admission : un second appel simultané
+    # voit la session en cours et ne met pas ses vidéos en file une seconde fois
+    previous_status = session.status
     session.status = "downloading"
-    
-    # Créer le dossier de la session
-    session_folder = os.path.join(DOWNLOAD_DIR, f"session_{session_id}")
-    os.makedirs(session_folder, exist_ok=True)
-    
-    # Démarrer le téléchargement de chaque vidéo
-    for video in session.videos:
-        for item in video.playlistItems:
-            download_id = str(uuid.uuid4())
-            background_tasks.add_task(
-                download_video,
-                item['url'],
-                item['format'],
-                item['quality'],
-                item['fileFormat'],
-                download_id,
-                session_id
-            )
+    try:
+        async with admit(sum(len(video.playlistItems) for video in session.videos)):
+            # Mettre chaque vidéo dans la file du planificateur ; les états de la
+            # session sont écrits ensemble, en une transaction hors de la boucle
+            jobs = []
+            for video in session.videos:
+                for item in video.playlistItems:
+                    download_id = str(uuid.uuid4())
+                    job = enqueue_download(
+                        item['url'],
+                        item['format'],
+                        item['quality'],
+                        item['fileFormat'],
+                        download_id,
+                        session_id
+                    )
+                    if job is not None:
+                        jobs.append(job)
+            if jobs:
+                await submit_to_workers(jobs)
+    except HTTPException:
+        # Demande refusée : la session pourra être relancée
+        session.status = previous_status
+        raise
+    await persist_job_states()
     
     return {
         "session_id": session_id,
@@ -703,132 +2027,72 @@ async def start_session(session_id: str, background_tasks: BackgroundTasks):
     }
 
 @app.get("/session-status/{session_id}")
-async def get_session_status(session_id: str):
-    if session_id not in download_sessions:
+async def get_session_status(session_id: str, trace: bool = False):
+    session = await download_sessions.fetch(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session non trouvée")
     
-    session = download_sessions[session_id]
-    session_folder = os.path.join(DOWNLOAD_DIR, f"session_{session_id}")
-    
-    # Vérifier si tous les téléchargements sont terminés
-    all_downloads = [status for status in download_statuses.values() if status.session_id == session_id]
-    total_downloads = len(all_downloads)
-    completed_downloads = len([s for s in all_downloads if s.is_ready])
-    failed_downloads = len([s for s in all_downloads if s.error])
-    
-    if total_downloads > 0:
-        total_progress = sum(s.progress for s in all_downloads) / total_downloads
-    else:
-        total_progress = 0
-    
-    # Si tous les téléchargements sont terminés, créer le ZIP
-    if completed_downloads + failed_downloads == total_downloads and total_downloads > 0:
-        try:
-            zip_filename = f"session_{session_id}.zip"
-            zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
-            
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for root, dirs, files in os.walk(session_folder):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, session_folder)
-                        zipf.write(file_path, arcname)
-            
-            session.status = "completed"
-            return {
-                "status": "completed",
-                "progress": 100,
-                "completed": completed_downloads,
-                "failed": failed_downloads,
-                "total": total_downloads,
-                "filename": zip_filename
-            }
-        except Exception as e:
-            session.status = "error"
-            return {
-                "status": "error",
-                "error": str(e),
-                "progress": total_progress,
-                "completed": completed_downloads,
-                "failed": failed_downloads,
-                "total": total_downloads
-            }
-    
-    # Sinon, renvoyer la progression
-    return {
-        "status": "downloading",
-        "progress": total_progress,
-        "completed": completed_downloads,
-        "failed": failed_downloads,
-        "total": total_downloads,
-        "current_downloads": [
-            {
-                "title": status.title,
-                "progress": status.progress,
-                "error": status.error
-            }
-            for status in all_downloads
-            if not status.is_ready and not status.error
-        ]
-    }
+    response = session_status_payload(session)
+    if trace:
+        # Durées cumulées des étapes des téléchargements terminés de la session
+        response["trace"] = {"totals": session_stages(session_id)}
+    return response
 
-@app.get("/session/{session_id}/download")
-async def download_session(session_id: str):
-    download_folder = os.path.join(DOWNLOAD_DIR, "videos")
-    if not os.path.exists(download_folder):
-        raise HTTPException(status_code=404, detail="Download folder not found")
+@app.api_route("/session/{session_id}/download", methods=["GET", "HEAD"])
+async def download_session(session_id: str, request: Request):
+    if await download_sessions.fetch(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
     
-    # Créer le ZIP avec tous les fichiers
-    zip_filename = f"videos.zip"
-    zip_path = os.path.join(DOWNLOAD_DIR, zip_filename)
+    # Fichiers de la session seulement, archive envoyée en flux sans fichier temporaire
+    entries = session_archive(session_id, session_summary(session_id, 0)["completed"])
+    if not entries:
+        raise HTTPException(status_code=404, detail="Aucun fichier téléchargé pour cette session")
+    if not all(os.path.exists(entry.path) for entry in entries):
+        session_archives.pop(session_id, None)
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    try:
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for root, dirs, files in os.walk(download_folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, download_folder)
-                    zipf.write(file_path, arcname)
-        
-        return FileResponse(
-            zip_path,
-            media_type='application/zip',
-            filename=zip_filename,
-            background=BackgroundTask(lambda: os.remove(zip_path) if os.path.exists(zip_path) else None)
-        )
-    except Exception as e:
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
-        raise HTTPException(status_code=500, detail=str(e))
+    return archive_response(request, entries, f"session_{session_id}.zip")
 
-@app.get("/session/{session_id}/download-single")
-async def download_single_file(session_id: str):
-    download_folder = os.path.join(DOWNLOAD_DIR, "videos")
-    if not os.path.exists(download_folder):
-        raise HTTPException(status_code=404, detail="Download folder not found")
+@app.api_route("/session/{session_id}/download-single", methods=["GET", "HEAD"])
+async def download_single_file(session_id: str, request: Request):
+    if await download_sessions.fetch(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
     
-    # Trouver le fichier le plus récent dans le dossier
-    files = [f for f in os.listdir(download_folder) if os.path.isfile(os.path.join(download_folder, f))]
+    # Dernier fichier terminé de la session, d'après les chemins enregistrés
+    files = session_files(session_id)
     if not files:
-        raise HTTPException(status_code=404, detail="No files found")
-    
-    # Prendre le fichier le plus récent
-    latest_file = max(files, key=lambda f: os.path.getctime(os.path.join(download_folder, f)))
-    file_path = os.path.join(download_folder, latest_file)
+        raise HTTPException(status_code=404, detail="Aucun fichier téléchargé pour cette session")
+    file_path = max(files.values(), key=lambda item: item["completed_at"])["path"]
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(
-        file_path,
-        media_type='application/octet-stream',
-        filename=latest_file
-    )
+    headers = {'Content-Disposition': content_disposition(os.path.basename(file_path))}
+    return send_files([file_path], lambda release: file_response(request, file_path, headers=headers, on_close=release))
+
+def remove_job_folders(download_ids: list) -> int:
+    # Dossiers supprimés par le gestionnaire d'espace disque, qui refuse ceux
+    # d'un travail en cours ou d'un fichier en cours d'envoi
+    removed = 0
+    for download_id in download_ids:
+        try:
+            uuid.UUID(download_id)  # identifiant seul, jamais un chemin
+        except ValueError:
+            continue
+        if disk_janitor.remove(job_folder(download_id)):
+            removed += 1
+    return removed
 
 @app.post("/clean")
-async def clean_downloads():
+async def clean_downloads(download_id: Optional[str] = None, session_id: Optional[str] = None):
+    # Fichiers du seul client qui les a récupérés : un téléchargement, ou ceux
+    # d'une session. Le reste du volume est géré par le gestionnaire d'espace disque
+    if not download_id and not session_id:
+        raise HTTPException(status_code=400, detail="Aucun téléchargement à nettoyer")
+    download_ids = [download_id] if download_id else []
+    if session_id:
+        download_ids += list(session_files(session_id))
     try:
-        videos_folder = os.path.join(DOWNLOAD_DIR, "videos")
-        if os.path.exists(videos_folder):
-            shutil.rmtree(videos_folder)
-            os.makedirs(videos_folder)  # Recréer le dossier vide
-        return {"status": "success", "message": "Download folder cleaned successfully"}
+        removed = await asyncio.to_thread(remove_job_folders, download_ids)
+        return {"status": "success", "message": "Download folder cleaned successfully", "removed": removed}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error cleaning downloads: {str(e)}")
@@ -0,0 +1,97 @@
+import re
+from typing import Optional
+
+# Compatibilité des codecs avec les conteneurs de sortie : les formats dont les
+# codecs conviennent déjà au conteneur demandé sont choisis en priorité, pour
+# que le passage au conteneur final soit une simple copie des flux.
+
+# Noms de codecs annoncés par les sites (préfixes) -> nom normalisé
+CODEC_ALIASES = {
+    'avc1': 'h264', 'avc3': 'h264', 'h264': 'h264',
+    'hvc1': 'hevc', 'hev1': 'hevc', 'hevc': 'hevc', 'h265': 'hevc',
+    'av01': 'av1', 'av1': 'av1',
+    'vp09': 'vp9', 'vp9': 'vp9',
+    'vp08': 'vp8', 'vp8': 'vp8',
+    'mp4v': 'mpeg4', 'mpeg4': 'mpeg4',
+    'mp4a': 'aac', 'aac': 'aac',
+    'mp3': 'mp3',
+    'opus': 'opus',
+    'vorbis': 'vorbis',
+    'ac-3': 'ac3', 'ac3': 'ac3',
+    'ec-3': 'eac3', 'eac3': 'eac3',
+    'flac': 'flac',
+    'alac': 'alac',
+}
+
+# Conteneur -> (codecs vidéo acceptés, codecs audio acceptés) ; None : tous
+CONTAINER_CODECS = {
+    'mp4': ({'h264', 'hevc', 'av1', 'vp9', 'mpeg4'}, {'aac', 'mp3', 'opus', 'ac3', 'eac3', 'flac', 'alac'}),
+    'mov': ({'h264', 'hevc', 'av1', 'vp9', 'mpeg4'}, {'aac', 'mp3', 'opus', 'ac3', 'eac3', 'flac', 'alac'}),
+    'webm': ({'vp8', 'vp9', 'av1'}, {'opus', 'vorbis'}),
+    'mkv': (None, None),
+    'avi': ({'h264', 'mpeg4'}, {'mp3', 'aac', 'ac3'}),
+    'flv': ({'h264'}, {'aac', 'mp3'}),
+}
+
+# Encodeurs utilisés lorsqu'un flux doit vraiment être réencodé
+VIDEO_ENCODERS = {'webm': 'libvpx-vp9'}
+AUDIO_ENCODERS = {'webm': 'libopus', 'avi': 'libmp3lame'}
+
+def normalize_codec(codec: Optional[str]) -> Optional[str]:
+    # "avc1.64001F" -> "h264" ; None si le flux est absent ou le codec inconnu
+    if not codec or codec == 'none':
+        return None
+    name = codec.lower().split('.')[0]
+    return CODEC_ALIASES.get(name, name)
+
+def _codec_filter(field: str, codecs: Optional[set]) -> str:
+    # Filtre de sélection yt-dlp : préfixes annoncés correspondant aux codecs acceptés
+    if codecs is None:
+        return ""
+    prefixes = sorted(re.escape(alias) for alias, codec in CODEC_ALIASES.items() if codec in codecs)
+    return f"[{field}~='^({'|'.join(prefixes)})']"
+
+def format_selection(container: str, quality_filter: str) -> str:
+    video_codecs, audio_codecs = CONTAINER_CODECS.get(container, (None, None))
+    vfilter = _codec_filter('vcodec', video_codecs)
+    afilter = _codec_filter('acodec', audio_codecs)
+    selection = f"bestvideo{vfilter}{quality_filter}+bestaudio{afilter}/best{vfilter}{afilter}{quality_filter}"
+    if vfilter or afilter:
+        # Aucun format compatible : n'importe lequel, il sera converti
+        selection += f"/bestvideo{quality_filter}+bestaudio/best{quality_filter}"
+    return selection + "/best"
+
+def merge_format(container: str) -> Optional[str]:
+    # Conteneur de fusion pour yt-dlp (copie des flux) : seul mkv accepte tous
+    # les codecs, les autres fusions suivent le choix de yt-dlp
+    return 'mkv' if container == 'mkv' else None
+
+def conversion_args(info: dict, container: str) -> Optional[list]:
+    # Options ffmpeg pour passer le fichier téléchargé au conteneur demandé :
+    # None s'il y est déjà, copie de chaque flux compatible, réencodage des autres
+    if info.get('ext') == container:
+        return None
+    video_codecs, audio_codecs = CONTAINER_CODECS.get(container, (set(), set()))
+    args = []
+    vcodec = info.get('vcodec')
+    if vcodec != 'none':
+        codec = normalize_codec(vcodec)
+        copy = video_codecs is None or codec in video_codecs
+        args += ['-c:v', 'copy' if copy else VIDEO_ENCODERS.get(container, 'libx264')]
+    acodec = info.get('acodec')
+    if acodec != 'none':
+        codec = normalize_codec(acodec)
+        copy = audio_codecs is None or codec in audio_codecs
+        args += ['-c:a', 'copy' if copy else AUDIO_ENCODERS.get(container, 'aac')]
+    return args
+
+# Format audio demandé -> codec que FFmpegExtractAudio recopie sans réencodage
+AUDIO_FORMAT_CODECS = {'mp3': 'mp3', 'm4a': 'aac', 'aac': 'aac', 'opus': 'opus', 'ogg': 'vorbis', 'vorbis': 'vorbis', 'flac': 'flac'}
+
+def audio_format_selection(file_format: str) -> str:
+    # Meilleur flux audio déjà dans le codec demandé (extraction par copie),
+    # sinon le meilleur flux audio, qui sera réencodé
+    codec = AUDIO_FORMAT_CODECS.get(file_format)
+    if codec is None:
+        return "bestaudio/best"
+    return f"bestaudio{_codec_filter('acodec', {codec})}/bestaudio/best"
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Paramètres d'URL sans effet sur le contenu (partage, suivi)
+TRACKING_PARAMS = {'si', 'feature', 'pp', 'fbclid', 'gclid'}
+
+YOUTUBE_HOSTS = {'youtube.com', 'm.youtube.com', 'music.youtube.com'}
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith('utm_')
+    ]
+    params = dict(query)
+
+    # Les différentes formes d'URL d'une même vidéo YouTube partagent la clé de l'extracteur
+    if 'list' not in params:
+        if host in YOUTUBE_HOSTS and parts.path == '/watch' and params.get('v'):
+            return f"youtube:{params['v']}"
+        if host in YOUTUBE_HOSTS and parts.path.startswith('/shorts/'):
+            return f"youtube:{parts.path.split('/')[2]}"
+        if host == 'youtu.be' and parts.path.strip('/'):
+            return f"youtube:{parts.path.strip('/')}"
+
+    netloc = host + (f":{parts.port}" if parts.port else '')
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or '/', urlencode(sorted(query)), ''))
+
+# Cache des résultats d'extract_info : LRU en mémoire avec durée de vie, et
+# second niveau optionnel sur disque qui survit aux redémarrages.
+# Les dictionnaires renvoyés sont partagés entre les appelants : ne pas les modifier.
+class MetadataCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 1800, disk_dir: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # clé -> (expiration, info)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(mode: str, url: str) -> str:
+        return f"{mode}|{normalize_url(url)}"
+
+    def get(self, mode: str, url: str) -> Optional[dict]:
+        key = self.make_key(mode, url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, info = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return info
+                del self._entries[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+        return entry[1]
+
+    def put(self, mode: str, url: str, info: dict):
+        expires = time.time() + self.ttl
+        keys = {self.make_key(mode, url)}
+        # Alias : URL canonique de la page et identifiant de l'extracteur
+        if info.get('webpage_url'):
+            keys.add(self.make_key(mode, info['webpage_url']))
+        if info.get('extractor_key') and info.get('id'):
+            keys.add(f"{mode}|{info['extractor_key'].lower()}:{info['id']}")
+
+        with self._lock:
+            for key in keys:
+                self._store(key, (expires, info))
+        for key in keys:
+            self._write_disk(key, expires, info)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[key]
+        if not self.disk_dir:
+            return
+        for filename in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if json.load(f)['expires'] <= now:
+                        os.remove(path)
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0,
+            }
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('key') != key or data.get('expires', 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data['expires'], data['info']
+
+    def _write_disk(self, key: str, expires: float, info: dict):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'expires': expires, 'info': info}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Erreur lors de l'écriture du cache de métadonnées : {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
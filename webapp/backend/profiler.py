@@ -0,0 +1,45 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+# Profileur par échantillonnage d'un seul thread (celui qui exécute un travail
+# choisi) : la pile du thread est relevée à intervalle régulier, sans tracer
+# chaque appel. Le résultat est au format « piles repliées » (une ligne
+# "f1;f2;f3 N" par pile), lu par flamegraph.pl, speedscope ou py-spy.
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="firedown-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from yt_dlp.downloader import PROTOCOL_MAP, fragment
+from yt_dlp.downloader.fragment import HttpQuietDownloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.utils import DownloadError, parse_http_range
+from yt_dlp.utils.networking import HTTPHeaderDict
+
+# Téléchargement d'un fichier progressif par plusieurs requêtes HTTP Range en
+# parallèle, écrites directement à leur place dans un seul fichier préalloué.
+# Certains sites limitent le débit de chaque connexion : le nombre de
+# connexions augmente tant que le débit total progresse d'autant, et cesse
+# d'augmenter dès que la ligne (ou le site) est saturée.
+# Options yt-dlp lues (absentes : téléchargement classique de HttpFD) :
+#   segment_connections : connexions simultanées au plus pour un fichier
+#   segment_size        : taille maximale d'un segment (octets)
+
+MIN_SEGMENT_SIZE = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+
+# Ajustement du nombre de connexions : fenêtre de mesure (s) et gain de débit
+# total qui justifie une connexion de plus
+ADAPT_INTERVAL = 1.0
+ADAPT_GAIN = 1.15
+INITIAL_CONNECTIONS = 2
+
+class SegmentFailed(Exception):
+    pass
+
+class RateLimiter:
+    # Débit total de toutes les connexions, relu à chaque bloc : une limite
+    # changée en cours de téléchargement (params['ratelimit']) s'applique aussitôt
+    def __init__(self, params: dict):
+        self.params = params
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int):
+        rate = self.params.get('ratelimit')
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Pas de crédit accumulé pendant une pause de plus d'une seconde
+            self._next = max(self._next, now - 1.0) + nbytes / rate
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+class SegmentPlan:
+    # Plages restant à télécharger, découpées à la demande : les premiers
+    # segments sont longs, les derniers raccourcissent pour que toutes les
+    # connexions finissent ensemble
+    def __init__(self, size: int, max_segment: int, connections: int):
+        self.size = size
+        self.max_segment = max_segment
+        self.target = connections  # connexions voulues, ajusté en cours de route
+        self.running = 0
+        self.downloaded = 0
+        self.error: Optional[BaseException] = None
+        self._cursor = 0
+        self._retry = []  # (début, fin, tentatives) des segments interrompus
+        self._lock = threading.Condition()
+
+    def take(self) -> Optional[tuple]:
+        with self._lock:
+            if self.error is not None or self.running > self.target:
+                return None
+            if self._retry:
+                return self._retry.pop(0)
+            remaining = self.size - self._cursor
+            if remaining <= 0:
+                return None
+            length = max(MIN_SEGMENT_SIZE, min(self.max_segment, remaining // (self.target * 2)))
+            start = self._cursor
+            self._cursor = min(self.size, start + length)
+            return start, self._cursor - 1, 0
+
+    def has_work(self) -> bool:
+        with self._lock:
+            return self.error is None and (bool(self._retry) or self._cursor < self.size)
+
+    def advance(self, nbytes: int):
+        with self._lock:
+            self.downloaded += nbytes
+            if self.downloaded >= self.size:
+                self._lock.notify_all()
+
+    def requeue(self, start: int, end: int, attempts: int):
+        with self._lock:
+            self._retry.append((start, end, attempts))
+
+    def fail(self, error: BaseException):
+        with self._lock:
+            if self.error is None:
+                self.error = error
+            self._lock.notify_all()
+
+    def worker_started(self) -> bool:
+        with self._lock:
+            if self.running >= self.target:
+                return False
+            self.running += 1
+            return True
+
+    def worker_stopped(self):
+        with self._lock:
+            self.running -= 1
+            self._lock.notify_all()
+
+    def wait(self, timeout: float):
+        with self._lock:
+            if self.error is None and self.downloaded < self.size:
+                self._lock.wait(timeout)
+
+    def join(self):
+        # Toutes les connexions arrêtées : plus aucune n'écrit dans le fichier
+        with self._lock:
+            while self.running:
+                self._lock.wait()
+
+class PacedDownloader:
+    # Limite de débit relue dans les options du YoutubeDL, et non dans la copie
+    # que FragmentFD donne à son téléchargeur : une limite changée en cours de
+    # route s'applique aussi aux fragments DASH/HLS. Elle porte sur le débit
+    # récent de tous les threads qui partagent ce téléchargeur (fragments
+    # téléchargés en parallèle), et non sur la moyenne de chaque fichier
+    def __init__(self, ydl, params):
+        super().__init__(ydl, params)
+        self._pacer = RateLimiter(ydl.params)
+        self._paced = threading.local()  # octets déjà comptés du fichier en cours, par thread
+
+    def slow_down(self, start_time, now, byte_counter):
+        paced = getattr(self._paced, 'bytes', None)
+        if paced is None or byte_counter < paced:
+            paced = 0  # nouveau fichier (ou fragment) dans ce thread
+        self._paced.bytes = byte_counter
+        self._pacer.consume(byte_counter - paced)
+
+class PacedFragmentDownloader(PacedDownloader, HttpQuietDownloader):
+    pass
+
+class SegmentedHttpFD(PacedDownloader, HttpFD):
+    FD_NAME = 'segmented'
+
+    def real_download(self, filename, info_dict):
+        connections = self.params.get('segment_connections') or 1
+        max_segment = self.params.get('segment_size') or 8 * MIN_SEGMENT_SIZE
+        known_size = info_dict.get('filesize') or info_dict.get('filesize_approx')
+        if (connections < 2 or filename == '-' or self.params.get('test')
+                or self.params.get('http_chunk_size') or info_dict.get('request_data')
+                or (info_dict.get('http_headers') or {}).get('Range')
+                or (known_size and known_size < 2 * MIN_SEGMENT_SIZE)):
+            return super().real_download(filename, info_dict)
+
+        headers = HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))
+        extensions = {}
+        impersonate_target = self._get_impersonate_target(info_dict)
+        if impersonate_target is not None:
+            extensions['impersonate'] = impersonate_target
+
+        def open_range(start: int, end: int):
+            request = Request(info_dict['url'], headers={**headers, 'Range': f'bytes={start}-{end}'}, extensions=extensions)
+            response = self.ydl.urlopen(request)
+            range_start, range_end, _ = parse_http_range(response.headers.get('Content-Range'))
+            if response.status != 206 or range_start != start or range_end != end:
+                response.close()
+                raise SegmentFailed(f"Plage {start}-{end} refusée par le serveur")
+            return response
+
+        # Taille totale et prise en charge des plages, par une requête d'un octet
+        try:
+            probe = self.ydl.urlopen(Request(info_dict['url'], headers={**headers, 'Range': 'bytes=0-0'}, extensions=extensions))
+            _, _, size = parse_http_range(probe.headers.get('Content-Range'))
+            accepts_ranges = probe.status == 206
+            probe.close()
+        except Exception:
+            # Erreurs traitées (et réessayées) par le téléchargement classique
+            accepts_ranges, size = False, None
+        if not accepts_ranges or not size or size < 2 * MIN_SEGMENT_SIZE:
+            return super().real_download(filename, info_dict)
+
+        tmpfilename = self.temp_name(filename)
+        plan = SegmentPlan(size, max_segment, min(INITIAL_CONNECTIONS, connections))
+        limiter = self._pacer
+        retries = self.params.get('retries') or 0
+        started = time.time()
+
+        fd = os.open(tmpfilename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # Place réservée d'un coup : pas de fragmentation ni de disque plein en cours de route
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+
+            def fetch(start: int, end: int, attempts: int):
+                position = start
+                try:
+                    response = open_range(start, end)
+                    try:
+                        while position <= end and plan.error is None:
+                            block = response.read(min(BLOCK_SIZE, end - position + 1))
+                            if not block:
+                                raise SegmentFailed(f"Plage {start}-{end} interrompue")
+                            os.pwrite(fd, block, position)
+                            position += len(block)
+                            plan.advance(len(block))
+                            limiter.consume(len(block))
+                    finally:
+                        response.close()
+                except Exception as e:
+                    if attempts >= retries:
+                        plan.fail(e)
+                    elif position <= end:
+                        # Seule la partie manquante est redemandée
+                        self.report_retry(e, attempts + 1, retries)
+                        plan.requeue(position, end, attempts + 1)
+
+            def worker():
+                try:
+                    while (segment := plan.take()) is not None:
+                        fetch(*segment)
+                finally:
+                    plan.worker_stopped()
+
+            window_start, window_bytes = started, 0
+            best_rate, growing = 0.0, True
+            while plan.downloaded < size and plan.error is None:
+                while plan.has_work() and plan.worker_started():
+                    threading.Thread(target=worker, name="firedown-segment", daemon=True).start()
+                plan.wait(0.25)
+
+                now = time.time()
+                elapsed = now - started
+                speed = self.calc_speed(started, now, plan.downloaded)
+                self._hook_progress({
+                    'status': 'downloading',
+                    'downloaded_bytes': plan.downloaded,
+                    'total_bytes': size,
+                    'tmpfilename': tmpfilename,
+                    'filename': filename,
+                    'eta': self.calc_eta(started, now, size, plan.downloaded),
+                    'speed': speed,
+                    'elapsed': elapsed,
+                    'connections': plan.running,
+                    'ctx_id': info_dict.get('ctx_id'),
+                }, info_dict)
+
+                # Une connexion de plus tant qu'elle rapporte : si le débit total
+                # ne progresse plus, la limite n'est plus celle de chaque connexion
+                if growing and now - window_start >= ADAPT_INTERVAL:
+                    rate = (plan.downloaded - window_bytes) / (now - window_start)
+                    if rate >= best_rate * ADAPT_GAIN and plan.target < connections:
+                        best_rate = rate
+                        plan.target += 1
+                    elif rate < best_rate * ADAPT_GAIN:
+                        growing = False
+                        if rate < best_rate and plan.target > 1:
+                            plan.target -= 1  # la dernière connexion ajoutée a coûté plus qu'elle n'a rapporté
+                    window_start, window_bytes = now, plan.downloaded
+
+        finally:
+            if plan.error is None and plan.downloaded < size:
+                # Sortie anticipée (hook de progression, interruption) : les
+                # connexions s'arrêtent au bloc suivant
+                plan.fail(DownloadError("Téléchargement segmenté interrompu"))
+            # Le descripteur n'est fermé qu'une fois toutes les connexions
+            # arrêtées : son numéro, réattribué ensuite par le noyau, ne doit
+            # plus recevoir aucun pwrite
+            plan.join()
+            os.close(fd)
+            if plan.error is not None or plan.downloaded < size:
+                # Un fichier préalloué partiel ne doit pas passer pour une reprise possible
+                try:
+                    os.remove(tmpfilename)
+                except OSError:
+                    pass
+
+        if plan.error is not None:
+            raise DownloadError(f"Téléchargement segmenté en échec : {plan.error}")
+
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': filename,
+            'status': 'finished',
+            'elapsed': time.time() - started,
+            'connections': plan.target,
+            'ctx_id': info_dict.get('ctx_id'),
+        }, info_dict)
+        return True
+
+def install():
+    # Les fichiers http(s) passent par SegmentedHttpFD, qui se comporte comme
+    # HttpFD tant que segment_connections n'est pas fixé dans les options ; les
+    # fragments DASH/HLS natifs par PacedFragmentDownloader
+    PROTOCOL_MAP['http'] = SegmentedHttpFD
+    PROTOCOL_MAP['https'] = SegmentedHttpFD
+    fragment.HttpQuietDownloader = PacedFragmentDownloader
@@ -0,0 +1,46 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Modules du backend importés comme le fait main.py, depuis leur dossier
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    # main.py travaille dans ./downloads : importé depuis un dossier temporaire,
+    # qui reste le dossier courant le temps des tests
+    root = tmp_path_factory.mktemp("app")
+    previous = os.getcwd()
+    os.chdir(root)
+    environ = dict(os.environ)
+    os.environ.update({
+        "FIREDOWN_TRACE_LOG": "off",
+        "FIREDOWN_MIN_FREE_DISK": "0",
+        "FIREDOWN_EXECUTION_MODE": "inline",
+        "FIREDOWN_JOB_STORE": "memory",
+    })
+    try:
+        yield importlib.import_module("main")
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(previous)
+
+@pytest.fixture
+def app(main_module, monkeypatch):
+    # main.py avec un planificateur neuf et des tables vidées après chaque test
+    main = main_module
+    monkeypatch.setattr(main, "download_scheduler", main.DownloadScheduler(main.MAX_CONCURRENT_DOWNLOADS))
+    # Sémaphores liés à la boucle d'événements de chaque test
+    monkeypatch.setattr(main, "host_semaphores", {})
+    yield main
+    for table in (main.download_statuses, main.batch_statuses, main.download_sessions, main.session_progress):
+        for job_id in list(table):
+            del table[job_id]
+    for download_id in list(main.waiting_line._by_id):
+        main.waiting_line.leave(download_id)
+    for batch_id in list(main.pending_batch_items._counts):
+        main.pending_batch_items.drop(batch_id)
+    main.session_archives.clear()
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from admission import AdmissionController, AdmissionRejected, PendingItems, ThroughputMeter, WaitingLine
+
+def controller(depth: list, max_depth: int = 10, space: bool = True, meter: ThroughputMeter = None) -> AdmissionController:
+    # depth : profondeur de file courante, modifiable par le test
+    return AdmissionController(max_depth, 1, lambda: depth[0], lambda needed: space, meter or ThroughputMeter())
+
+def test_admits_until_the_queue_is_full():
+    depth = [8]
+    admission = controller(depth)
+    reservation = admission.admit(1)
+    assert reservation.cost == 1 and admission.reserved == 1
+    admission.admit(1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.admit(1)
+    assert rejected.value.retry_after == admission.default_retry  # débit encore inconnu
+    assert admission.rejected == 1
+
+def test_reserved_places_count_until_released():
+    depth = [9]
+    admission = controller(depth)
+    reservation = admission.admit(1)
+    # Travaux pas encore en file : la place reste prise
+    with pytest.raises(AdmissionRejected):
+        admission.admit(1)
+    reservation.release()
+    assert admission.reserved == 0
+    admission.admit(1)
+
+def test_large_request_is_admitted_and_charged_the_free_places():
+    # Playlist plus grande que la file entière : admise, sans 413
+    depth = [4]
+    admission = controller(depth)
+    reservation = admission.admit(500)
+    assert reservation.cost == 6
+    depth[0] += 500
+    reservation.release()
+    # Les demandes suivantes attendent que la file se vide
+    with pytest.raises(AdmissionRejected):
+        admission.admit(1)
+    depth[0] = 9
+    admission.admit(1)
+    assert admission.admitted == 501
+
+def test_concurrent_requests_cannot_share_the_last_place():
+    depth = [9]
+    admission = controller(depth)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        try:
+            results.append(admission.admit(1))
+        except AdmissionRejected:
+            results.append(None)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(result is not None for result in results) == 1
+
+def test_retry_after_follows_throughput(monkeypatch):
+    meter = ThroughputMeter()
+    clock = [1000.0]
+    monkeypatch.setattr("admission.time.monotonic", lambda: clock[0])
+    for _ in range(11):
+        meter.record()
+        clock[0] += 2  # un travail terminé toutes les deux secondes
+    admission = controller([15], meter=meter)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.admit(1)
+    # 6 travaux au-delà de la limite, à 0,5 travail par seconde
+    assert rejected.value.retry_after == 12
+
+def test_disk_full_is_rejected():
+    with pytest.raises(AdmissionRejected, match="disque"):
+        controller([0], space=False).admit(1)
+
+def test_unlimited_queue():
+    admission = controller([10_000], max_depth=0)
+    assert admission.admit(5).cost == 5
+
+def test_waiting_line_positions():
+    line = WaitingLine()
+    for job_id in "abcd":
+        line.join(job_id)
+    line.leave("b")
+    assert [line.position(job_id) for job_id in "abcd"] == [0, None, 1, 2]
+    assert len(line) == 3
+
+def test_pending_items_total():
+    pending = PendingItems()
+    pending.add("lot1", 3)
+    pending.add("lot2", 2)
+    pending.take("lot1")
+    assert len(pending) == 4
+    pending.drop("lot1")
+    pending.take("lot3")  # lot inconnu : sans effet
+    assert len(pending) == 2
+
+def add_session(main, urls: list):
+    session_id = f"session-{len(main.download_sessions)}-{len(urls)}"
+    items = [{"url": url, "format": "audio", "quality": "highest", "fileFormat": "mp3"} for url in urls]
+    video = main.VideoInfo(title="Playlist", duration="", isPlaylist=True, playlistItems=items)
+    main.download_sessions[session_id] = main.DownloadSession(session_id=session_id, created_at=0, videos=[video])
+    return session_id
+
+@pytest.fixture
+def started(app, monkeypatch):
+    # Téléchargements lancés, sans accès réseau
+    urls = []
+
+    async def download_video(url, *args):
+        urls.append(url)
+
+    monkeypatch.setattr(app, "download_video", download_video)
+    return urls
+
+def test_concurrent_session_starts_enqueue_once(app, started):
+    session_id = add_session(app, [f"https://example.com/{index}" for index in range(3)])
+
+    async def run():
+        results = await asyncio.gather(app.start_session(session_id), app.start_session(session_id))
+        await asyncio.sleep(0)
+        return results
+
+    results = asyncio.run(run())
+    assert sorted(started) == [f"https://example.com/{index}" for index in range(3)]
+    assert sum("déjà en cours" in result["message"] for result in results) == 1
+    assert not any(path.startswith("session_") for path in os.listdir(app.DOWNLOAD_DIR))
+
+def test_large_session_is_admitted(app, started, monkeypatch):
+    monkeypatch.setattr(app.admission, "max_queue_depth", 2)
+    session_id = add_session(app, [f"https://example.com/{index}" for index in range(5)])
+
+    async def run():
+        await app.start_session(session_id)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert len(started) == 5
+    assert app.queue_depth() == 5
+
+def test_rejected_session_can_be_started_again(app, started, monkeypatch):
+    monkeypatch.setattr(app.admission, "max_queue_depth", 1)
+    app.waiting_line.join("occupé")
+    session_id = add_session(app, ["https://example.com/a"])
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(app.start_session(session_id))
+    assert rejected.value.status_code == 429 and "Retry-After" in rejected.value.headers
+    assert app.download_sessions[session_id].status == "pending"
+    app.waiting_line.leave("occupé")
+    asyncio.run(app.start_session(session_id))
+    assert app.download_sessions[session_id].status == "downloading"
+
+class CompletionLog:
+    # Fins de travaux partagées, comme dans le stockage des travaux
+    def __init__(self):
+        self.completions = []
+
+    def record_completions(self, completions: list):
+        self.completions += completions
+
+    def load_completions(self, since: float) -> list:
+        return sorted(at for at in self.completions if at >= since)
+
+def test_shared_throughput_counts_other_processes():
+    log = CompletionLog()
+    api = ThroughputMeter(shared=True)
+    worker = ThroughputMeter(shared=True)
+    for _ in range(3):
+        worker.record()
+    assert api.rate() is None
+    worker.sync(log)
+    api.sync(log)
+    # L'API voit les travaux terminés par le worker, sans les compter deux fois
+    assert len(api._completions) == 3 and api.rate() is not None
+    api.record()
+    api.sync(log)
+    worker.sync(log)
+    assert len(log.completions) == 4 and len(worker._completions) == 4
+
+def test_unpublished_completions_survive_a_failed_sync():
+    meter = ThroughputMeter(shared=True)
+    meter.record()
+
+    class Unavailable(CompletionLog):
+        def record_completions(self, completions: list):
+            raise ConnectionError("stockage indisponible")
+
+    with pytest.raises(ConnectionError):
+        meter.sync(Unavailable())
+    log = CompletionLog()
+    meter.sync(log)
+    assert len(log.completions) == 1
+
+def test_local_meter_keeps_nothing_to_publish():
+    meter = ThroughputMeter()
+    meter.record()
+    assert meter._unpublished == []
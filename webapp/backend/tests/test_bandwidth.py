@@ -0,0 +1,102 @@
+import contextlib
+import math
+
+import pytest
+
+from bandwidth import MIN_RATE, BandwidthGovernor, water_fill
+
+MB = 1_000_000
+
+def test_water_fill_equal_shares():
+    assert water_fill(900, {"a": (1, math.inf), "b": (1, math.inf), "c": (1, math.inf)}) == {"a": 300, "b": 300, "c": 300}
+
+def test_water_fill_redistributes_capped_shares():
+    # a ne prend que 100 : le reste est partagé entre b et c
+    assert water_fill(900, {"a": (1, 100), "b": (1, math.inf), "c": (1, math.inf)}) == {"a": 100, "b": 400, "c": 400}
+
+def test_water_fill_weights():
+    allocation = water_fill(900, {"session": (2, math.inf), "job": (1, math.inf)})
+    assert allocation == pytest.approx({"session": 600, "job": 300})
+
+def test_water_fill_without_budget_returns_caps():
+    assert water_fill(math.inf, {"a": (1, 500), "b": (1, math.inf)}) == {"a": 500, "b": math.inf}
+
+@contextlib.contextmanager
+def jobs(governor: BandwidthGovernor, specs: dict):
+    # Travaux actifs le temps du bloc : identifiant -> (session, petit travail)
+    params = {job_id: {} for job_id in specs}
+    with contextlib.ExitStack() as stack:
+        for job_id, (session_id, small) in specs.items():
+            stack.enter_context(governor.job(job_id, params[job_id], session_id, small))
+        yield params
+
+def rates(params: dict) -> dict:
+    return {job_id: job_params['ratelimit'] for job_id, job_params in params.items()}
+
+def test_budget_is_shared_equally_per_job():
+    governor = BandwidthGovernor(3 * MB, interval=1000)
+    with jobs(governor, {"a": (None, False), "b": (None, False), "c": (None, False)}) as params:
+        assert rates(params) == {"a": MB, "b": MB, "c": MB}
+    assert governor.stats()["jobs"] == 0
+
+def test_session_cap_limits_the_session_and_frees_the_rest():
+    governor = BandwidthGovernor(4 * MB, session_cap=MB, interval=1000)
+    specs = {"s1": ("session", False), "s2": ("session", False), "a": (None, False), "b": (None, False)}
+    with jobs(governor, specs) as params:
+        # Session plafonnée à 1 Mo/s pour ses deux travaux, 3 Mo/s pour les deux autres
+        assert rates(params) == {"s1": MB // 2, "s2": MB // 2, "a": 3 * MB // 2, "b": 3 * MB // 2}
+
+def test_session_cap_without_budget():
+    governor = BandwidthGovernor(0, session_cap=MB, interval=1000)
+    assert governor.enabled
+    specs = {"s1": ("one", False), "s2": ("one", False), "a": (None, False), "t": ("two", False)}
+    with jobs(governor, specs) as params:
+        # Hors session : pas de limite
+        assert rates(params) == {"s1": MB // 2, "s2": MB // 2, "a": None, "t": MB}
+        assert governor.stats()["allocated"] == 2 * MB
+
+def test_small_job_keeps_its_minimum_share():
+    governor = BandwidthGovernor(MB, min_share=400_000, interval=1000)
+    specs = {"audio": (None, True), "a": (None, False), "b": (None, False), "c": (None, False)}
+    with jobs(governor, specs) as params:
+        assert rates(params) == {"audio": 400_000, "a": 200_000, "b": 200_000, "c": 200_000}
+
+def test_small_job_floors_are_bounded_by_the_reserved_fraction():
+    governor = BandwidthGovernor(MB, min_share=MB, interval=1000)
+    specs = {"x": (None, True), "y": (None, True), **{job_id: (None, False) for job_id in "abcd"}}
+    with jobs(governor, specs) as params:
+        # Au plus la moitié du budget pour les petits travaux, le reste aux autres
+        limits = rates(params)
+        assert limits["x"] == limits["y"] == MB // 4
+        assert {limits[job_id] for job_id in "abcd"} == {MB // 8}
+
+def test_underused_share_is_redistributed():
+    governor = BandwidthGovernor(2 * MB, interval=1000)
+    with jobs(governor, {"slow": (None, False), "fast": (None, False)}) as params:
+        # Le site du premier ne dépasse pas 200 ko/s : sa demande est son débit avec une marge
+        with governor._lock:
+            governor._jobs["slow"].speed = 200_000
+            governor._rebalance()
+        assert rates(params) == {"slow": 250_000, "fast": 1_750_000}
+
+def test_limit_never_drops_below_minimum_rate():
+    governor = BandwidthGovernor(MIN_RATE, interval=1000)
+    with jobs(governor, {job_id: (None, False) for job_id in "abcd"}) as params:
+        assert set(rates(params).values()) == {MIN_RATE}
+
+def test_disabled_governor_leaves_params_untouched():
+    governor = BandwidthGovernor(0)
+    params = {"ratelimit": 123}
+    with governor.job("a", params):
+        governor.report("a", 1000)
+    assert params == {"ratelimit": 123}
+    assert governor.stats()["jobs"] == 0
+
+def test_progress_counts_every_file_of_a_job():
+    governor = BandwidthGovernor(MB, interval=1000)
+    with jobs(governor, {"a": (None, False)}):
+        job = governor._jobs["a"]
+        # Vidéo puis audio : le compteur de yt-dlp repart de zéro
+        for downloaded in (100, 500, 1000, 50, 300):
+            governor.report("a", downloaded)
+        assert job.received == 1300
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+@pytest.fixture
+def downloads(app, monkeypatch):
+    # Téléchargements simulés, sans accès réseau : chaque URL dure le délai
+    # donné par le test, échoue si elle contient "fail", et les travaux en
+    # cours sont comptés par site
+    class Downloads:
+        delays = {}
+        running = {}
+        peak = {}
+        total = 0
+        peak_total = 0
+        lock = threading.Lock()
+
+    def download(url, format_type, quality, file_format, download_id, status):
+        host = app.host_key(url)
+        status.state = "downloading"
+        with Downloads.lock:
+            Downloads.running[host] = Downloads.running.get(host, 0) + 1
+            Downloads.peak[host] = max(Downloads.peak.get(host, 0), Downloads.running[host])
+            Downloads.total += 1
+            Downloads.peak_total = max(Downloads.peak_total, Downloads.total)
+        try:
+            time.sleep(Downloads.delays.get(url, 0.02))
+            if "fail" in url:
+                raise RuntimeError(f"échec de {url}")
+        finally:
+            with Downloads.lock:
+                Downloads.running[host] -= 1
+                Downloads.total -= 1
+        os.makedirs(status.download_folder, exist_ok=True)
+        status.filename = f"{url.rsplit('/', 1)[-1]}.mp3"
+        status.filepath = os.path.join(status.download_folder, status.filename)
+        with open(status.filepath, "wb") as file:
+            file.write(url.encode())
+        status.title = url
+        status.progress = 100
+        status.is_ready = True
+        status.state = "completed"
+        return None
+
+    monkeypatch.setattr(app, "_download_video_sync", download)
+    # Emplacements de téléchargement en nombre suffisant quel que soit le nombre
+    # de processeurs : seules les limites du lot et par site s'appliquent
+    monkeypatch.setattr(app, "download_scheduler", app.DownloadScheduler(8))
+    return Downloads
+
+def run_batch(app, urls: list):
+    batch_id = f"lot-{len(urls)}-{time.monotonic_ns()}"
+    videos = [app.DownloadRequest(url=url, format="audio", quality="highest", fileFormat="mp3") for url in urls]
+
+    async def run():
+        app.download_scheduler.start()
+        try:
+            app.batch_statuses[batch_id] = app.BatchStatus(batch_id)
+            app.pending_batch_items.add(batch_id, len(videos))
+            await app.process_batch_downloads(batch_id, videos)
+        finally:
+            await app.download_scheduler.shutdown()
+
+    asyncio.run(run())
+    return app.batch_statuses[batch_id]
+
+def test_items_finishing_out_of_order_stay_sorted(app, downloads, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_CONCURRENCY", 4)
+    urls = [f"https://site{index}.example/{index}" for index in range(1, 5)]
+    # La première vidéo se termine en dernier
+    downloads.delays = {url: 0.2 - 0.05 * index for index, url in enumerate(urls)}
+    started = time.monotonic()
+    status = run_batch(app, urls)
+    # En parallèle : la durée du plus long, pas la somme
+    assert time.monotonic() - started < 0.45
+    assert [item["index"] for item in status.completed_files] == [1, 2, 3, 4]
+    assert [item["title"] for item in status.completed_files] == urls
+    assert status.progress == 100 and status.current_index == 4
+    assert status.is_ready and status.error is None
+    assert len(app.pending_batch_items) == 0
+
+def test_batch_concurrency_limit(app, downloads, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_CONCURRENCY", 2)
+    urls = [f"https://site{index}.example/{index}" for index in range(6)]
+    downloads.delays = dict.fromkeys(urls, 0.05)
+    status = run_batch(app, urls)
+    assert len(status.completed_files) == 6
+    assert downloads.peak_total == 2
+
+def test_per_host_limit(app, downloads, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_CONCURRENCY", 8)
+    monkeypatch.setattr(app, "PER_HOST_CONCURRENCY", 2)
+    busy = [f"https://www.youtube.com/watch/{index}" for index in range(3)] + [f"https://youtu.be/{index}" for index in range(3)]
+    other = [f"https://vimeo.com/{index}" for index in range(2)]
+    downloads.delays = dict.fromkeys(busy + other, 0.05)
+    status = run_batch(app, busy + other)
+    assert len(status.completed_files) == 8
+    # youtube.com et youtu.be partagent la même limite ; l'autre site n'attend pas
+    assert downloads.peak == {"youtube.com": 2, "vimeo.com": 2}
+
+def test_counters_with_failed_items(app, downloads, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_CONCURRENCY", 3)
+    urls = [f"https://site.example/{name}" for name in ("ok1", "fail2", "ok3", "fail4", "ok5")]
+    # Les échecs se terminent avant les succès
+    downloads.delays = {url: 0.01 if "fail" in url else 0.05 for url in urls}
+    status = run_batch(app, urls)
+    assert [item["index"] for item in status.completed_files] == [1, 3, 5]
+    assert [item["index"] for item in status.failed_files] == [2, 4]
+    assert status.progress == 100 and status.current_index == 5
+    # Lot servi avec les fichiers réussis, échecs signalés
+    assert status.is_ready and "Certains téléchargements ont échoué" in status.error
+    assert len(status.archive.entries) == 3
+
+def test_batch_with_only_failures(app, downloads):
+    status = run_batch(app, [f"https://site.example/fail{index}" for index in range(3)])
+    assert not status.is_ready and not status.completed_files
+    assert status.error.startswith("Tous les téléchargements ont échoué")
+    assert [item["index"] for item in status.failed_files] == [1, 2, 3]
@@ -0,0 +1,108 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from content_store import ContentPending, ContentStore
+
+@pytest.fixture
+def stores(tmp_path):
+    # Deux processus simulés : deux magasins sur les mêmes dossiers
+    def make():
+        return ContentStore(str(tmp_path / "store"), str(tmp_path / "claims"), poll_interval=0.01)
+    return make
+
+def produce(tmp_path, owner: str, content: bytes = b"video") -> str:
+    # Fichier final d'un travail, dans son propre dossier
+    folder = tmp_path / "jobs" / owner
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / "video.mp4"
+    path.write_bytes(content)
+    return str(path)
+
+def test_entries_are_counted_by_reference(tmp_path, stores):
+    store = stores()
+    assert store.acquire("key", "job1") is None
+    store_path = store.ingest("key", produce(tmp_path, "job1"), "job1")
+    # Le fichier reste visible dans le dossier du travail, sans copie
+    assert os.path.samefile(store_path, tmp_path / "jobs" / "job1" / "video.mp4")
+    assert store.acquire("key", "job2") == store_path
+    assert store.owners("key") == {"job1", "job2"}
+    store.release("job1")
+    assert store.owners("key") == {"job2"}
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+def test_discarded_entry_is_downloaded_again(tmp_path, stores):
+    store = stores()
+    store.acquire("key", "job1")
+    store.ingest("key", produce(tmp_path, "job1"), "job1")
+    store.discard("key")
+    os.remove(os.path.join(store.root, "key", "video.mp4"))
+    assert store.acquire("key", "job2") is None
+
+def test_concurrent_request_waits_for_the_download(tmp_path, stores):
+    store = stores()
+    store.acquire("key", "job1")
+    with pytest.raises(ContentPending):
+        store.acquire("key", "job2", wait=False)
+    woken = threading.Event()
+    assert store.add_waiter("key", woken.set)
+    store.ingest("key", produce(tmp_path, "job1"), "job1")
+    assert woken.is_set()
+    assert store.acquire("key", "job2") is not None
+
+def test_abandoned_download_is_taken_over(stores):
+    store = stores()
+    store.acquire("key", "job1")
+    store.abandon("key")
+    assert store.acquire("key", "job2") is None
+
+def test_other_process_waits_for_the_claim(tmp_path, stores):
+    first, second = stores(), stores()
+    assert first.acquire("key", "job1") is None
+    # Réservé par le premier processus : le second ne télécharge pas en parallèle
+    with pytest.raises(ContentPending):
+        second.acquire("key", "job2", wait=False)
+    woken = threading.Event()
+    assert second.add_waiter("key", woken.set)
+    store_path = first.ingest("key", produce(tmp_path, "job1", b"premier"), "job1")
+    assert woken.wait(2)
+    # Servi par le fichier du premier, jamais remplacé
+    assert second.acquire("key", "job2") == store_path
+    with open(store_path, "rb") as f:
+        assert f.read() == b"premier"
+    assert os.listdir(tmp_path / "claims") == []
+
+def test_other_process_takes_over_an_abandoned_claim(stores):
+    first, second = stores(), stores()
+    first.acquire("key", "job1")
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(second.acquire("key", "job2")))
+    waiter.start()
+    first.abandon("key")
+    waiter.join(2)
+    # Le second devient responsable du téléchargement
+    assert result == [None]
+    with pytest.raises(ContentPending):
+        first.acquire("key", "job3", wait=False)
+    second.abandon("key")
+
+def test_claim_of_a_dead_process_is_taken_over(tmp_path, stores):
+    process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    claims = tmp_path / "claims"
+    claims.mkdir()
+    (claims / "key").write_text(f"{socket.gethostname()}:{process.stdout.strip()}:ancien")
+    assert stores().acquire("key", "job1") is None
+
+def test_expired_claim_is_taken_over(tmp_path, stores):
+    claims = tmp_path / "claims"
+    claims.mkdir()
+    (claims / "key").write_text("autre-machine:1:jeton")
+    store = stores()
+    with pytest.raises(ContentPending):
+        store.acquire("key", "job1", wait=False)
+    os.utime(claims / "key", (0, 0))
+    assert ContentStore(store.root, str(claims)).acquire("key", "job2") is None
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from http_ranges import Validators, evaluate, file_response, file_validators, parse_range
+
+SIZE = 10
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-3", (0, 3)),
+    ("bytes=3-", (3, 9)),
+    ("bytes=3-100", (3, 9)),
+    ("bytes=-4", (6, 9)),
+    ("bytes=-100", (0, 9)),
+    ("bytes=9-9", (9, 9)),
+    # Suffixe de longueur nulle : aucun octet ne peut être servi
+    ("bytes=-0", "unsatisfiable"),
+    ("bytes=10-", "unsatisfiable"),
+    ("bytes=10-20", "unsatisfiable"),
+    # Plages invalides : en-tête ignoré, contenu complet
+    ("bytes=5-3", None),
+    ("bytes=a-3", None),
+    ("items=0-3", None),
+    # Plusieurs plages, qu'elles se chevauchent ou non : contenu complet
+    ("bytes=0-1,5-6", None),
+    ("bytes=0-5,3-8", None),
+    ("bytes=0-1, 2-3, 4-5", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+VALIDATORS = Validators('"abc"', 1_700_000_000)
+
+@pytest.mark.parametrize("headers,expected", [
+    ({}, ("full", None)),
+    ({"range": "bytes=2-4"}, ("partial", (2, 4))),
+    ({"range": "bytes=-0"}, ("unsatisfiable", None)),
+    ({"range": "bytes=0-1,4-5"}, ("full", None)),
+    # If-Range : la plage n'est servie que si le contenu n'a pas changé
+    ({"range": "bytes=2-4", "if-range": '"abc"'}, ("partial", (2, 4))),
+    ({"range": "bytes=2-4", "if-range": '"old"'}, ("full", None)),
+    ({"range": "bytes=2-4", "if-range": 'W/"abc"'}, ("full", None)),  # comparaison forte
+    ({"range": "bytes=2-4", "if-range": VALIDATORS.last_modified}, ("partial", (2, 4))),
+    ({"range": "bytes=2-4", "if-range": "Mon, 01 Jan 2001 00:00:00 GMT"}, ("full", None)),
+    # Requêtes conditionnelles, évaluées avant la plage
+    ({"if-none-match": '"abc"', "range": "bytes=2-4"}, ("not_modified", None)),
+    ({"if-none-match": 'W/"abc", "x"'}, ("not_modified", None)),
+    ({"if-none-match": '"x"', "if-modified-since": VALIDATORS.last_modified}, ("full", None)),
+    ({"if-modified-since": VALIDATORS.last_modified}, ("not_modified", None)),
+    ({"if-modified-since": "Mon, 01 Jan 2001 00:00:00 GMT"}, ("full", None)),
+])
+def test_evaluate(headers, expected):
+    assert evaluate(headers, VALIDATORS, SIZE) == expected
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "media.bin"
+    path.write_bytes(os.urandom(100_000))
+
+    async def media(request: Request):
+        return file_response(request, str(path), {"Content-Disposition": 'attachment; filename="media.bin"'})
+
+    app = Starlette(routes=[Route("/media", media, methods=["GET", "HEAD"])])
+    with TestClient(app) as test_client:
+        test_client.content = path.read_bytes()
+        test_client.etag = file_validators(os.stat(path)).etag
+        yield test_client
+
+def test_full_file(client):
+    response = client.get("/media")
+    assert response.status_code == 200
+    assert response.content == client.content
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == client.etag
+
+def test_single_range(client):
+    response = client.get("/media", headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 1000-1999/100000"
+    assert response.headers["content-length"] == "1000"
+    assert response.content == client.content[1000:2000]
+
+def test_suffix_range(client):
+    response = client.get("/media", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == client.content[-10:]
+
+def test_zero_suffix_is_unsatisfiable(client):
+    response = client.get("/media", headers={"Range": "bytes=-0"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */100000"
+
+def test_multiple_ranges_get_full_content(client):
+    response = client.get("/media", headers={"Range": "bytes=0-9,5-20"})
+    assert response.status_code == 200
+    assert response.content == client.content
+
+def test_if_range(client):
+    fresh = client.get("/media", headers={"Range": "bytes=0-9", "If-Range": client.etag})
+    assert fresh.status_code == 206 and fresh.content == client.content[:10]
+    stale = client.get("/media", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == client.content
+
+def test_not_modified(client):
+    response = client.get("/media", headers={"If-None-Match": client.etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert "content-disposition" not in response.headers
+
+def test_head(client):
+    response = client.head("/media", headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "100"
+    assert response.content == b""
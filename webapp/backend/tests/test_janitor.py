@@ -0,0 +1,161 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import janitor
+from janitor import DiskJanitor, parse_size
+
+def write(path, size: int, mtime: float = None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(b"x" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+@pytest.fixture
+def disk(tmp_path, monkeypatch):
+    # Volume de 1000 octets : seuils à 800 et 500 ; active et evicted sont
+    # modifiables par le test
+    class Disk:
+        active = set()
+        evicted = []
+        jobs = tmp_path / "jobs"
+        store = tmp_path / "store"
+
+        def janitor(self):
+            return DiskJanitor(
+                str(tmp_path), [str(self.jobs), str(self.store)], ("batch_",), 1000, 0.8, 0.5,
+                lambda path: os.path.basename(path) in self.active, self.evicted.append
+            )
+
+    Disk.active = set()
+    Disk.evicted = []
+    # Espace libre du volume réel hors de propos : seul le quota compte
+    monkeypatch.setattr(janitor.shutil, "disk_usage", lambda path: FreeSpace)
+    return Disk()
+
+class FreeSpace:
+    free = 10 ** 12
+
+def test_parse_size():
+    assert parse_size("500M") == 500 * 1024 ** 2
+    assert parse_size("1.5GB") == 1536 * 1024 ** 2
+    assert parse_size("123") == 123
+
+def test_scan_counts_hardlinks_once(disk):
+    write(disk.store / "key", 300)
+    os.makedirs(disk.jobs / "job")
+    os.link(disk.store / "key", disk.jobs / "job" / "video.mp4")
+    manager = disk.janitor()
+    manager.scan()
+    assert manager.used == 300 and manager.stats()["items"] == 2
+
+def test_evicts_least_recently_used_down_to_low_watermark(disk):
+    for index, name in enumerate("abcd"):
+        write(disk.jobs / name / "file", 250, mtime=1000 + index)
+    manager = disk.janitor()
+    manager.scan()
+    # 1000 octets au-delà du seuil haut : a puis b supprimés, jusqu'à 500
+    assert manager.used == 500
+    assert [os.path.basename(path) for path in disk.evicted] == ["a", "b"]
+    assert sorted(os.listdir(disk.jobs)) == ["c", "d"]
+
+def test_active_items_are_kept(disk):
+    for index, name in enumerate("abcd"):
+        write(disk.jobs / name / "file", 250, mtime=1000 + index)
+    disk.active.add("a")
+    manager = disk.janitor()
+    manager.scan()
+    assert sorted(os.listdir(disk.jobs)) == ["a", "d"]
+
+def test_pinned_items_are_kept_until_unpinned(disk):
+    write(disk.jobs / "a" / "file", 250, mtime=1000)
+    manager = disk.janitor()
+    manager.scan()
+    manager.pin(str(disk.jobs / "a" / "file"))
+    disk.active.add("b")
+    write(disk.jobs / "b" / "file", 700)
+    manager.track(str(disk.jobs / "b"))
+    assert os.path.exists(disk.jobs / "a")  # en cours d'envoi
+    manager.unpin(str(disk.jobs / "a" / "file"))
+    assert manager.ensure_space(0)
+    assert not os.path.exists(disk.jobs / "a")
+
+def test_store_entry_and_job_links_are_evicted_together(disk):
+    # Entrée du magasin liée dans le dossier d'un travail : l'éviction de la
+    # seule entrée ne libérerait rien
+    write(disk.store / "key", 600, mtime=1000)
+    os.makedirs(disk.jobs / "old")
+    os.link(disk.store / "key", disk.jobs / "old" / "video.mp4")
+    write(disk.jobs / "recent" / "file", 300, mtime=2000)
+    manager = disk.janitor()
+    manager.scan()
+    assert manager.used == 300
+    assert sorted(os.path.basename(path) for path in disk.evicted) == ["key", "old"]
+    assert os.listdir(disk.jobs) == ["recent"]
+
+def test_shared_file_is_kept_while_one_of_its_jobs_is_active(disk):
+    write(disk.store / "key", 600, mtime=1000)
+    os.makedirs(disk.jobs / "running")
+    os.link(disk.store / "key", disk.jobs / "running" / "video.mp4")
+    write(disk.jobs / "other" / "file", 300, mtime=2000)
+    disk.active.add("running")
+    manager = disk.janitor()
+    manager.scan()
+    # Rien d'autre à libérer que le travail plus récent
+    assert os.path.exists(disk.store / "key")
+    assert [os.path.basename(path) for path in disk.evicted] == ["other"]
+
+def test_expire_removes_old_idle_items(disk):
+    write(disk.jobs / "old" / "file", 10, mtime=1000)
+    write(disk.jobs / "busy" / "file", 10, mtime=1000)
+    disk.active.add("busy")
+    manager = disk.janitor()
+    manager.scan()
+    write(disk.jobs / "new" / "file", 10)
+    manager.track(str(disk.jobs / "new"))
+    assert manager.expire(3600) == 1
+    assert sorted(os.listdir(disk.jobs)) == ["busy", "new"]
+
+def test_remove_deletes_one_link_only(disk):
+    write(disk.store / "key", 100)
+    os.makedirs(disk.jobs / "job")
+    os.link(disk.store / "key", disk.jobs / "job" / "video.mp4")
+    manager = disk.janitor()
+    manager.scan()
+    assert manager.remove(str(disk.jobs / "job"))
+    assert not os.path.exists(disk.jobs / "job")
+    # L'entrée du magasin garde le fichier, toujours compté
+    assert os.path.exists(disk.store / "key") and manager.used == 100
+    disk.active.add("job2")
+    write(disk.jobs / "job2" / "file", 10)
+    manager.track(str(disk.jobs / "job2"))
+    assert not manager.remove(str(disk.jobs / "job2"))
+
+def test_only_running_jobs_are_active(app):
+    running = app.DownloadStatus(str(uuid.uuid4()))
+    app.download_statuses[running.download_id] = running
+    done = app.DownloadStatus(str(uuid.uuid4()))
+    app.download_statuses[done.download_id] = done
+    done.state = "completed"
+    assert app.disk_item_active(os.path.abspath(app.job_folder(running.download_id)))
+    # Terminé mais conservé : évictable
+    assert not app.disk_item_active(os.path.abspath(app.job_folder(done.download_id)))
+
+def test_clean_removes_only_the_callers_folder(app):
+    mine, other = str(uuid.uuid4()), str(uuid.uuid4())
+    for download_id in (mine, other):
+        write(os.path.join(app.job_folder(download_id), "video.mp4"), 10)
+        app.disk_janitor.track(app.job_folder(download_id))
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(app.clean_downloads())
+    assert rejected.value.status_code == 400
+    result = asyncio.run(app.clean_downloads(download_id=mine))
+    assert result["removed"] == 1
+    assert not os.path.exists(app.job_folder(mine)) and os.path.exists(app.job_folder(other))
+    # Identifiant qui n'en est pas un : ignoré
+    assert asyncio.run(app.clean_downloads(download_id=".."))["removed"] == 0
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import job_queue
+import job_store
+from job_queue import RedisJobQueue, SQLiteJobQueue
+from job_store import JobStateWriter, JobTable, MemoryJobStore, RedisJobStore, SQLiteJobStore
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    # Serveur Redis en mémoire, partagé par les clients d'un même test
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    connect = lambda url: fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(job_store, "connect_redis", connect)
+    monkeypatch.setattr(job_queue, "connect_redis", connect)
+
+@pytest.fixture(params=["sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "redis":
+        request.getfixturevalue("fake_redis")
+        return RedisJobStore("redis://", ttl=3600)
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "redis":
+        request.getfixturevalue("fake_redis")
+        return RedisJobQueue("redis://")
+    return SQLiteJobQueue(str(tmp_path / "queue.db"), poll_interval=0.01)
+
+class Job:
+    def __init__(self, job_id: str = None, session_id: str = None, progress: int = 0):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.progress = progress
+
+    def to_state(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Job":
+        return cls(**state)
+
+def test_store_round_trip(store):
+    store.save_many([
+        ("download", "a", "s1", {"progress": 10}),
+        ("download", "b", "s1", {"progress": 20}),
+        ("download", "c", None, {"progress": 30}),
+        ("batch", "a", None, {"progress": 40}),
+    ])
+    assert store.load("download", "a") == {"progress": 10}
+    assert store.load("batch", "a") == {"progress": 40}
+    assert store.load("download", "inconnu") is None
+    assert store.load_session_jobs("download", "s1") == {"a": {"progress": 10}, "b": {"progress": 20}}
+    store.save_many([("download", "a", "s1", {"progress": 99})])
+    assert store.load("download", "a") == {"progress": 99}
+    store.delete("download", "b")
+    assert store.load("download", "b") is None
+    assert store.load_session_jobs("download", "s1") == {"a": {"progress": 99}}
+
+def test_sqlite_purge(tmp_path, monkeypatch):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(job_store.time, "time", lambda: 1000.0)
+    store.save_many([("download", "old", None, {})])
+    monkeypatch.setattr(job_store.time, "time", lambda: 5000.0)
+    store.save_many([("download", "new", None, {})])
+    assert store.purge(3600) == 1
+    assert store.load("download", "old") is None and store.load("download", "new") == {}
+
+def test_local_jobs_are_written_in_batches(store):
+    writer = JobStateWriter(store, interval=1000)
+    table = JobTable("download", store, Job.from_state, writer)
+    table["a"] = Job("a", "s1")
+    table["a"].progress = 50
+    table.mark_dirty("a", table["a"])
+    # Rien d'écrit avant le passage du thread d'écriture
+    assert store.load("download", "a") is None
+    writer.flush()
+    assert store.load("download", "a")["progress"] == 50
+
+def test_remote_jobs_are_read_from_the_store(store):
+    other = JobTable("download", store, Job.from_state)  # autre processus
+    other["a"] = Job("a", "s1", 70)
+    table = JobTable("download", store, Job.from_state)
+    assert table.local("a") is None
+    assert table["a"].progress == 70 and table.get("a").progress == 70
+    assert "inconnu" not in table and table.get("inconnu") is None
+    assert [job.job_id for job in table.session_jobs("s1")] == ["a"]
+
+def test_detached_jobs_stay_readable(store):
+    table = JobTable("download", store, Job.from_state)
+    table["a"] = Job("a", "s1", 10)
+    table["a"].progress = 80
+    table.detach_many(["a"])
+    assert table.local("a") is None and len(table) == 0
+    assert table["a"].progress == 80
+
+def test_fetch_reads_remote_jobs_off_the_event_loop(store, monkeypatch):
+    JobTable("download", store, Job.from_state)["remote"] = Job("remote", None, 5)
+    table = JobTable("download", store, Job.from_state)
+    table["local"] = Job("local")
+    threads = []
+    load = store.load
+    monkeypatch.setattr(store, "load", lambda kind, job_id: threads.append(threading.current_thread()) or load(kind, job_id))
+
+    async def fetch():
+        return await table.fetch("local"), await table.fetch("remote"), await table.fetch("inconnu")
+
+    local, remote, missing = asyncio.run(fetch())
+    assert local is table.local("local") and remote.progress == 5 and missing is None
+    # Une lecture par travail absent de ce processus, jamais depuis la boucle
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+def test_memory_store_fetch_never_reads_the_store():
+    table = JobTable("download", MemoryJobStore(), Job.from_state)
+    assert asyncio.run(table.fetch("inconnu")) is None
+
+def test_queue_is_fifo(queue):
+    for download_id in "abc":
+        queue.put({"download_id": download_id})
+    assert queue.depth() == 3
+    assert [queue.position(download_id) for download_id in "abc"] == [0, 1, 2]
+    token, job = queue.get("w1", timeout=1)
+    assert job["download_id"] == "a"
+    assert queue.position("a") is None and queue.position("b") == 0
+    queue.done(token)
+    assert queue.depth() == 2
+
+def test_claimed_jobs_are_released_to_the_head_of_the_queue(queue):
+    queue.put({"download_id": "a"})
+    queue.put({"download_id": "b"})
+    queue.get("w1", timeout=1)
+    queue.release_claims("w1")
+    # Le travail d'un worker arrêté repasse avant les autres
+    _, job = queue.get("w2", timeout=1)
+    assert job["download_id"] == "a"
+
+def test_empty_queue_times_out(queue):
+    started = time.monotonic()
+    assert queue.get("w1", timeout=0.05 if isinstance(queue, SQLiteJobQueue) else 1) is None
+    assert time.monotonic() - started < 2
+
+def test_completions_are_shared(store):
+    now = time.time()
+    store.record_completions([now - 30, now - 20, now - 10])
+    store.record_completions([now - 20])  # même instant, autre processus
+    assert store.load_completions(now - 25) == [now - 20, now - 20, now - 10]
+    assert store.load_completions(now) == []
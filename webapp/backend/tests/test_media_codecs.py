@@ -0,0 +1,61 @@
+import pytest
+import yt_dlp
+
+from media_codecs import audio_format_selection, conversion_args, format_selection, merge_format, normalize_codec
+
+VP9 = {"format_id": "vp9", "ext": "webm", "vcodec": "vp09.00.40.08", "acodec": "none", "height": 1080, "tbr": 3000}
+H264 = {"format_id": "h264", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none", "height": 720, "tbr": 1500}
+OPUS = {"format_id": "opus", "ext": "webm", "vcodec": "none", "acodec": "opus", "tbr": 160}
+AAC = {"format_id": "aac", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2", "tbr": 128}
+
+def select(spec: str, formats: list) -> list:
+    # Formats retenus par le sélecteur de yt-dlp, sans accès réseau
+    formats = [dict(f, url=f"https://example.com/{f['format_id']}", protocol="https") for f in formats]
+    selector = yt_dlp.YoutubeDL({"quiet": True}).build_format_selector(spec)
+    return [f["format_id"] for f in selector({"formats": formats, "has_merged_format": True, "incomplete_formats": False})]
+
+def test_normalize_codec():
+    assert normalize_codec("avc1.64001F") == "h264"
+    assert normalize_codec("mp4a.40.2") == "aac"
+    assert normalize_codec("none") is None and normalize_codec(None) is None
+    assert normalize_codec("prores") == "prores"
+
+@pytest.mark.parametrize("container, expected", [
+    ("avi", ["h264+aac"]),
+    ("webm", ["vp9+opus"]),
+])
+def test_selection_prefers_codecs_of_the_container(container, expected):
+    assert select(format_selection(container, ""), [VP9, H264, OPUS, AAC]) == expected
+
+def test_selection_falls_back_when_nothing_is_compatible():
+    # Aucun flux accepté par avi : les meilleurs flux, convertis ensuite
+    assert select(format_selection("avi", ""), [VP9, OPUS]) == ["vp9+opus"]
+
+def test_mkv_accepts_every_codec():
+    assert format_selection("mkv", "") == "bestvideo+bestaudio/best/best"
+    assert merge_format("mkv") == "mkv" and merge_format("avi") is None
+
+def test_same_container_needs_no_conversion():
+    assert conversion_args({"ext": "avi", "vcodec": "avc1", "acodec": "mp3"}, "avi") is None
+
+@pytest.mark.parametrize("info, container, expected", [
+    # Flux compatibles : simple copie
+    ({"ext": "mp4", "vcodec": "avc1.640028", "acodec": "mp4a.40.2"}, "avi", ["-c:v", "copy", "-c:a", "copy"]),
+    ({"ext": "webm", "vcodec": "vp9", "acodec": "opus"}, "mkv", ["-c:v", "copy", "-c:a", "copy"]),
+    # Seul le flux incompatible est réencodé
+    ({"ext": "webm", "vcodec": "vp9", "acodec": "mp4a.40.2"}, "avi", ["-c:v", "libx264", "-c:a", "copy"]),
+    ({"ext": "mp4", "vcodec": "avc1", "acodec": "opus"}, "avi", ["-c:v", "copy", "-c:a", "libmp3lame"]),
+    ({"ext": "mp4", "vcodec": "avc1", "acodec": "mp4a.40.2"}, "webm", ["-c:v", "libvpx-vp9", "-c:a", "libopus"]),
+    # Fichier sans vidéo
+    ({"ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2"}, "mkv", ["-c:a", "copy"]),
+])
+def test_conversion_copies_compatible_streams(info, container, expected):
+    assert conversion_args(info, container) == expected
+
+def test_audio_selection_prefers_the_requested_codec():
+    assert select(audio_format_selection("m4a"), [OPUS, AAC]) == ["aac"]
+    mp3 = {"format_id": "mp3", "ext": "mp3", "vcodec": "none", "acodec": "mp3", "tbr": 128}
+    assert select(audio_format_selection("mp3"), [OPUS, mp3, AAC]) == ["mp3"]
+    # Aucun flux dans le codec demandé : un flux audio quand même, réencodé
+    assert len(select(audio_format_selection("mp3"), [OPUS, AAC])) == 1
+    assert audio_format_selection("wav") == "bestaudio/best"
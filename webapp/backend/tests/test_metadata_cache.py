@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import metadata_cache
+from metadata_cache import MetadataCache, normalize_url
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(metadata_cache.time, "time", lambda: now[0])
+    return now
+
+def test_youtube_urls_share_one_key():
+    keys = {
+        normalize_url("https://www.youtube.com/watch?v=abc&si=partage&utm_source=x"),
+        normalize_url("https://youtu.be/abc"),
+        normalize_url("https://m.youtube.com/watch?v=abc"),
+        normalize_url("https://youtube.com/shorts/abc"),
+    }
+    assert keys == {"youtube:abc"}
+    # Une playlist garde son URL complète
+    assert normalize_url("https://www.youtube.com/watch?v=abc&list=PL1") != "youtube:abc"
+
+def test_other_urls_ignore_tracking_and_parameter_order():
+    assert normalize_url("https://Example.com/v?b=2&a=1&fbclid=x#t") == normalize_url("https://example.com/v?a=1&b=2")
+
+def test_hits_and_misses(clock):
+    cache = MetadataCache()
+    assert cache.get("video", "https://youtu.be/abc") is None
+    cache.put("video", "https://youtu.be/abc", {"title": "Vidéo"})
+    assert cache.get("video", "https://www.youtube.com/watch?v=abc") == {"title": "Vidéo"}
+    # Mode d'extraction différent : autre entrée
+    assert cache.get("playlist", "https://youtu.be/abc") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 2, pytest.approx(1 / 3))
+
+def test_aliases_from_the_extracted_info(clock):
+    cache = MetadataCache()
+    info = {"title": "Vidéo", "webpage_url": "https://vimeo.com/42", "extractor_key": "Vimeo", "id": "42"}
+    cache.put("video", "https://player.vimeo.com/video/42", info)
+    assert cache.get("video", "https://vimeo.com/42") is info
+    assert cache.stats()["entries"] == 3
+
+def test_entries_expire(clock):
+    cache = MetadataCache(ttl=60)
+    cache.put("video", "https://example.com/a", {"title": "a"})
+    clock[0] += 59
+    assert cache.get("video", "https://example.com/a") is not None
+    clock[0] += 2
+    assert cache.get("video", "https://example.com/a") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = MetadataCache(max_entries=2)
+    cache.put("video", "https://example.com/a", {"title": "a"})
+    cache.put("video", "https://example.com/b", {"title": "b"})
+    cache.get("video", "https://example.com/a")
+    cache.put("video", "https://example.com/c", {"title": "c"})
+    assert cache.get("video", "https://example.com/b") is None
+    assert cache.get("video", "https://example.com/a") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_disk_tier_survives_a_restart(tmp_path, clock):
+    MetadataCache(disk_dir=str(tmp_path)).put("video", "https://example.com/a", {"title": "a"})
+    cache = MetadataCache(disk_dir=str(tmp_path))
+    assert cache.get("video", "https://example.com/a") == {"title": "a"}
+    assert cache.get("video", "https://example.com/a") == {"title": "a"}
+    # Première lecture depuis le disque, la suivante depuis la mémoire
+    assert (cache.stats()["disk_hits"], cache.stats()["hits"]) == (1, 1)
+
+def test_expired_disk_entries_are_purged(tmp_path, clock):
+    cache = MetadataCache(ttl=60, disk_dir=str(tmp_path))
+    cache.put("video", "https://example.com/a", {"title": "a"})
+    clock[0] += 30
+    cache.put("video", "https://example.com/b", {"title": "b"})
+    clock[0] += 40
+    cache.purge_expired()
+    assert len(os.listdir(tmp_path)) == 1 and cache.stats()["entries"] == 1
+    assert MetadataCache(disk_dir=str(tmp_path)).get("video", "https://example.com/a") is None
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+def run_with(scheduler, coro):
+    async def run():
+        scheduler.start()
+        try:
+            return await coro
+        finally:
+            await scheduler.shutdown()
+    return asyncio.run(run())
+
+def test_concurrency_is_bounded(app):
+    scheduler = app.DownloadScheduler(2)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def job():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+
+    async def run():
+        await asyncio.gather(*(scheduler.run(job) for _ in range(6)))
+
+    run_with(scheduler, run())
+    assert max(peak) == 2
+
+def test_queued_jobs_start_in_order(app):
+    scheduler = app.DownloadScheduler(1)
+    started = []
+
+    async def run():
+        return await asyncio.gather(*(scheduler.run(lambda index=index: started.append(index) or index * 10) for index in range(5)))
+
+    assert run_with(scheduler, run()) == [0, 10, 20, 30, 40]
+    assert started == [0, 1, 2, 3, 4]
+
+def test_errors_reach_the_caller(app):
+    scheduler = app.DownloadScheduler(1)
+
+    def fail():
+        raise ValueError("extraction impossible")
+
+    async def run():
+        with pytest.raises(ValueError, match="extraction impossible"):
+            await scheduler.run(fail)
+        # Le worker continue avec les travaux suivants
+        return await scheduler.run(lambda: "suivant")
+
+    assert run_with(scheduler, run()) == "suivant"
+
+def test_event_loop_stays_responsive(app):
+    scheduler = app.DownloadScheduler(1)
+
+    async def run():
+        download = asyncio.ensure_future(scheduler.run(time.sleep, 0.3))
+        # Pendant le travail bloquant, la boucle répond toujours
+        started = time.monotonic()
+        ticks = 0
+        while not download.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        await download
+        return ticks, time.monotonic() - started
+
+    ticks, elapsed = run_with(scheduler, run())
+    assert ticks >= 10 and elapsed < 1
+
+def test_cancelled_job_is_skipped(app):
+    scheduler = app.DownloadScheduler(1)
+    calls = []
+    gate = threading.Event()
+
+    async def run():
+        first = scheduler.submit(gate.wait)
+        second = scheduler.submit(lambda: calls.append("annulé"))
+        third = scheduler.submit(lambda: calls.append("exécuté"))
+        second.cancel()
+        await asyncio.sleep(0.01)
+        gate.set()
+        await first
+        await third
+
+    run_with(scheduler, run())
+    assert calls == ["exécuté"]
@@ -0,0 +1,158 @@
+import http.server
+import os
+import threading
+import time
+
+import pytest
+import yt_dlp
+from yt_dlp.utils import DownloadError
+
+import segmented
+from segmented import MIN_SEGMENT_SIZE, SegmentPlan
+
+SIZE = 3 * MIN_SEGMENT_SIZE + 12345
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    # Une seule plage par requête ; options du serveur :
+    #   ranges    : False, l'en-tête Range est ignoré (réponse 200 complète)
+    #   truncate  : nombre de réponses partielles (début > 0) coupées à mi-corps
+    #   delay     : pause (s) avant le corps de chaque réponse partielle
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        data = server.data
+        header = self.headers.get("Range")
+        with server.lock:
+            server.requests.append(header)
+        if not header or not server.ranges:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        first, _, last = header.split("=", 1)[1].partition("-")
+        start, end = int(first), min(int(last) if last else len(data) - 1, len(data) - 1)
+        body = data[start:end + 1]
+        with server.lock:
+            truncated = start > 0 and server.truncate > 0
+            if truncated:
+                server.truncate -= 1
+        self.send_response(206)
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if start > 0 and server.delay:
+            time.sleep(server.delay)
+        if truncated:
+            # Connexion fermée avant la fin annoncée
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    segmented.install()
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.daemon_threads = True
+    httpd.data = os.urandom(SIZE)
+    httpd.ranges = True
+    httpd.truncate = 0
+    httpd.delay = 0
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/media.mp4"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def download(server, tmp_path, **params):
+    filename = str(tmp_path / "media.mp4")
+    options = {
+        "quiet": True,
+        "noprogress": True,
+        "segment_connections": 4,
+        "segment_size": MIN_SEGMENT_SIZE,
+        "retries": 3,
+        **params,
+    }
+    info = {"id": "media", "url": server.url, "protocol": "http", "ext": "mp4", "http_headers": {}}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        ydl.dl(filename, info)
+    return filename
+
+def read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_segmented_download_is_identical(server, tmp_path):
+    filename = download(server, tmp_path)
+    assert read(filename) == server.data
+    # Sonde d'un octet, puis une requête par segment
+    ranges = [header for header in server.requests if header != "bytes=0-0"]
+    assert len(ranges) >= 4 and all(header.startswith("bytes=") for header in ranges)
+    assert not os.path.exists(filename + ".part")
+
+def test_server_ignoring_ranges_falls_back_to_single_request(server, tmp_path):
+    server.ranges = False
+    filename = download(server, tmp_path)
+    assert read(filename) == server.data
+    # La sonde reçoit 200 : un seul téléchargement classique ensuite
+    assert len(server.requests) == 2
+    assert server.requests[0] == "bytes=0-0"
+
+def test_single_connection_uses_classic_download(server, tmp_path):
+    filename = download(server, tmp_path, segment_connections=1)
+    assert read(filename) == server.data
+    assert "bytes=0-0" not in server.requests
+
+def test_interrupted_segments_are_resumed(server, tmp_path):
+    server.truncate = 3
+    filename = download(server, tmp_path)
+    # Chaque octet écrit à sa place (pwrite) malgré les reprises en cours de segment
+    assert read(filename) == server.data
+    assert server.truncate == 0
+
+def test_exhausted_retries_fail_without_partial_file(server, tmp_path):
+    server.truncate = 10_000
+    with pytest.raises(DownloadError):
+        download(server, tmp_path, retries=1)
+    assert not os.path.exists(tmp_path / "media.mp4")
+    assert not os.path.exists(tmp_path / "media.mp4.part")
+
+def test_failure_in_progress_hook_stops_connections_before_closing(server, tmp_path):
+    # Les connexions attendent encore leurs données quand le hook échoue : le
+    # fichier n'est fermé qu'une fois toutes arrêtées
+    server.delay = 0.5
+
+    def hook(d):
+        if d['status'] == 'downloading':
+            raise RuntimeError("hook en échec")
+
+    with pytest.raises(RuntimeError):
+        download(server, tmp_path, progress_hooks=[hook])
+    assert not [thread for thread in threading.enumerate() if thread.name == "firedown-segment"]
+    assert not os.path.exists(tmp_path / "media.mp4.part")
+
+def test_segment_plan_shrinks_segments_towards_the_end():
+    plan = SegmentPlan(20 * MIN_SEGMENT_SIZE, 8 * MIN_SEGMENT_SIZE, 2)
+    lengths = []
+    while (segment := plan.take()) is not None:
+        start, end, attempts = segment
+        lengths.append(end - start + 1)
+        assert attempts == 0
+    assert sum(lengths) == 20 * MIN_SEGMENT_SIZE
+    assert lengths == sorted(lengths, reverse=True)
+    # Le dernier segment n'est que le reste
+    assert max(lengths) <= 8 * MIN_SEGMENT_SIZE and min(lengths[:-1]) >= MIN_SEGMENT_SIZE
+
+def test_segment_plan_requeues_before_new_ranges():
+    plan = SegmentPlan(4 * MIN_SEGMENT_SIZE, MIN_SEGMENT_SIZE, 2)
+    plan.take()
+    plan.requeue(100, 200, 1)
+    assert plan.take() == (100, 200, 1)
@@ -0,0 +1,64 @@
+import asyncio
+import uuid
+
+import pytest
+
+def add_jobs(app, session_id: str, count: int) -> list:
+    statuses = []
+    for index in range(count):
+        status = app.DownloadStatus(str(uuid.uuid4()))
+        app.download_statuses[status.download_id] = status
+        status.title = f"Vidéo {index}"
+        status.session_id = session_id
+        statuses.append(status)
+    return statuses
+
+def finish(status, path: str):
+    status.filepath = path
+    status.progress = 100
+    status.is_ready = True
+    status.state = "completed"
+
+@pytest.fixture
+def session(app):
+    session_id = str(uuid.uuid4())
+    app.download_sessions[session_id] = app.DownloadSession(session_id=session_id, created_at=0, videos=[])
+    return app.download_sessions[session_id]
+
+def test_counters_follow_state_changes(app, session):
+    statuses = add_jobs(app, session.session_id, 4)
+    statuses[0].progress = 50
+    finish(statuses[1], "/nulle/part.mp3")
+    statuses[2].error = "échec"
+    payload = app.session_status_payload(session)
+    assert (payload["total"], payload["completed"], payload["failed"]) == (4, 1, 1)
+    assert payload["progress"] == pytest.approx(150 / 4)
+    assert sorted(item["title"] for item in payload["current_downloads"]) == ["Vidéo 0", "Vidéo 3"]
+
+def test_active_downloads_are_bounded(app, session):
+    add_jobs(app, session.session_id, 50)
+    payload = app.session_status_payload(session)
+    assert payload["total"] == 50
+    assert len(payload["current_downloads"]) == app.SESSION_ACTIVE_LIMIT
+
+def test_polls_do_not_copy_the_session_files(app, session, monkeypatch, tmp_path):
+    statuses = add_jobs(app, session.session_id, 3)
+    for index, status in enumerate(statuses):
+        path = tmp_path / f"{index}.mp3"
+        path.write_bytes(b"x")
+        finish(status, str(path))
+    calls = []
+    session_files = app.session_files
+    monkeypatch.setattr(app, "session_files", lambda session_id: calls.append(session_id) or session_files(session_id))
+    monkeypatch.setattr(app, "compute_crcs", lambda entries, trace=None: None)
+
+    async def poll():
+        for _ in range(5):
+            payload = app.session_status_payload(session)
+        return payload
+
+    payload = asyncio.run(poll())
+    assert payload["status"] == "completed" and payload["completed"] == 3
+    # Archive préparée à la première interrogation seulement
+    assert calls == [session.session_id]
+    assert [entry.path for entry in app.session_archives[session.session_id][1]] == [str(tmp_path / f"{index}.mp3") for index in range(3)]
@@ -0,0 +1,118 @@
+import io
+import os
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+import zipstream
+from zipstream import ArchiveManifest, ZipEntry, ZipStream, unique_arcnames
+
+def make_files(tmp_path, contents: dict) -> list:
+    entries = []
+    for name, data in contents.items():
+        path = tmp_path / f"src_{len(entries)}"
+        path.write_bytes(data)
+        entries.append(ZipEntry(str(path), name))
+    return entries
+
+def build(entries: list) -> bytes:
+    return b''.join(ZipStream(entries))
+
+def fresh(entries: list) -> list:
+    # Mêmes fichiers, CRC inconnus
+    return [ZipEntry(entry.path, entry.arcname, entry.size, entry.mtime) for entry in entries]
+
+CONTENTS = {
+    "vidéo.mp4": os.urandom(300_000),
+    "audio.mp3": os.urandom(70_000),
+    "vide.txt": b"",
+}
+
+def test_round_trip_through_zipfile(tmp_path):
+    entries = make_files(tmp_path, CONTENTS)
+    stream = ZipStream(entries)
+    data = b''.join(stream)
+
+    # Taille annoncée avant l'envoi égale à celle produite
+    assert len(data) == stream.size
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(CONTENTS)
+        for name, content in CONTENTS.items():
+            info = archive.getinfo(name)
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert archive.read(name) == content
+
+def test_known_crc_is_used_and_computed_crc_is_stored(tmp_path):
+    entries = make_files(tmp_path, CONTENTS)
+    entries[0].crc = zlib.crc32(CONTENTS["vidéo.mp4"])
+    build(entries)
+    assert [entry.crc for entry in entries] == [zlib.crc32(content) for content in CONTENTS.values()]
+
+@pytest.mark.parametrize("start,end", [(0, 0), (0, 99), (10, 50_000), (29, 31), (300_000, 371_000), (-1, -1)])
+def test_ranges_match_full_archive(tmp_path, start, end):
+    entries = make_files(tmp_path, CONTENTS)
+    full = build(fresh(entries))
+    stream = ZipStream(entries)
+    if start < 0:
+        start, end = stream.size - 22, stream.size - 1  # fin du répertoire central
+    end = min(end, stream.size - 1)
+    assert b''.join(stream.iter_range(start, end)) == full[start:end + 1]
+
+def test_range_before_crc_is_known(tmp_path):
+    # Une plage qui ne couvre que la fin de l'archive oblige à calculer les CRC
+    entries = make_files(tmp_path, CONTENTS)
+    stream = ZipStream(entries)
+    tail = b''.join(stream.iter_range(stream.size - 100, stream.size - 1))
+    assert tail == build(fresh(entries))[-100:]
+
+def test_zip64_sizes_and_offsets(tmp_path, monkeypatch):
+    # Seuil ZIP64 abaissé : mêmes structures qu'au-delà de 4 Gio, sans écrire 4 Gio
+    monkeypatch.setattr(zipstream, "ZIP64_LIMIT", 50_000)
+    entries = make_files(tmp_path, CONTENTS)
+    stream = ZipStream(entries)
+    data = b''.join(stream)
+
+    assert len(data) == stream.size
+    # Enregistrement de fin ZIP64 et son localisateur présents
+    assert struct.pack('<I', 0x06064b50) in data
+    assert struct.pack('<I', 0x07064b50) in data
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        for name, content in CONTENTS.items():
+            assert archive.read(name) == content
+        # Positions relues depuis le champ supplémentaire ZIP64
+        offsets = [info.header_offset for info in archive.infolist()]
+        assert offsets == sorted(offsets) and offsets[-1] > 50_000
+
+def test_zip64_entry_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(zipstream, "ZIP64_COUNT_LIMIT", 3)
+    contents = {f"{index}.bin": os.urandom(100) for index in range(5)}
+    data = build(make_files(tmp_path, contents))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == list(contents)
+        assert archive.testzip() is None
+
+def test_unique_arcnames(tmp_path):
+    paths = []
+    for index, name in enumerate(["a.mp4", "a.mp4", "b.mp4", "a.mp4"]):
+        directory = tmp_path / str(index)
+        directory.mkdir()
+        path = directory / name
+        path.write_bytes(b"x")
+        paths.append(str(path))
+    assert [entry.arcname for entry in unique_arcnames(paths)] == ["a.mp4", "a (1).mp4", "b.mp4", "a (2).mp4"]
+
+def test_manifest_snapshot_is_a_copy(tmp_path):
+    manifest = ArchiveManifest()
+    first = tmp_path / "un.mp4"
+    first.write_bytes(b"1")
+    manifest.add(str(first))
+    snapshot = manifest.snapshot()
+    second = tmp_path / "deux.mp4"
+    second.write_bytes(b"2")
+    manifest.add(str(second), "un.mp4")
+    assert [entry.arcname for entry in snapshot] == ["un.mp4"]
+    assert [entry.arcname for entry in manifest.snapshot()] == ["un.mp4", "un (1).mp4"]
@@ -0,0 +1,188 @@
+import asyncio
+import contextlib
+import http.server
+import os
+import queue
+import signal
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Optional
+
+import main
+from main import (
+    MAX_CONCURRENT_DOWNLOADS,
+    ContentPending,
+    _download_video_sync,
+    content_store,
+    convert_download,
+    download_statuses,
+    flush_job_states,
+    job_queue,
+)
+
+# firedown-worker : exécute les téléchargements mis en file par l'API lancée avec
+# FIREDOWN_EXECUTION_MODE=queue. Les états sont partagés par le stockage des
+# travaux et les fichiers par le volume downloads.
+# Nom unique par processus : deux workers d'une même machine ne doivent pas
+# reprendre (release_claims) les travaux l'un de l'autre. Un nom fixe permet
+# à un worker relancé de reprendre les siens
+WORKER_NAME = os.getenv("FIREDOWN_WORKER_NAME") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Port où ce worker expose ses métriques Prometheus (0 : désactivé)
+METRICS_PORT = int(os.getenv("FIREDOWN_WORKER_METRICS_PORT", 0))
+
+stop_event = threading.Event()
+
+# Boucle d'événements des conversions ffmpeg : un téléchargement terminé libère
+# son emplacement pendant que sa conversion se poursuit
+conversion_loop = asyncio.new_event_loop()
+conversions = set()
+
+# Travaux repris une fois terminé le téléchargement identique qu'ils attendaient,
+# servis avant les nouveaux travaux de la file
+resumed = queue.Queue()
+
+async def start_lag_monitor() -> asyncio.Task:
+    return asyncio.create_task(main.loop_lag_monitor.run())
+
+async def stop_lag_monitor(task: asyncio.Task):
+    # Tâche annulée et attendue avant l'arrêt de la boucle, qui sinon
+    # s'arrêterait avec une tâche en attente
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+def fail_job(status, e: BaseException):
+    status.error = str(e)
+    status.state = "error"
+    print(f"Erreur lors du téléchargement: {str(e)}")
+
+def run_job(job: dict) -> Optional[Future]:
+    # Renvoie la conversion en cours, le travail n'est terminé qu'avec elle
+    download_id = job['download_id']
+    status = download_statuses.get(download_id)
+    if status is None:
+        return None  # nettoyé avant d'être pris
+    # Ce processus devient le propriétaire de l'état jusqu'à la fin du travail
+    download_statuses[download_id] = status
+    if status.session_id:
+        main.local_session_progress(status.session_id).set_active(status, True)
+    try:
+        conversion = _download_video_sync(job['url'], job['format'], job['quality'], job['fileFormat'], download_id, status)
+    except ContentPending:
+        raise  # le travail reste à ce worker, repris par run_claimed
+    except Exception as e:
+        fail_job(status, e)
+        conversion = None
+    if conversion is None:
+        download_statuses.detach(download_id)
+        return None
+    return asyncio.run_coroutine_threadsafe(convert_download(status, conversion), conversion_loop)
+
+def finish_conversion(future: Future, token, download_id: str):
+    status = download_statuses.local(download_id)
+    try:
+        future.result()
+    except BaseException as e:
+        if status is not None:
+            fail_job(status, e)
+    finally:
+        download_statuses.detach(download_id)
+        job_queue.done(token)
+        conversions.discard(future)
+
+def run_claimed(token, job: dict, slots: threading.Semaphore):
+    pending = None
+    try:
+        conversion = run_job(job)
+    except ContentPending as e:
+        pending = e
+    finally:
+        slots.release()
+    if pending is not None:
+        # Téléchargement identique en cours : attendu sans occuper d'emplacement,
+        # le travail repasse ensuite et sera servi par le magasin
+        if not content_store.add_waiter(pending.key, lambda: resumed.put((token, job))):
+            resumed.put((token, job))
+        return
+    if conversion is None:
+        job_queue.done(token)
+        return
+    conversions.add(conversion)
+    conversion.add_done_callback(lambda future: finish_conversion(future, token, job['download_id']))
+
+def expire_files():
+    # Fichiers produits par ce worker et inutilisés depuis une heure
+    while not stop_event.wait(3600):
+        try:
+            main.disk_janitor.expire(3600)
+        except Exception as e:
+            print(f"Erreur lors du nettoyage : {e}")
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = main.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", main.METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_metrics():
+    server = http.server.ThreadingHTTPServer(("", METRICS_PORT), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="firedown-metrics", daemon=True).start()
+
+def run():
+    if job_queue is None:
+        raise SystemExit("firedown-worker nécessite FIREDOWN_EXECUTION_MODE=queue")
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    job_queue.release_claims(WORKER_NAME)
+    main.disk_janitor.scan()
+    # Même écriture différée que l'API : progress_hook ne touche jamais la base
+    threading.Thread(target=main.job_writer.run, args=(stop_event,), name="firedown-flush", daemon=True).start()
+    threading.Thread(target=expire_files, name="firedown-janitor", daemon=True).start()
+    threading.Thread(target=conversion_loop.run_forever, name="firedown-ffmpeg", daemon=True).start()
+    # Retard de la boucle des conversions, seule boucle d'événements du worker
+    lag_monitor = asyncio.run_coroutine_threadsafe(start_lag_monitor(), conversion_loop).result()
+    if METRICS_PORT:
+        serve_metrics()
+    print(f"firedown-worker {WORKER_NAME} : {MAX_CONCURRENT_DOWNLOADS} téléchargements simultanés")
+
+    slots = threading.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS, thread_name_prefix="firedown-dl") as pool:
+        try:
+            while not stop_event.is_set():
+                # Un travail n'est pris que lorsqu'un emplacement est libre, les
+                # autres restent disponibles pour les autres workers
+                if not slots.acquire(timeout=1):
+                    continue
+                try:
+                    claimed = resumed.get_nowait()
+                except queue.Empty:
+                    claimed = job_queue.get(WORKER_NAME, timeout=1)
+                if claimed is None:
+                    slots.release()
+                    continue
+                token, job = claimed
+                pool.submit(run_claimed, token, job, slots)
+        except KeyboardInterrupt:
+            stop_event.set()
+    # Les conversions en cours vont à leur terme avant l'arrêt
+    wait(list(conversions))
+    asyncio.run_coroutine_threadsafe(stop_lag_monitor(lag_monitor), conversion_loop).result()
+    conversion_loop.call_soon_threadsafe(conversion_loop.stop)
+    flush_job_states()
+    main.throughput.sync(main.job_store)  # travaux terminés depuis le dernier passage
+    main.job_store.close()
+    job_queue.close()
+
+if __name__ == "__main__":
+    run()
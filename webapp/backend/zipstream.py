@@ -0,0 +1,237 @@
+import os
+import struct
+import time
+import zlib
+from typing import Iterator, Optional
+
+# Archive ZIP sans compression (les médias sont déjà compressés) produite à la
+# volée : aucun fichier temporaire, et le premier octet part immédiatement.
+# Chaque entrée utilise un descripteur de données (le CRC est calculé pendant
+# l'envoi) et les extensions ZIP64 dès que les tailles ou positions l'exigent.
+# La disposition ne dépend que des noms et tailles des fichiers, ce qui permet
+# de connaître la taille totale à l'avance et de servir n'importe quelle plage.
+
+# Seuils au-delà desquels une valeur passe dans les structures ZIP64, et
+# valeur inscrite à sa place dans les champs classiques
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+CHUNK_SIZE = 1024 * 1024
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+VERSION_ZIP64 = 45
+VERSION_DEFAULT = 20
+MADE_BY_UNIX = 3 << 8
+FILE_ATTRIBUTES = 0o100644 << 16
+
+class ZipEntry:
+    def __init__(self, path: str, arcname: str, size: Optional[int] = None, mtime: Optional[float] = None, crc: Optional[int] = None):
+        self.path = path
+        self.arcname = arcname
+        if size is None or mtime is None:
+            stat = os.stat(path)
+            size = stat.st_size if size is None else size
+            mtime = stat.st_mtime if mtime is None else mtime
+        self.size = size
+        self.mtime = mtime
+        self.crc = crc  # calculé au premier envoi si inconnu
+
+    def compute_crc(self) -> int:
+        if self.crc is None:
+            crc = 0
+            with open(self.path, 'rb') as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    crc = zlib.crc32(chunk, crc)
+            self.crc = crc
+        return self.crc
+
+def _dos_datetime(timestamp: float) -> tuple:
+    t = time.localtime(timestamp)
+    year = max(t.tm_year, 1980)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_time, dos_date
+
+class _Layout:
+    def __init__(self, entry: ZipEntry, offset: int):
+        self.entry = entry
+        self.offset = offset
+        self.name = entry.arcname.encode('utf-8')
+        self.zip64 = entry.size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+        self.header_size = 30 + len(self.name) + (20 if self.zip64 else 0)
+        self.descriptor_size = 24 if self.zip64 else 16
+        self.total_size = self.header_size + entry.size + self.descriptor_size
+
+    def local_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.entry.mtime)
+        extra = b''
+        size_field = self.entry.size
+        if self.zip64:
+            extra = struct.pack('<HHQQ', 0x0001, 16, self.entry.size, self.entry.size)
+            size_field = ZIP64_MARKER
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50,
+            VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8, 0, dos_time, dos_date,
+            0, size_field, size_field, len(self.name), len(extra)
+        ) + self.name + extra
+
+    def data_descriptor(self) -> bytes:
+        if self.zip64:
+            return struct.pack('<IIQQ', 0x08074b50, self.entry.crc, self.entry.size, self.entry.size)
+        return struct.pack('<IIII', 0x08074b50, self.entry.crc, self.entry.size, self.entry.size)
+
+    def central_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.entry.mtime)
+        extra_values = []
+        size_field = self.entry.size
+        offset_field = self.offset
+        if self.entry.size >= ZIP64_LIMIT:
+            extra_values += [self.entry.size, self.entry.size]
+            size_field = ZIP64_MARKER
+        if self.offset >= ZIP64_LIMIT:
+            extra_values.append(self.offset)
+            offset_field = ZIP64_MARKER
+        extra = b''
+        if extra_values:
+            extra = struct.pack(f'<HH{len(extra_values)}Q', 0x0001, 8 * len(extra_values), *extra_values)
+        version = VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50,
+            MADE_BY_UNIX | version, version, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, 0, dos_time, dos_date,
+            self.entry.crc, size_field, size_field, len(self.name), len(extra), 0, 0, 0, FILE_ATTRIBUTES, offset_field
+        ) + self.name + extra
+
+class ZipStream:
+    def __init__(self, entries: list):
+        self.entries = list(entries)
+        self._layouts = []
+        offset = 0
+        for entry in self.entries:
+            layout = _Layout(entry, offset)
+            self._layouts.append(layout)
+            offset += layout.total_size
+        self._central_offset = offset
+        self._central_size = sum(
+            46 + len(l.name) + 8 * ((2 if l.entry.size >= ZIP64_LIMIT else 0) + (1 if l.offset >= ZIP64_LIMIT else 0))
+            + (4 if l.entry.size >= ZIP64_LIMIT or l.offset >= ZIP64_LIMIT else 0)
+            for l in self._layouts
+        )
+        self._zip64_end = (
+            len(self.entries) >= ZIP64_COUNT_LIMIT
+            or self._central_offset >= ZIP64_LIMIT
+            or self._central_size >= ZIP64_LIMIT
+        )
+        self.size = self._central_offset + self._central_size + (56 + 20 if self._zip64_end else 0) + 22
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.iter_range(0, self.size - 1)
+
+    def iter_range(self, start: int, end: int) -> Iterator[bytes]:
+        # Envoie les octets [start, end] (bornes incluses) de l'archive
+        position = 0
+        for layout in self._layouts:
+            if position > end:
+                return
+            if position + layout.total_size <= start:
+                position += layout.total_size
+                continue
+            yield from _slice(layout.local_header(), position, start, end)
+            position += layout.header_size
+            yield from self._iter_file(layout.entry, position, start, end)
+            position += layout.entry.size
+            if position <= end and position + layout.descriptor_size > start:
+                layout.entry.compute_crc()
+                yield from _slice(layout.data_descriptor(), position, start, end)
+            position += layout.descriptor_size
+
+        if position > end:
+            return
+        for layout in self._layouts:
+            layout.entry.compute_crc()
+        yield from _slice(self._central_directory(), position, start, end)
+
+    def _iter_file(self, entry: ZipEntry, position: int, start: int, end: int) -> Iterator[bytes]:
+        first = max(start, position)
+        last = min(end, position + entry.size - 1)
+        if first > last:
+            return
+        # Le CRC n'est calculé au vol que si le fichier est envoyé en entier
+        whole_file = entry.crc is None and first == position and last == position + entry.size - 1
+        crc = 0
+        remaining = last - first + 1
+        with open(entry.path, 'rb') as f:
+            f.seek(first - position)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"Fichier tronqué pendant l'envoi : {entry.path}")
+                remaining -= len(chunk)
+                if whole_file:
+                    crc = zlib.crc32(chunk, crc)
+                yield chunk
+        if whole_file:
+            entry.crc = crc
+
+    def _central_directory(self) -> bytes:
+        parts = [layout.central_header() for layout in self._layouts]
+        count = len(self._layouts)
+        count_field = count if count < ZIP64_COUNT_LIMIT else ZIP64_COUNT_MARKER
+        if self._zip64_end:
+            zip64_end_offset = self._central_offset + self._central_size
+            parts.append(struct.pack(
+                '<IQHHIIQQQQ', 0x06064b50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, self._central_size, self._central_offset
+            ))
+            parts.append(struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1))
+        parts.append(struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0,
+            count_field, count_field,
+            self._central_size if self._central_size < ZIP64_LIMIT else ZIP64_MARKER,
+            self._central_offset if self._central_offset < ZIP64_LIMIT else ZIP64_MARKER, 0
+        ))
+        return b''.join(parts)
+
+def _slice(data: bytes, position: int, start: int, end: int) -> Iterator[bytes]:
+    first = max(start, position) - position
+    last = min(end, position + len(data) - 1) - position
+    if first <= last:
+        yield data[first:last + 1]
+
+# Liste des entrées d'une archive, complétée au fur et à mesure que les
+# fichiers sont prêts. Les noms sont rendus uniques (deux vidéos peuvent porter
+# le même titre) et une copie de la liste peut être servie à tout moment.
+class ArchiveManifest:
+    def __init__(self):
+        self.entries = []
+        self._names = set()
+
+    def add(self, path: str, arcname: Optional[str] = None) -> ZipEntry:
+        base, ext = os.path.splitext(arcname or os.path.basename(path))
+        name = base + ext
+        counter = 1
+        while name in self._names:
+            name = f"{base} ({counter}){ext}"
+            counter += 1
+        self._names.add(name)
+        entry = ZipEntry(path, name)
+        self.entries.append(entry)
+        return entry
+
+    @classmethod
+    def from_entries(cls, entries: list) -> "ArchiveManifest":
+        manifest = cls()
+        manifest.entries = list(entries)
+        manifest._names = {entry.arcname for entry in manifest.entries}
+        return manifest
+
+    def snapshot(self) -> list:
+        return list(self.entries)
+
+def unique_arcnames(paths: list) -> list:
+    manifest = ArchiveManifest()
+    for path in paths:
+        manifest.add(path)
+    return manifest.snapshot()
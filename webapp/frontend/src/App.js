@@ -6,6 +6,7 @@ import DownloadProgress from './components/DownloadProgress';
 import DownloadQueue from './components/DownloadQueue';
 import ErrorMessage from './components/ErrorMessage';
 import { cleanYoutubeUrl } from './components/constants';
+import { watchDownload, watchDownloads } from './components/statusEvents';
 
 // Création d'une instance axios avec l'URL de base
 const api = axios.create({
@@ -167,6 +168,12 @@ function App() {
         }));
         
         setQueue(prev => [...prev, ...newItems]);
+        
+        // Entrées de la playlist que le serveur n'a pas pu lire
+        const skipped = video_info.skippedItems || [];
+        if (skipped.length > 0) {
+          setError(`${skipped.length} vidéo(s) de la playlist n'ont pas pu être lues : ${skipped.map(item => item.title || item.url).join(', ')}`);
+        }
       } else {
         const queueItem = {
           id: video_info.id || `${Date.now()}-${Math.random()}`,
@@ -231,70 +238,46 @@ function App() {
       console.log('Download initiated, response:', response.data);
       const downloadId = response.data.download_id;
       
-      // Vérifier le statut toutes les 5 secondes
-      const checkStatus = async () => {
-        try {
-          const statusResponse = await api.get(`check-status/${downloadId}`);
-          const status = statusResponse.data;
-          
-          setProgress(status.progress);
-          if (status.title) {
-            setCurrentVideoInfo(prev => ({
-              ...prev,
-              title: status.title
-            }));
-          }
-
-          if (status.error) {
-            throw new Error(status.error);
-          }
-
-          if (status.is_ready && status.filename) {
-            // Télécharger le fichier
-            console.log('File is ready, downloading:', status.filename);
-            const downloadResponse = await api.get(
-              `download-file/${downloadId}`,
-              { responseType: 'blob' }
-            );
-
-            // Créer le lien de téléchargement
-            const blob = new Blob([downloadResponse.data]);
-            const url = window.URL.createObjectURL(blob);
-            const link = document.createElement('a');
-            link.href = url;
-            link.download = status.filename;
-            document.body.appendChild(link);
-            link.click();
-            document.body.removeChild(link);
-            window.URL.revokeObjectURL(url);
+      // Suivre la progression (flux d'événements, ou interrogation en repli)
+      const status = await watchDownload(api, downloadId, (update) => {
+        setProgress(update.progress);
+        if (update.title) {
+          setCurrentVideoInfo(prev => ({
+            ...prev,
+            title: update.title
+          }));
+        }
+      });
 
-            // Nettoyer le fichier sur le serveur
-            await api.post(`cleanup/${downloadId}`);
-            // Nettoyer le dossier de téléchargement
-            await api.post('clean');
-            
-            setDownloading(false);
-            setCurrentVideoInfo(null);
-            setProgress(0);
-            return;
-          }
+      // Télécharger le fichier
+      console.log('File is ready, downloading:', status.filename);
+      const downloadResponse = await api.get(
+        `download-file/${downloadId}`,
+        { responseType: 'blob' }
+      );
 
-          // Continuer à vérifier toutes les 5 secondes
-          setTimeout(checkStatus, 5000);
-        } catch (error) {
-          console.error('Error checking status:', error);
-          setError(error.message || 'Une erreur est survenue');
-          setDownloading(false);
-          setCurrentVideoInfo(null);
-        }
-      };
+      // Créer le lien de téléchargement
+      const blob = new Blob([downloadResponse.data]);
+      const url = window.URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = status.filename;
+      document.body.appendChild(link);
+      link.click();
+      document.body.removeChild(link);
+      window.URL.revokeObjectURL(url);
 
-      // Démarrer la vérification du statut
-      checkStatus();
+      // Nettoyer le dossier de ce téléchargement, puis son état sur le serveur
+      await api.post(`clean?download_id=${downloadId}`);
+      await api.post(`cleanup/${downloadId}`);
+      
+      setDownloading(false);
+      setCurrentVideoInfo(null);
+      setProgress(0);
       
     } catch (error) {
       console.error('Download error:', error);
-      setError(error.response?.data?.detail || 'Une erreur est survenue');
+      setError(error.response?.data?.detail || error.message || 'Une erreur est survenue');
       setDownloading(false);
       setCurrentVideoInfo(null);
     }
@@ -313,12 +296,10 @@ function App() {
         currentItem: null
       });
       
-      let completedDownloads = 0;
-      
-      // Démarrer les téléchargements individuels
+      // Démarrer tous les téléchargements : le serveur les ordonne dans sa file
+      const started = {};
       for (const item of queue) {
         try {
-          // Démarrer le téléchargement avec le session_id
           const response = await api.post('start-download', {
             url: item.url,
             format: item.format,
@@ -328,6 +309,7 @@ function App() {
           });
           
           const downloadId = response.data.download_id;
+          started[downloadId] = item;
           
           // Mettre à jour l'état de l'élément dans la file d'attente
           setQueue(prev => prev.map(qItem => 
@@ -335,71 +317,71 @@ function App() {
               ? { ...qItem, status: 'downloading', downloadId }
               : qItem
           ));
-          
-          // Vérifier le statut jusqu'à ce que le téléchargement soit terminé
-          while (true) {
-            const statusResponse = await api.get(`check-status/${downloadId}`);
-            const status = statusResponse.data;
-            
-            // Mettre à jour la progression de l'élément
-            setQueue(prev => prev.map(qItem =>
-              qItem.id === item.id
-                ? { ...qItem, progress: status.progress }
-                : qItem
-            ));
-            
-            // Mettre à jour les deux barres de progression
-            const globalProgress = ((completedDownloads * 100) + status.progress) / queue.length;
-            setProgress(globalProgress);
-            setBatchProgress(prev => ({
-              ...prev,
-              current: completedDownloads,
-              currentItem: {
-                title: item.title,
-                progress: status.progress
-              }
-            }));
-            
-            if (status.error) {
-              setQueue(prev => prev.map(qItem =>
-                qItem.id === item.id
-                  ? { ...qItem, status: 'error', error: status.error }
-                  : qItem
-              ));
-              throw new Error(status.error);
-            }
-            
-            if (status.is_ready && status.filename) {
-              completedDownloads++;
-              setQueue(prev => prev.map(qItem =>
-                qItem.id === item.id
-                  ? { ...qItem, status: 'completed', filename: status.filename }
-                  : qItem
-              ));
-              
-              setBatchProgress(prev => ({
-                ...prev,
-                current: completedDownloads,
-                total: queue.length,
-                currentItem: null
-              }));
-              
-              break;
-            }
-            
-            await new Promise(resolve => setTimeout(resolve, 1000));
-          }
-          
         } catch (error) {
-          console.error(`Error downloading ${item.title}:`, error);
+          // File du serveur pleine (429) ou requête refusée
+          console.error(`Error starting ${item.title}:`, error);
           setQueue(prev => prev.map(qItem =>
             qItem.id === item.id
-              ? { ...qItem, status: 'error', error: error.message }
+              ? { ...qItem, status: 'error', error: error.response?.data?.detail || error.message }
               : qItem
           ));
         }
       }
       
+      // Suivre tous les téléchargements ensemble : une seule requête d'état
+      // par intervalle, quel que soit le nombre de vidéos
+      const itemProgress = {};
+      let completedDownloads = 0;
+      const results = await watchDownloads(api, Object.keys(started), (downloadId, update) => {
+        const item = started[downloadId];
+        itemProgress[downloadId] = update.progress;
+        
+        // Mettre à jour la progression de l'élément
+        setQueue(prev => prev.map(qItem =>
+          qItem.id === item.id
+            ? { ...qItem, progress: update.progress }
+            : qItem
+        ));
+        
+        if (update.is_ready && update.filename) {
+          completedDownloads++;
+          setQueue(prev => prev.map(qItem =>
+            qItem.id === item.id
+              ? { ...qItem, status: 'completed', filename: update.filename }
+              : qItem
+          ));
+        }
+        
+        // Mettre à jour les deux barres de progression
+        const totalProgress = Object.values(itemProgress).reduce((sum, value) => sum + value, 0);
+        setProgress(totalProgress / queue.length);
+        setBatchProgress(prev => ({
+          ...prev,
+          current: completedDownloads,
+          currentItem: update.is_ready
+            ? null
+            : { title: item.title, progress: update.progress }
+        }));
+      });
+      
+      Object.entries(results).forEach(([downloadId, status]) => {
+        if (status.error) {
+          console.error(`Error downloading ${started[downloadId].title}:`, status.error);
+          setQueue(prev => prev.map(qItem =>
+            qItem.id === started[downloadId].id
+              ? { ...qItem, status: 'error', error: status.error }
+              : qItem
+          ));
+        }
+      });
+      
+      setBatchProgress(prev => ({
+        ...prev,
+        current: completedDownloads,
+        total: queue.length,
+        currentItem: null
+      }));
+      
       // Une fois tous les téléchargements terminés, télécharger le fichier
       try {
         if (queue.length === 1) {
@@ -440,8 +422,8 @@ function App() {
           window.URL.revokeObjectURL(url);
         }
 
-        // Nettoyer le dossier de téléchargement
-        await api.post('clean');
+        // Nettoyer les dossiers des téléchargements de la session
+        await api.post(`clean?session_id=${sessionId}`);
         
       } catch (error) {
         console.error('Error downloading file:', error);
@@ -0,0 +1,96 @@
+const NOT_FOUND_ERROR = 'Le téléchargement a échoué ou n\'existe plus';
+
+const isFinished = (status) => status.error || (status.is_ready && status.filename);
+
+// Suivi de plusieurs téléchargements jusqu'à leur fin : un seul flux Server-Sent
+// Events (/events), avec repli sur l'interrogation de /statuses, une requête pour
+// tous les identifiants, qui répond 304 tant qu'aucun état n'a changé.
+// onUpdate(downloadId, état) est appelé à chaque changement ; la promesse renvoie
+// l'état final de chaque téléchargement ({ error } pour un identifiant inconnu).
+export const watchDownloads = (api, downloadIds, onUpdate, pollInterval = 1000) =>
+  new Promise((resolve, reject) => {
+    const pending = new Set(downloadIds);
+    const results = {};
+
+    const handle = (downloadId, status) => {
+      if (!pending.has(downloadId)) return;
+      if (!status) {
+        results[downloadId] = { error: NOT_FOUND_ERROR };
+        pending.delete(downloadId);
+        return;
+      }
+      onUpdate(downloadId, status);
+      if (isFinished(status)) {
+        results[downloadId] = status;
+        pending.delete(downloadId);
+      }
+    };
+
+    if (pending.size === 0) {
+      resolve(results);
+      return;
+    }
+
+    let etag = null;
+    const poll = async () => {
+      try {
+        const ids = [...pending];
+        const response = await api.get('statuses', {
+          params: { downloads: ids.join(',') },
+          headers: etag ? { 'If-None-Match': etag } : {},
+          validateStatus: (code) => code === 200 || code === 304,
+        });
+        if (response.status === 200) {
+          etag = response.headers.etag || null;
+          ids.forEach((downloadId) => handle(downloadId, response.data.downloads[downloadId]));
+        }
+        if (pending.size === 0) {
+          resolve(results);
+        } else {
+          setTimeout(poll, pollInterval);
+        }
+      } catch (error) {
+        reject(error);
+      }
+    };
+
+    if (typeof window.EventSource === 'undefined') {
+      poll();
+      return;
+    }
+
+    const baseURL = api.defaults.baseURL.replace(/\/$/, '');
+    const query = [...pending].map(encodeURIComponent).join(',');
+    const source = new EventSource(`${baseURL}/events?downloads=${query}`);
+    let received = false;
+
+    source.addEventListener('download', (event) => {
+      received = true;
+      const status = JSON.parse(event.data);
+      handle(status.id, status.status === 'not_found' ? null : status);
+      if (pending.size === 0) {
+        source.close();
+        resolve(results);
+      }
+    });
+
+    source.onerror = () => {
+      // Le navigateur se reconnecte seul ; on ne repasse à l'interrogation
+      // que si le flux n'a jamais fonctionné ou a été fermé
+      if (!received || source.readyState === EventSource.CLOSED) {
+        source.close();
+        poll();
+      }
+    };
+  });
+
+// Suivi d'un seul téléchargement : rejette la promesse en cas d'échec
+export const watchDownload = (api, downloadId, onUpdate, pollInterval = 1000) =>
+  watchDownloads(api, [downloadId], (id, status) => onUpdate(status), pollInterval)
+    .then((results) => {
+      const status = results[downloadId];
+      if (status.error) {
+        throw new Error(status.error);
+      }
+      return status;
+    });